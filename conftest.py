@@ -0,0 +1 @@
+# lets tests import the scripts package (e.g. `from scripts import compact_logs`)
@@ -5,7 +5,27 @@ contract Oracle {
     address private owner;
 
     mapping(address => bool) private signers;
-    mapping(uint88 => Record) private pStore;
+    // records packed into one slot: height (64) | timestamp (48) | value (144).
+    // values that don't fit in 144 bits store WIDE_VALUE and keep the value in pStoreWide
+    mapping(uint88 => uint256) private pStore;
+    mapping(uint88 => uint240) private pStoreWide;
+    // basefee and tip of a chain share one slot, keyed by sid + cid without the type:
+    // height (64) | timestamp (48) | basefee (72) | tip (72).
+    // each 72 bit half is a LONE_RECORD flag and a 71 bit value, values that don't fit store
+    // GAS_PRICE_WIDE and keep the value in pGasPriceWide. a record carrying only a basefee or
+    // only a tip is stored in pStore like other types, and flagged in the slot, see storeGasPrice
+    mapping(uint88 => uint256) private pGasPrice;
+    mapping(uint88 => uint240) private pGasPriceWide;
+
+    // sub-payload version for several chain records under one signature
+    uint8 private constant ENVELOPE_VERSION = 2;
+
+    uint240 private constant WIDE_VALUE = type(uint144).max;
+
+    uint16 private constant BASEFEE_TYPE = 107;
+    uint16 private constant TIP_TYPE = 322;
+    uint256 private constant GAS_PRICE_WIDE = type(uint71).max;
+    uint256 private constant LONE_RECORD = 1 << 71;
 
     constructor() {
         owner = msg.sender;
@@ -29,14 +49,12 @@ contract Oracle {
         uint16 typ;
     }
 
-    struct v1Header {
-        uint8 version;
-        uint16 payloadlen;
-        uint88 scid;
-        uint8 sid;
+    // basefee + tip of a chain
+    struct GasPriceReceipt {
+        uint8 systemid;
         uint64 cid;
-        uint48 ts;
-        uint64 height;
+        Record old_record;
+        Record new_record;
     }
 
     // owner override for fixing values
@@ -50,10 +68,28 @@ contract Oracle {
     ) public {
         assert(owner == msg.sender);
 
-        Record storage r = pStore[getKey(systemid, cid, typ)];
-        r.timestamp = timestamp;
-        r.height = height;
-        r.value = value;
+        uint88 key = getKey(systemid, cid, typ);
+        if (isGasPriceType(typ)) {
+            // a lone basefee or tip, it's only read while it's at least as new as the chain's gas price record
+            storeLoneGasPrice(key, (uint112(height) << 0x30) | timestamp, value);
+        } else {
+            storeRecord(key, (uint112(height) << 0x30) | timestamp, value);
+        }
+    }
+
+    // owner override for fixing a chain's basefee and tip, which share one stamp.
+    // lone basefee or tip records at least as new stay in effect
+    function ownerSetGasPrice(
+        uint8 systemid,
+        uint64 cid,
+        uint48 timestamp,
+        uint64 height,
+        uint240 basefee,
+        uint240 tip
+    ) public {
+        assert(owner == msg.sender);
+
+        storeGasPriceRecord(getKey(systemid, cid, 0), (uint112(height) << 0x30) | timestamp, basefee, tip);
     }
 
     function setSignerAddress(address s) public {
@@ -78,51 +114,29 @@ contract Oracle {
             offset := init
         }
 
-        // header
         uint8 version;
         uint16 payloadlen;
-        uint88 scid;
-        uint48 ts;
-        uint64 height;
-        // payload
-        uint256 val;
-        uint16 typ;
-
-        address recovered;
         while (true) {
             if (offset >= init + dat.length) {
                 break;
             }
 
-            (version, payloadlen, scid, ts, height) = decodeHeader(offset);
+            (version, payloadlen) = decodeVersion(offset);
             if (version == 0) {
                 break;
             }
 
-            recovered = checkSignature(payloadlen, offset);
-            require(recovered != address(0), "ECDSA: invalid signature");
-            require(signers[recovered], "invalid signer");
-
-            uint start = offset + 0x20; // skip header
-            uint8 j;
-            while (j < payloadlen) {
-                assembly {
-                    val := mload(add(start, mul(0x20, j)))
-                    typ := shl(0x8, byte(0, val))
-                    typ := add(typ, byte(1, val))
+            if (version == ENVELOPE_VERSION) {
+                if (!isEnvelopeStale(offset, payloadlen)) {
+                    verifySignature(payloadlen, offset);
+                    storeEnvelope(offset, payloadlen);
                 }
-                scid = appendType(scid, typ);
-                Record storage rec = pStore[scid];
-
-                if (rec.height < height) {
-                    pStore[scid] = Record(height, ts, uint240(val));
-                } else if (rec.height == height && rec.timestamp < ts) {
-                    pStore[scid] = Record(height, ts, uint240(val));
-                }
-                j++;
+            } else if (!isStale(offset, payloadlen)) {
+                verifySignature(payloadlen, offset);
+                storeElements(offset, payloadlen);
             }
 
-            offset += (payloadlen + 4) * 0x20; // ( payload + header + signature )
+            offset += (uint(payloadlen) + 4) * 0x20; // ( payload + header + signature )
         }
     }
 
@@ -135,199 +149,443 @@ contract Oracle {
             init := add(dat, 0x20) // skip bytes header (length parameter)
             offset := init
         }
- 
-        uint elWritten = 0;
-        uint elCount = payloadElementsCount( offset, dat.length+init );
-        RecordReceipt[] memory r = new RecordReceipt[](elCount);
-        
 
-        address recovered;
-        // payload
-        uint256 val;
-        uint16 typ;
+        // every receipt comes from a 32 byte payload element, so dat.length / 0x20 bounds
+        // the receipt count. Only the array of receipt pointers is allocated up front,
+        // receipts are written while the payload is walked and the length trimmed at the end.
+        uint elWritten = 0;
+        RecordReceipt[] memory r;
+        assembly {
+            r := mload(0x40)
+            let bound := div(mload(dat), 0x20)
+            mstore(r, bound)
+            mstore(0x40, add(r, mul(add(bound, 1), 0x20)))
+        }
 
+        uint8 version;
+        uint16 payloadlen;
         while (true) {
             if (offset >= init + dat.length) {
                 break;
             }
 
-            v1Header memory header = decodeHeaderStruct(offset);
-            if (header.version == 0) {
+            (version, payloadlen) = decodeVersion(offset);
+            if (version == 0) {
                 break;
             }
 
-            recovered = checkSignature(header.payloadlen, offset);
-            require(recovered != address(0), "ECDSA: invalid signature");
-            require(signers[recovered], "invalid signer");
-
-            uint start = offset + 0x20; // skip header
-            uint8 j;
-            uint88 scid;
-            while (j < header.payloadlen) { 
-                assembly {
-                    val := mload(add(start, mul(0x20, j)))
-                    typ := shl(0x8, byte(0, val))
-                    typ := add(typ, byte(1, val))
+            // a stale sub-payload changes nothing and only gets empty receipts,
+            // so its signature doesn't need to be recovered
+            if (version == ENVELOPE_VERSION) {
+                if (!isEnvelopeStale(offset, payloadlen)) {
+                    verifySignature(payloadlen, offset);
                 }
-                scid = appendType(header.scid, typ);
-
-                Record storage rec = pStore[scid]; 
-                if (rec.height < header.height) {
-                    r[elWritten] = RecordReceipt(RecordKey(header.sid, header.cid, typ), rec, Record(header.height, header.ts, uint240(val)));
-                    pStore[scid] = Record(header.height, header.ts, uint240(val)); 
-                } else if (rec.height == header.height && rec.timestamp < header.ts) {
-                    r[elWritten] = RecordReceipt(RecordKey(header.sid, header.cid, typ), rec, Record(header.height, header.ts, uint240(val)));
-                    pStore[scid] = Record(header.height, header.ts, uint240(val));
-                } else {
-                    r[elWritten] = RecordReceipt(RecordKey(header.sid, header.cid, typ), rec, Record(0,0,0));
-                } 
-
-                elWritten +=1;
-                j++;
+                elWritten = storeEnvelopeWithReceipt(offset, payloadlen, r, elWritten);
+            } else {
+                if (!isStale(offset, payloadlen)) {
+                    verifySignature(payloadlen, offset);
+                }
+                elWritten = storeElementsWithReceipt(offset, payloadlen, r, elWritten);
             }
 
-            offset += (header.payloadlen + 4) * 0x20; // ( payload + header + signature )
-        } 
+            offset += (uint(payloadlen) + 4) * 0x20; // ( payload + header + signature )
+        }
 
+        assembly {
+            mstore(r, elWritten) // trim to the receipts written
+        }
         return r;
     }
 
+    // same as storeValuesWithReceipt, with one receipt per chain for its basefee + tip
+    function storeValuesWithGasPriceReceipt(bytes memory dat) public payable returns (GasPriceReceipt[] memory receipts) {
+        RecordReceipt[] memory r = storeValuesWithReceipt(dat);
 
-    function payloadElementsCount(uint offset, uint lastOffset ) private pure returns (uint) {
-  
-        uint count = 0;
+        // at most one receipt per basefee and tip pair, only the pointers are allocated
+        assembly {
+            receipts := mload(0x40)
+            mstore(receipts, div(mload(r), 2))
+            mstore(0x40, add(receipts, mul(add(div(mload(r), 2), 1), 0x20)))
+        }
 
-        bytes32 buf;
-        uint8 version;
-        uint16 payloadlen;
-        while (true) { 
-            if (offset >= lastOffset) {
-                break;
+        uint n = 0;
+        uint bf = 0; // index + 1 of the unpaired basefee receipt
+        uint tip = 0; // index + 1 of the unpaired tip receipt
+        for (uint i = 0; i < r.length; i++) {
+            if (r[i].record.typ == BASEFEE_TYPE) {
+                bf = i + 1;
+            } else if (r[i].record.typ == TIP_TYPE) {
+                tip = i + 1;
+            } else {
+                continue;
             }
 
-            assembly { 
-                buf := mload(offset) 
-                version := buf
-                buf := shr(0xC0, buf)
-                payloadlen := buf
+            if (bf == 0 || tip == 0) {
+                continue;
             }
- 
-            if (version == 0) {
-                break;
-            } 
-            count += payloadlen;
-            offset += (payloadlen + 4) * 0x20; // ( payload + header + signature )
+
+            // a lone basefee or tip of another chain stays unpaired
+            if (r[bf - 1].record.systemid != r[tip - 1].record.systemid || r[bf - 1].record.cid != r[tip - 1].record.cid) {
+                if (r[i].record.typ == BASEFEE_TYPE) {
+                    tip = 0;
+                } else {
+                    bf = 0;
+                }
+                continue;
+            }
+
+            receipts[n] = makeGasPriceReceipt(r[bf - 1], r[tip - 1]);
+            n++;
+            bf = 0;
+            tip = 0;
         }
 
-        return count;
+        assembly {
+            mstore(receipts, n) // trim to the receipts written
+        }
+    }
 
+    // An envelope (version ENVELOPE_VERSION) signs several chain records at once. Its header
+    // only carries the version and a payloadlen counting every word of the records, so the
+    // signature and the offset to the next sub-payload work as for a single record:
+    //
+    //   envelope header | record header | elements | record header | elements | ... | r s v
+    //
+    // records are v1 headers followed by their elements, without a signature.
+
+    function storeEnvelope(uint offset, uint16 payloadlen) private {
+        uint end = offset + (uint(payloadlen) + 1) * 0x20;
+        uint16 plen;
+        for (offset += 0x20; offset < end; offset += (uint(plen) + 1) * 0x20) {
+            (, plen) = decodeVersion(offset);
+            storeElements(offset, plen);
+        }
+        require(offset == end, "invalid envelope");
     }
 
+    function storeEnvelopeWithReceipt(
+        uint offset,
+        uint16 payloadlen,
+        RecordReceipt[] memory r,
+        uint elWritten
+    ) private returns (uint) {
+        uint end = offset + (uint(payloadlen) + 1) * 0x20;
+        uint16 plen;
+        for (offset += 0x20; offset < end; offset += (uint(plen) + 1) * 0x20) {
+            (, plen) = decodeVersion(offset);
+            elWritten = storeElementsWithReceipt(offset, plen, r, elWritten);
+        }
+        require(offset == end, "invalid envelope");
 
-    function decodeHeaderStruct(
-        uint offset
-    )
-        private
-        pure
-        returns (
-            v1Header memory header
-        )
-    {
-        bytes32 buf;
-        uint8 version;
-        uint16 payloadlen;
-        uint88 scid;
-        uint8 sid;
-        uint64 cid;
-        uint48 ts;
-        uint64 height;
+        return elWritten;
+    }
 
-        assembly {
-           // HEADER
-           buf := mload(offset)
+    function isEnvelopeStale(uint offset, uint16 payloadlen) private view returns (bool) {
+        uint end = offset + (uint(payloadlen) + 1) * 0x20;
+        uint16 plen;
+        for (offset += 0x20; offset < end; offset += (uint(plen) + 1) * 0x20) {
+            (, plen) = decodeVersion(offset);
+            if (!isStale(offset, plen)) {
+                return false;
+            }
+        }
+
+        return true;
+    }
 
-           // decode version
-           version := buf
+    // stores the elements of the record at offset
+    function storeElements(uint offset, uint16 payloadlen) private {
+        (uint112 stamp, uint88 scid) = decodeRecordHeader(offset);
 
-           // shift 8 + decode height
-           buf := shr(0x08, buf)
-           height := buf
+        uint256 val;
+        uint88 key;
+        uint8 j;
+        while (j < payloadlen) {
+            assembly {
+                val := mload(add(offset, mul(0x20, add(j, 1)))) // skip header
+                key := or(scid, shr(0xF0, val))
+            }
+
+            if (!isGasPriceType(uint16(key)) && (pStore[key] >> 0x90) < stamp) {
+                storeRecord(key, stamp, uint240(val));
+            }
+            j++;
+        }
+
+        storeGasPrice(offset, payloadlen, stamp, scid);
+    }
+
+    // stores the elements of the record at offset and writes their receipts to r,
+    // starting at elWritten. header fields are decoded to the stack, not to a struct
+    function storeElementsWithReceipt(
+        uint offset,
+        uint16 payloadlen,
+        RecordReceipt[] memory r,
+        uint elWritten
+    ) private returns (uint) {
+        (uint112 stamp, uint88 scid) = decodeRecordHeader(offset);
+
+        uint first = elWritten;
+        uint256 val;
+        uint88 key;
+        uint8 j;
+        while (j < payloadlen) {
+            assembly {
+                val := mload(add(offset, mul(0x20, add(j, 1)))) // skip header
+                key := or(scid, shr(0xF0, val))
+            }
 
-           // shift 64 + decode chain id
-           buf := shr(0x40, buf)
-           cid := buf
+            r[elWritten] = storeElementWithReceipt(key, stamp, uint240(val));
+            elWritten += 1;
+            j++;
+        }
 
-           // shift 64 + decode service id
-           buf := shr(0x40, buf)
-           sid := buf
+        if (storeGasPrice(offset, payloadlen, stamp, scid)) {
+            // basefee and tip receipts are made from what storeGasPrice stored
+            for (uint i = first; i < elWritten; i++) {
+                if (isGasPriceType(r[i].record.typ)) {
+                    r[i].new_record = gasPriceReceiptRecord(scid | r[i].record.typ, r[i].old_record);
+                }
+            }
+        }
+        return elWritten;
+    }
 
-           // shift 8 + decode timestamp
-           buf := shr(0x08, buf)
-           ts := buf
+    // true when no element of the record at offset is newer than its stored record,
+    // storing it would then be a no-op
+    function isStale(uint offset, uint16 payloadlen) private view returns (bool) {
+        (uint112 stamp, uint88 scid) = decodeRecordHeader(offset);
 
-           // shift 48 + decode estimations length
-           buf := shr(0x30, buf)
-           payloadlen := buf
+        uint88 key;
+        uint8 j;
+        while (j < payloadlen) {
+            assembly {
+                key := or(scid, shr(0xF0, mload(add(offset, mul(0x20, add(j, 1)))))) // skip header
+            }
 
-           scid := sid
-           scid := shl(0x40, scid)
-           scid := cid
-           scid := shl(0x10, scid)
+            if (storedStamp(key) < stamp) {
+                return false;
+            }
+            j++;
         }
 
-        return (v1Header(version, payloadlen, scid, sid, cid, ts, height));
+        return true;
     }
 
-    function decodeHeader(
+    function decodeVersion(
         uint offset
-    )
-        private
-        pure
-        returns (
-            uint8 version,
-            uint16 payloadlen,
-            uint88 scid,
-            uint48 ts,
-            uint64 height
-        )
-    {
-        bytes32 buf;
-        uint8 sid;
-        uint64 cid;
+    ) private pure returns (uint8 version, uint16 payloadlen) {
         assembly {
-            // HEADER
-            buf := mload(offset)
+            let buf := mload(offset)
+            version := and(buf, 0xFF)
+            payloadlen := and(shr(0xC0, buf), 0xFFFF)
+        }
+    }
 
-            // decode version
-            version := buf
+    // height | timestamp and sid + cid (shifted to leave room for the type) of the header at offset.
+    // stamps compare like the stored records: by height, then by timestamp
+    function decodeRecordHeader(
+        uint offset
+    ) private pure returns (uint112 stamp, uint88 scid) {
+        assembly {
+            let buf := mload(offset)
+            stamp := or(shl(0x30, and(shr(0x08, buf), 0xFFFFFFFFFFFFFFFF)), and(shr(0x90, buf), 0xFFFFFFFFFFFF))
+            scid := shl(0x10, and(shr(0x48, buf), 0xFFFFFFFFFFFFFFFFFF))
+        }
+    }
 
-            // shift 8 + decode height
-            buf := shr(0x08, buf)
-            height := buf
+    // basefee and tip of the record at offset are written to its gas price slot together,
+    // once the other elements are stored, if the record is newer than the slot. they share
+    // the slot's height and timestamp, so a record carrying only one of them can't be stored
+    // there without moving the other's stamp forward. it is stored as a lone record of its
+    // type instead, if it's newer than that type's record, and flagged in the slot. reads take
+    // the lone record while it's at least as new as the slot. returns whether the record had
+    // a basefee or tip
+    function storeGasPrice(uint offset, uint16 payloadlen, uint112 stamp, uint88 scid) private returns (bool) {
+        uint256 val;
+        uint16 typ;
+        uint240 basefee;
+        uint240 tip;
+        bool hasBasefee;
+        bool hasTip;
+        uint8 j;
+        while (j < payloadlen) {
+            assembly {
+                val := mload(add(offset, mul(0x20, add(j, 1)))) // skip header
+                typ := shr(0xF0, val)
+            }
 
-            // shift 32 + decode chain id
-            buf := shr(0x40, buf)
-            cid := buf
+            if (typ == BASEFEE_TYPE) {
+                basefee = uint240(val);
+                hasBasefee = true;
+            } else if (typ == TIP_TYPE) {
+                tip = uint240(val);
+                hasTip = true;
+            }
+            j++;
+        }
 
-            // shift 32 + decode service id
-            buf := shr(0x40, buf)
-            sid := buf
+        if (hasBasefee && hasTip) {
+            if ((pGasPrice[scid] >> 0x90) < stamp) {
+                storeGasPriceRecord(scid, stamp, basefee, tip);
+            }
+        } else if (hasBasefee) {
+            if (storedStamp(scid | BASEFEE_TYPE) < stamp) {
+                storeLoneGasPrice(scid | BASEFEE_TYPE, stamp, basefee);
+            }
+        } else if (hasTip) {
+            if (storedStamp(scid | TIP_TYPE) < stamp) {
+                storeLoneGasPrice(scid | TIP_TYPE, stamp, tip);
+            }
+        }
+        return hasBasefee || hasTip;
+    }
 
-            // shift 8 + decode timestamp
-            buf := shr(0x08, buf)
-            ts := buf
+    function storeGasPriceRecord(uint88 scid, uint112 stamp, uint240 basefee, uint240 tip) private {
+        uint256 word = pGasPrice[scid];
+        pGasPrice[scid] = (uint256(stamp) << 0x90) |
+            (gasPriceHalf(scid | BASEFEE_TYPE, word >> 0x48, stamp, basefee) << 0x48) |
+            gasPriceHalf(scid | TIP_TYPE, word, stamp, tip);
+    }
 
-            // shift 48 + decode estimations length
-            buf := shr(0x30, buf)
-            payloadlen := buf
+    // the 72 bit half of key's value in a gas price slot stored at stamp, the LONE_RECORD
+    // flag is kept while the lone record is at least as new
+    function gasPriceHalf(uint88 key, uint256 oldHalf, uint112 stamp, uint240 value) private returns (uint256 half) {
+        if ((oldHalf & LONE_RECORD) != 0 && (pStore[key] >> 0x90) >= stamp) {
+            half = LONE_RECORD;
+        }
+        if (value >= GAS_PRICE_WIDE) {
+            pGasPriceWide[key] = value;
+            return half | GAS_PRICE_WIDE;
+        }
+        return half | value;
+    }
 
-            scid := sid
-            scid := shl(0x40, scid)
-            scid := cid
-            scid := shl(0x10, scid)
+    function storeLoneGasPrice(uint88 key, uint112 stamp, uint240 value) private {
+        storeRecord(key, stamp, value);
+        uint88 scid = (key >> 0x10) << 0x10;
+        pGasPrice[scid] |= LONE_RECORD << (uint16(key) == BASEFEE_TYPE ? uint256(0x48) : uint256(0));
+    }
+
+    // the new record of a basefee or tip receipt, what storeGasPrice left stored if it's newer than old
+    function gasPriceReceiptRecord(uint88 key, Record memory old) private view returns (Record memory rec) {
+        rec = loadRecord(key);
+        if (rec.height == old.height && rec.timestamp == old.timestamp) {
+            rec = Record(0, 0, 0);
         }
+    }
 
-        return (version, payloadlen, scid, ts, height);
+    function isGasPriceType(uint16 typ) private pure returns (bool) {
+        return typ == BASEFEE_TYPE || typ == TIP_TYPE;
+    }
+
+    // height | timestamp of the record of key, for basefee and tip the newer of the gas price
+    // slot and a flagged lone record
+    function storedStamp(uint88 key) private view returns (uint112 stamp) {
+        if (!isGasPriceType(uint16(key))) {
+            return uint112(pStore[key] >> 0x90);
+        }
+        uint256 word = pGasPrice[(key >> 0x10) << 0x10];
+        stamp = uint112(word >> 0x90);
+        if ((gasPriceHalfOf(key, word) & LONE_RECORD) != 0) {
+            uint112 lone = uint112(pStore[key] >> 0x90);
+            if (lone >= stamp) {
+                stamp = lone;
+            }
+        }
+    }
+
+    // basefee and tip are stored together by storeGasPriceRecord, or alone by storeLoneGasPrice
+    function storeRecord(uint88 key, uint112 stamp, uint240 value) private {
+        if (value >= WIDE_VALUE) {
+            pStoreWide[key] = value;
+            value = WIDE_VALUE;
+        }
+        pStore[key] = (uint256(stamp) << 0x90) | value;
+    }
+
+    function loadRecord(uint88 key) private view returns (Record memory) {
+        if (isGasPriceType(uint16(key))) {
+            return unpackGasPrice(key, pGasPrice[(key >> 0x10) << 0x10]);
+        }
+        return unpackRecord(key, pStore[key]);
+    }
+
+    function unpackRecord(uint88 key, uint256 word) private view returns (Record memory rec) {
+        rec.height = uint64(word >> 0xC0);
+        rec.timestamp = uint48(word >> 0x90);
+        rec.value = uint240(word) & WIDE_VALUE;
+        if (rec.value == WIDE_VALUE) {
+            rec.value = pStoreWide[key];
+        }
+    }
+
+    function gasPriceHalfOf(uint88 key, uint256 word) private pure returns (uint256) {
+        return (uint16(key) == BASEFEE_TYPE ? word >> 0x48 : word) & type(uint72).max;
+    }
+
+    // the basefee or tip record of key, from its chain's gas price slot word or its lone record
+    function unpackGasPrice(uint88 key, uint256 word) private view returns (Record memory rec) {
+        uint256 half = gasPriceHalfOf(key, word);
+        if ((half & LONE_RECORD) != 0) {
+            uint256 lone = pStore[key];
+            if ((lone >> 0x90) >= (word >> 0x90)) {
+                return unpackRecord(key, lone);
+            }
+        }
+        rec.height = uint64(word >> 0xC0);
+        rec.timestamp = uint48(word >> 0x90);
+        rec.value = uint240(half & GAS_PRICE_WIDE);
+        if (rec.value == GAS_PRICE_WIDE) {
+            rec.value = pGasPriceWide[key];
+        }
+    }
+
+    function storeElementWithReceipt(
+        uint88 key,
+        uint112 stamp,
+        uint240 value
+    ) private returns (RecordReceipt memory) {
+        Record memory old = loadRecord(key);
+        // basefee and tip are stored by storeGasPrice after the record's elements, which fills in their new record
+        if (isGasPriceType(uint16(key))) {
+            return makeReceipt(key, old, Record(0, 0, 0));
+        }
+        if (((uint112(old.height) << 0x30) | old.timestamp) < stamp) {
+            storeRecord(key, stamp, value);
+            return makeReceipt(key, old, Record(uint64(stamp >> 0x30), uint48(stamp), value));
+        }
+
+        return makeReceipt(key, old, Record(0, 0, 0));
+    }
+
+    function makeReceipt(
+        uint88 key,
+        Record memory old,
+        Record memory rec
+    ) private pure returns (RecordReceipt memory) {
+        return RecordReceipt(RecordKey(uint8(key >> 0x50), uint64(key >> 0x10), uint16(key)), old, rec);
+    }
+
+    function makeGasPriceReceipt(
+        RecordReceipt memory bf,
+        RecordReceipt memory tip
+    ) private pure returns (GasPriceReceipt memory) {
+        require(bf.record.systemid == tip.record.systemid && bf.record.cid == tip.record.cid,
+                "basefee and tip records don't match");
+
+        return GasPriceReceipt(
+            bf.record.systemid,
+            bf.record.cid,
+            Record(bf.old_record.height, bf.old_record.timestamp, bf.old_record.value + tip.old_record.value),
+            Record(bf.new_record.height, bf.new_record.timestamp, bf.new_record.value + tip.new_record.value)
+        );
+    }
+
+    function verifySignature(uint16 payloadlen, uint offset) private view {
+        address recovered = checkSignature(payloadlen, offset);
+        require(recovered != address(0), "ECDSA: invalid signature");
+        require(signers[recovered], "invalid signer");
     }
 
     function checkSignature(
@@ -369,24 +627,12 @@ contract Oracle {
         recovered = ecrecover(kec, v, r, s);
     }
 
-    function appendType(
-        uint88 scida,
-        uint16 typ
-    ) private pure returns (uint88 scidb) {
-        assembly {
-            scidb := shr(0x10, scida)
-            scidb := shl(0x10, scidb)
-            scidb := add(scidb, typ)
-        }
-        return scidb;
-    }
-
     function get(
         uint8 systemid,
         uint64 cid,
         uint16 typ
     ) public view returns (uint256 value, uint64 height, uint48 timestamp) {
-        Record storage s = pStore[getKey(systemid, cid, typ)];
+        Record memory s = loadRecord(getKey(systemid, cid, typ));
         return (uint256(s.value), s.height, s.timestamp);
     }
 
@@ -395,7 +641,7 @@ contract Oracle {
         uint64 cid,
         uint16 typ
     ) public view returns (uint256 value) {
-        Record storage s = pStore[getKey(systemid, cid, typ)];
+        Record memory s = loadRecord(getKey(systemid, cid, typ));
         return uint256(s.value);
     }
 
@@ -404,7 +650,19 @@ contract Oracle {
         uint64 cid,
         uint16 typ
     ) public view returns (Record memory r) {
-        return pStore[getKey(systemid, cid, typ)];
+        return loadRecord(getKey(systemid, cid, typ));
+    }
+
+    // basefee + tip of a chain, from its gas price slot, with the basefee's height and timestamp
+    function getGasPrice(
+        uint8 systemid,
+        uint64 cid
+    ) public view returns (uint256 value, uint64 height, uint48 timestamp) {
+        uint88 scid = getKey(systemid, cid, 0);
+        uint256 word = pGasPrice[scid];
+        Record memory bf = unpackGasPrice(scid | BASEFEE_TYPE, word);
+        Record memory tip = unpackGasPrice(scid | TIP_TYPE, word);
+        return (uint256(bf.value) + tip.value, bf.height, bf.timestamp);
     }
 
     function getInTime(
@@ -413,7 +671,7 @@ contract Oracle {
         uint16 typ,
         uint48 tin
     ) public view returns (uint256 value, uint64 height, uint48 timestamp) {
-        Record storage s = pStore[getKey(systemid, cid, typ)];
+        Record memory s = loadRecord(getKey(systemid, cid, typ));
         if (s.timestamp >= uint48(block.timestamp) * 1000 - tin) {
             return (uint256(s.value), s.height, s.timestamp);
         }
@@ -441,7 +699,7 @@ contract Oracle {
     function getRecords( uint88[] calldata keys ) public view returns ( Record[] memory records) { 
         records = new Record[](keys.length);
         for (uint i = 0; i < keys.length; i++) {
-            records[i] = pStore[keys[i]];
+            records[i] = loadRecord(keys[i]);
         }
         return records;
     }
@@ -449,7 +707,7 @@ contract Oracle {
     function getRecords( RecordKey[] calldata keys ) public view returns ( Record[] memory records) { 
         records = new Record[](keys.length);
         for (uint i = 0; i < keys.length; i++) {
-            records[i] = pStore[getKey(keys[i].systemid, keys[i].cid, keys[i].typ)];
+            records[i] = loadRecord(getKey(keys[i].systemid, keys[i].cid, keys[i].typ));
         }
         return records;
     }
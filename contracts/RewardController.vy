@@ -4,6 +4,7 @@
 interface IOracle:
     def get(systemid: uint8, cid: uint64, typ: uint16) -> (uint256, uint64, uint48): view
     def storeValuesWithReceipt(dat: Bytes[MAX_PAYLOAD_SIZE]) -> DynArray[RecordReceipt, MAX_PAYLOADS]: payable
+    def storeValuesWithGasPriceReceipt(dat: Bytes[MAX_PAYLOAD_SIZE]) -> DynArray[GasPriceReceipt, MAX_PAYLOADS]: payable
 
 struct RecordReceipt:
     systemid: uint8
@@ -16,6 +17,17 @@ struct RecordReceipt:
     new_timestamp: uint48
     new_value: uint240
 
+# basefee + tip of a chain, from the oracle's combined gas price record
+struct GasPriceReceipt:
+    systemid: uint8
+    cid: uint64
+    old_height: uint64
+    old_timestamp: uint48
+    old_value: uint240
+    new_height: uint64
+    new_timestamp: uint48
+    new_value: uint240
+
 event OracleUpdated:
     updater: address
     system_id: uint8
@@ -27,6 +39,13 @@ event OracleUpdated:
     deviation_reward: uint256
     reward_mult: int256
 
+# compact logging mode: one event per update_many call, each entry packs the
+# OracleUpdated fields of one feed into 4 words (see _pack_update). a feed whose
+# rewards don't fit the packed 128 bits is logged with its own OracleUpdated
+event OraclesUpdated:
+    updater: address
+    updates: DynArray[uint256[4], MAX_PAYLOADS]
+
 event RewardsToggled:
     rewards_on: bool
 
@@ -61,17 +80,53 @@ struct TotalRewards:
     address: address
     total_rewards: uint256
 
+# controller configuration, loaded once per update_many call (see _load_config)
+struct ControllerConfig:
+    rewards_enabled: bool
+    min_window_size: uint32
+    target_time_since: uint256
+    control_output: ControlOutput
+    output_upper_bound: int256
+    output_lower_bound: int256
+    coeff: Coefficients
+    min_time_reward: int256
+    max_time_reward: int256
+    min_deviation_reward: int256
+    max_deviation_reward: int256
+
+# per-scid controller state, stored packed in feed_state (see _load_feed/_store_feed)
+struct FeedState:
+    error_integral: int256
+    last_output: int256
+    interval_ema: uint256
+    count: uint32
+    scale: uint256
+
 EIGHTEEN_DECIMAL_NUMBER: constant(int256) = 10**18
 THIRTY_SIX_DECIMAL_NUMBER: constant(int256) = 10**36
 EIGHTEEN_DECIMAL_NUMBER_U: constant(uint256) = 10**18
 
 BASEFEE_REWARD_TYPE: public(constant(uint16)) = 107
+# tip type of the oracle's combined gas price record, see enable_gas_price_receipts
+GAS_PRICE_TIP_TYPE: public(constant(uint16)) = 322
 MAX_PAYLOADS: public(constant(uint256)) = 32
 MAX_UPDATERS: public(constant(uint32)) = 2**18
 MAX_PAYLOAD_SIZE: public(constant(uint256)) = 16384
 EMA_ALPHA: public(constant(uint256)) = 818181818181818176 # 1 - 2/11
 ALPHA_COMP: constant(uint256) = EIGHTEEN_DECIMAL_NUMBER_U - EMA_ALPHA
 
+# feed_state packing
+# word 0: error_integral (int160) | last_output (int96)
+# word 1: interval_ema (uint128) | count (uint32) | scale (uint96)
+MASK_32: constant(uint256) = 2**32 - 1
+MASK_96: constant(uint256) = 2**96 - 1
+# last_output is stored as int96, so the output bounds must fit in it
+MAX_OUTPUT: constant(int256) = 2**95 - 1
+MIN_OUTPUT: constant(int256) = -2**95
+MASK_128: constant(uint256) = 2**128 - 1
+MASK_160: constant(uint256) = 2**160 - 1
+SCALE_SHIFT: constant(uint256) = 160
+
 authorities: public(HashMap[address, bool])
 
 tip_reward_type: public(uint16)
@@ -98,17 +153,21 @@ frozen: public(bool)
 
 # if rewards_off, allow updates, but w/o rewards
 rewards_enabled: public(bool)
-oracle: public(IOracle)
 
-error_integral: public(HashMap[uint72, int256])
-last_output: public(HashMap[uint72, int256])
+# if compact_logs, emit a single OraclesUpdated per update_many call instead of one OracleUpdated per feed
+compact_logs: public(bool)
+
+# if gas_price_receipts, read the oracle's combined basefee + tip receipts (storeValuesWithGasPriceReceipt)
+# instead of pairing per element receipts (storeValuesWithReceipt). only oracles with the combined
+# gas price record have it, so it's off until enabled for such an oracle
+gas_price_receipts: public(bool)
+oracle: public(IOracle)
 
 rewards: public(HashMap[address, uint256])
 total_rewards: public(uint256)
-scales: public(HashMap[uint72, uint256])
-count: public(HashMap[uint72, uint32])
 
-interval_ema: public(HashMap[uint72, uint256]) # EMA
+# error_integral, last_output, interval_ema(EMA), count and scale packed into two slots
+feed_state: HashMap[uint72, uint256[2]]
 
 coeff: public(Coefficients)
 
@@ -122,6 +181,7 @@ def __init__(_kp: int80, _ki: int80, _co_bias: int80,
              _min_fee: uint256):
     #
     assert _output_upper_bound >= _output_lower_bound, "RewardController/invalid-bounds"
+    assert _output_upper_bound <= MAX_OUTPUT and _output_lower_bound >= MIN_OUTPUT, "RewardController/invalid-bounds"
     assert oracle.is_contract, "Oracle address is not a contract"
     assert _target_time_since > 0, "target_time_since must be positive"
 
@@ -159,19 +219,77 @@ def set_scales(scales: DynArray[Scale, 64]):
     scid: uint72 = 0
     for s: Scale in scales:
         scid = convert(shift(convert(s.chain_id, uint256), 8) | convert(s.system_id, uint256), uint72)
-        self.scales[scid] = s.scale
+        self._set_scale(scid, s.scale)
 
 @external
 @view
 def get_scale(system_id: uint8, chain_id: uint64) -> uint256:
     scid: uint72 = convert(shift(convert(chain_id, uint256), 8) | convert(system_id, uint256), uint72)
-    return self.scales[scid]
+    return self._feed_scale(scid)
 
 @external
 def set_scale(system_id: uint8, chain_id: uint64, scale: uint256):
     assert self.authorities[msg.sender]
     scid: uint72 = convert(shift(convert(chain_id, uint256), 8) | convert(system_id, uint256), uint72)
-    self.scales[scid] = scale
+    self._set_scale(scid, scale)
+
+@internal
+def _set_scale(scid: uint72, scale: uint256):
+    assert scale <= MASK_96, "RewardController/scale-too-large"
+    word: uint256 = self.feed_state[scid][1]
+    self.feed_state[scid][1] = (word & MASK_160) | (scale << SCALE_SHIFT)
+
+@external
+@view
+def scales(scid: uint72) -> uint256:
+    return self._feed_scale(scid)
+
+@external
+@view
+def error_integral(scid: uint72) -> int256:
+    return self._load_feed(scid).error_integral
+
+@external
+@view
+def last_output(scid: uint72) -> int256:
+    return self._load_feed(scid).last_output
+
+@external
+@view
+def count(scid: uint72) -> uint32:
+    return self._load_feed(scid).count
+
+@external
+@view
+def interval_ema(scid: uint72) -> uint256:
+    return self._load_feed(scid).interval_ema
+
+@internal
+@view
+def _feed_scale(scid: uint72) -> uint256:
+    return self.feed_state[scid][1] >> SCALE_SHIFT
+
+@internal
+@view
+def _load_feed(scid: uint72) -> FeedState:
+    words: uint256[2] = self.feed_state[scid]
+    w0: int256 = convert(convert(words[0], bytes32), int256)
+
+    return FeedState(error_integral=(w0 << 96) >> 96,
+                     last_output=w0 >> 160,
+                     interval_ema=words[1] & MASK_128,
+                     count=convert((words[1] >> 128) & MASK_32, uint32),
+                     scale=words[1] >> SCALE_SHIFT)
+
+@internal
+def _store_feed(scid: uint72, state: FeedState):
+    # convert reverts if error_integral/last_output leave their int160/int96 range
+    error_integral: uint256 = convert(convert(convert(state.error_integral, int160), bytes32), uint256) & MASK_160
+    last_output: uint256 = convert(convert(convert(state.last_output, int96), bytes32), uint256) & MASK_96
+    assert state.interval_ema <= MASK_128, "RewardController/interval_ema-overflow"
+
+    self.feed_state[scid] = [error_integral | (last_output << 160),
+                             state.interval_ema | (convert(state.count, uint256) << 128) | (state.scale << SCALE_SHIFT)]
 
 @external
 def freeze():
@@ -197,6 +315,28 @@ def disable_rewards():
     self.rewards_enabled = False
     log RewardsToggled(rewards_on=False)
 
+@external
+def enable_compact_logs():
+    assert self.authorities[msg.sender]
+    self.compact_logs = True
+
+@external
+def disable_compact_logs():
+    assert self.authorities[msg.sender]
+    self.compact_logs = False
+
+@external
+def enable_gas_price_receipts():
+    assert self.authorities[msg.sender]
+    # the combined record pairs basefee with its tip type
+    assert self.tip_reward_type == GAS_PRICE_TIP_TYPE, "RewardController/invalid-tip-type"
+    self.gas_price_receipts = True
+
+@external
+def disable_gas_price_receipts():
+    assert self.authorities[msg.sender]
+    self.gas_price_receipts = False
+
 @external
 def modify_parameters_addr(parameter: String[32], addr: address):
     assert self.authorities[msg.sender]
@@ -211,9 +351,11 @@ def modify_parameters_int(parameter: String[32], val: int256):
     assert self.authorities[msg.sender]
     if (parameter == "output_upper_bound"):
         assert val > self.output_lower_bound, "RewardController/invalid-output_upper_bound"
+        assert val <= MAX_OUTPUT, "RewardController/invalid-output_upper_bound"
         self.output_upper_bound = val
     elif (parameter == "output_lower_bound"):
         assert val < self.output_upper_bound, "RewardController/invalid-output_lower_bound"
+        assert val >= MIN_OUTPUT, "RewardController/invalid-output_lower_bound"
         self.output_lower_bound = val
     else:
         raise "RewardController/modify-unrecognized-param"
@@ -249,9 +391,24 @@ def modify_parameters_uint(parameter: String[32], val: uint256):
 
 @internal
 @view
-def _bound_pi_output(pi_output: int256) -> int256:
-    lb: int256 = self.output_lower_bound 
-    ub: int256 = self.output_upper_bound
+def _load_config() -> ControllerConfig:
+    return ControllerConfig(rewards_enabled=self.rewards_enabled,
+                            min_window_size=self.min_window_size,
+                            target_time_since=self.target_time_since,
+                            control_output=self.control_output,
+                            output_upper_bound=self.output_upper_bound,
+                            output_lower_bound=self.output_lower_bound,
+                            coeff=self.coeff,
+                            min_time_reward=self.min_time_reward,
+                            max_time_reward=self.max_time_reward,
+                            min_deviation_reward=self.min_deviation_reward,
+                            max_deviation_reward=self.max_deviation_reward)
+
+@internal
+@pure
+def _bound_pi_output(pi_output: int256, cfg: ControllerConfig) -> int256:
+    lb: int256 = cfg.output_lower_bound
+    ub: int256 = cfg.output_upper_bound
 
     if pi_output < lb:
         return lb
@@ -263,26 +420,27 @@ def _bound_pi_output(pi_output: int256) -> int256:
 @external
 @view
 def bound_pi_output(pi_output: int256) -> int256:
-    return self._bound_pi_output(pi_output)
+    return self._bound_pi_output(pi_output, self._load_config())
 
 @external
 @view
 def clamp_error_integral(bounded_pi_output:int256, error_integral: int256, new_error_integral: int256, new_area: int256) -> int256:
-    return self._clamp_error_integral(bounded_pi_output, error_integral, new_error_integral, new_area)
+    return self._clamp_error_integral(bounded_pi_output, error_integral, new_error_integral, new_area, self._load_config())
 
 @internal
-@view
+@pure
 def _clamp_error_integral(
     bounded_pi_output: int256,
     error_integral:    int256,
     new_error_integral: int256,
-    new_area:           int256
+    new_area:           int256,
+    cfg:                ControllerConfig
 ) -> int256:
     # This logic is strictly for a *reverse-acting* controller where controller
     # output is opposite sign of error(kp and ki < 0)
 
-    lb: int256 = self.output_lower_bound
-    ub: int256 = self.output_upper_bound
+    lb: int256 = cfg.output_lower_bound
+    ub: int256 = cfg.output_upper_bound
 
     if (
         (bounded_pi_output == lb and new_area > 0  and error_integral > 0)
@@ -297,7 +455,7 @@ def _clamp_error_integral(
 @internal
 @view
 def _get_new_error_integral(scid: uint72, error: int256) -> (int256, int256):
-    return (self.error_integral[scid] + error, error)
+    return (self._load_feed(scid).error_integral + error, error)
 
 @external
 @view
@@ -305,19 +463,18 @@ def get_new_error_integral(scid: uint72, error: int256) -> (int256, int256):
     return self._get_new_error_integral(scid, error)
 
 @internal
-@view
-def _get_raw_pi_output(error: int256, errorI: int256) -> int256:
+@pure
+def _get_raw_pi_output(error: int256, errorI: int256, cfg: ControllerConfig) -> int256:
     # output = P + I = Kp * error + Ki * errorI
-    control_output: ControlOutput = self.control_output
-    p_output: int256 = (error * convert(control_output.kp, int256)) // EIGHTEEN_DECIMAL_NUMBER
-    i_output: int256 = (errorI * convert(control_output.ki, int256)) // EIGHTEEN_DECIMAL_NUMBER
+    p_output: int256 = (error * convert(cfg.control_output.kp, int256)) // EIGHTEEN_DECIMAL_NUMBER
+    i_output: int256 = (errorI * convert(cfg.control_output.ki, int256)) // EIGHTEEN_DECIMAL_NUMBER
 
-    return convert(control_output.co_bias, int256) + p_output + i_output
+    return convert(cfg.control_output.co_bias, int256) + p_output + i_output
 
 @external
 @view
 def get_raw_pi_output(error: int256, errorI: int256) -> int256:
-    return self._get_raw_pi_output(error, errorI)
+    return self._get_raw_pi_output(error, errorI, self._load_config())
 
 @external
 @pure
@@ -332,44 +489,36 @@ def _error(target: int256, measured: int256) -> int256:
 @external
 @view
 def calc_deviation(scid: uint72, value_diff: uint256) -> uint256:
-    return self._calc_deviation(scid, value_diff)
+    return self._calc_deviation(self._feed_scale(scid), value_diff)
 
 @internal
-@view
-def _calc_deviation(scid: uint72, value_diff: uint256) -> uint256:
+@pure
+def _calc_deviation(target_scale: uint256, value_diff: uint256) -> uint256:
     # calculates how many scales the new_value has deviated from current_value
-    target_scale: uint256 = self.scales[scid]
     assert target_scale != 0, "unknown scid"
 
     return value_diff*EIGHTEEN_DECIMAL_NUMBER_U//target_scale
 
 @internal
-def _calc_reward_mult(scid: uint72, time_since: uint256) -> int256:
-    count: uint32 = self.count[scid]
-    min_window_size: uint32 = self.min_window_size
-
+@pure
+def _calc_reward_mult(state: FeedState, time_since: uint256, cfg: ControllerConfig) -> (int256, FeedState):
     # update oracle update_interval
-    interval_ema: uint256 = self._update_interval_ema(scid, time_since)
+    feed: FeedState = self._update_interval_ema(state, time_since)
 
     # Dont use feedback if number of samples is lt window size
-    if count + 1 < min_window_size:
-        self.count[scid] = count + 1
-        return EIGHTEEN_DECIMAL_NUMBER
+    if feed.count + 1 < cfg.min_window_size:
+        feed.count += 1
+        return EIGHTEEN_DECIMAL_NUMBER, feed
 
-    update_interval: int256 = convert(interval_ema, int256)
-    error: int256 = self._error(convert(self.target_time_since, int256), update_interval)
-
-    reward_mult: int256 = 0
-    #p_output: int256 = 0
-    #i_output: int256 = 0
+    update_interval: int256 = convert(feed.interval_ema, int256)
+    error: int256 = self._error(convert(cfg.target_time_since, int256), update_interval)
 
     # update feedback mechanism and get current reward multiplier
-    #reward_mult, p_output, i_output = self._update(scid, error)[0]
-    reward_mult = self._update_feedback(scid, error)
+    feed = self._update_feedback(feed, error, cfg)
 
-    self.count[scid] = count + 1
+    feed.count += 1
 
-    return reward_mult
+    return feed.last_output, feed
 
 @internal
 def _add_updater(updater: address):
@@ -395,29 +544,81 @@ def get_updaters_chunk(start: uint256, count: uint256) -> DynArray[TotalRewards,
 
     return total_rewards
 
+@internal
+def _store_values(dat: Bytes[MAX_PAYLOAD_SIZE], fee: uint256) -> DynArray[GasPriceReceipt, MAX_PAYLOADS]:
+    assert not self.frozen, "Rewards contract is frozen"
+    assert fee >= self.min_fee, "Paid fee is too low"
+
+    # dat may mix per chain sub-payloads and envelopes signing several chains at once,
+    # receipts are one per chain in record order either way
+    if self.gas_price_receipts:
+        return extcall self.oracle.storeValuesWithGasPriceReceipt(dat, value=fee)
+
+    records: DynArray[RecordReceipt, MAX_PAYLOADS] = extcall self.oracle.storeValuesWithReceipt(dat, value=fee)
+    receipts: DynArray[GasPriceReceipt, MAX_PAYLOADS] = []
+
+    tip_reward_type: uint16 = self.tip_reward_type
+    tip: RecordReceipt = empty(RecordReceipt)
+    bf: RecordReceipt = empty(RecordReceipt)
+    tip_found: bool = False
+    bf_found: bool = False
+
+    for rec: RecordReceipt in records:
+        if rec.typ == tip_reward_type:
+            tip = rec
+            tip_found = True
+        elif rec.typ == BASEFEE_REWARD_TYPE:
+            bf = rec
+            bf_found = True
+        else:
+            continue
+
+        # tip and bf found for this cid, time to pair them
+        if not (tip_found and bf_found):
+            continue
+
+        assert tip.systemid == bf.systemid, "System IDs for tip and basefee types don't match. Out of order data?"
+        assert tip.cid == bf.cid, "Chain IDs for tip and basefee types don't match. Out of order data?"
+
+        # reset these
+        tip_found = False
+        bf_found = False
+
+        # heights and timestamps of the later of the two, as they were paired before
+        receipts.append(GasPriceReceipt(systemid=rec.systemid,
+                                        cid=rec.cid,
+                                        old_height=rec.old_height,
+                                        old_timestamp=rec.old_timestamp,
+                                        old_value=tip.old_value + bf.old_value,
+                                        new_height=rec.new_height,
+                                        new_timestamp=rec.new_timestamp,
+                                        new_value=tip.new_value + bf.new_value))
+
+    return receipts
+
 @external
 @payable
 def update_many(dat: Bytes[MAX_PAYLOAD_SIZE]) -> DynArray[EnhancedReward, MAX_PAYLOADS]:
-    assert not self.frozen, "Rewards contract is frozen"
-    assert msg.value >= self.min_fee, "Paid fee is too low"
+    return self._update_many(self._store_values(dat, msg.value), True)
 
-    receipts: DynArray[RecordReceipt, MAX_PAYLOADS] = extcall self.oracle.storeValuesWithReceipt(dat, value=msg.value)
-    rewards: DynArray[EnhancedReward, MAX_PAYLOADS] = []
+@external
+@payable
+def update_many_no_return(dat: Bytes[MAX_PAYLOAD_SIZE]):
+    # for keepers that don't read the result, skips building the EnhancedReward array
+    self._update_many(self._store_values(dat, msg.value), False)
 
-    tip_reward_type: uint16 = self.tip_reward_type
-    coeff: Coefficients = self.coeff
-    old_tip_val: uint240 = 0
-    old_bf_val: uint240 = 0
-    new_tip_val: uint240 = 0
-    new_bf_val: uint240 = 0
+@internal
+def _update_many(receipts: DynArray[GasPriceReceipt, MAX_PAYLOADS],
+                 return_rewards: bool) -> DynArray[EnhancedReward, MAX_PAYLOADS]:
+    rewards: DynArray[EnhancedReward, MAX_PAYLOADS] = []
 
-    tip_system_id: uint8 = 0
-    tip_chain_id: uint64 = 0
-    bf_system_id: uint8 = 0
-    bf_chain_id: uint64 = 0
+    # reward configuration is only needed, and only read, when rewards are on
+    cfg: ControllerConfig = empty(ControllerConfig)
+    if self.rewards_enabled:
+        cfg = self._load_config()
 
-    bf_found: bool = False
-    tip_found: bool = False
+    compact_logs: bool = self.compact_logs
+    updates: DynArray[uint256[4], MAX_PAYLOADS] = []
 
     old_gasprice: uint240 = 0
     new_gasprice: uint240 = 0
@@ -432,51 +633,29 @@ def update_many(dat: Bytes[MAX_PAYLOAD_SIZE]) -> DynArray[EnhancedReward, MAX_PA
     deviation_reward_adj_u: uint256 = 0
     scid: uint72 = 0
 
+    # rewards are accumulated here and written to storage once after the loop
+    updater_rewards: uint256 = 0
+
     self._add_updater(msg.sender)
 
-    for rec: RecordReceipt in receipts:
+    for rec: GasPriceReceipt in receipts:
         sid: uint8 = rec.systemid
         cid: uint64 = rec.cid
 
-        if rec.typ == tip_reward_type:
-            old_tip_val = rec.old_value
-            new_tip_val = rec.new_value
-            tip_system_id = sid
-            tip_chain_id = cid
-            tip_found = True
-        elif rec.typ == BASEFEE_REWARD_TYPE:
-            old_bf_val = rec.old_value
-            new_bf_val = rec.new_value
-            bf_system_id = sid
-            bf_chain_id = cid
-            bf_found = True
-        else:
-            continue
-
-        # tip and bf found for this cid, time to process
-        if not (tip_found and bf_found):
-            continue
+        old_gasprice = rec.old_value
 
-        assert tip_system_id == bf_system_id, "System IDs for tip and basefee types don't match. Out of order data?"
-        assert tip_chain_id == bf_chain_id, "Chain IDs for tip and basefee types don't match. Out of order data?"
-
-        # reset these
-        tip_found = False
-        bf_found = False
-
-        old_gasprice = old_tip_val + old_bf_val
-      
-        # zero new_height means this type was not updated, so no reward
+        # zero new_height means this chain was not updated, so no reward
         if (rec.new_height == 0):
-            rewards.append(EnhancedReward(system_id=sid,
-                                          chain_id=cid,
-                                          height=rec.old_height,
-                                          gas_price=old_gasprice,
-                                          time_reward=0,
-                                          deviation_reward=0))
+            if return_rewards:
+                rewards.append(EnhancedReward(system_id=sid,
+                                              chain_id=cid,
+                                              height=rec.old_height,
+                                              gas_price=old_gasprice,
+                                              time_reward=0,
+                                              deviation_reward=0))
             continue
 
-        new_gasprice = new_tip_val + new_bf_val
+        new_gasprice = rec.new_value
 
         scid = convert(shift(convert(rec.cid, uint256), 8) | convert(sid, uint256), uint72)
 
@@ -487,34 +666,45 @@ def update_many(dat: Bytes[MAX_PAYLOAD_SIZE]) -> DynArray[EnhancedReward, MAX_PA
         else:
             raw_deviation = old_gasprice - new_gasprice
 
-        # deviation and time_since are used to calculate rewards
-        deviation = self._calc_deviation(scid, convert(raw_deviation, uint256))
         time_since = convert(rec.new_timestamp - rec.old_timestamp, uint256) * EIGHTEEN_DECIMAL_NUMBER_U
 
         # Dont reward
-        if not self.rewards_enabled:
-            log OracleUpdated(updater=msg.sender, system_id=sid, chain_id=cid,
-                              new_value=new_gasprice, raw_deviation=raw_deviation,
-                              time_since=convert(time_since//10**21, uint48),
-                              time_reward=0, deviation_reward=0,
-                              reward_mult=0)
-
-            rewards.append(EnhancedReward(system_id=sid,
-                                          chain_id=cid,
-                                          height=rec.old_height,
-                                          gas_price=old_gasprice,
-                                          time_reward=0,
-                                          deviation_reward=0))
+        if not cfg.rewards_enabled:
+            # still reverts on an unknown scid
+            deviation = self._calc_deviation(self._feed_scale(scid), convert(raw_deviation, uint256))
+
+            if compact_logs:
+                updates.append(self._pack_update(sid, cid, new_gasprice, raw_deviation,
+                                                 convert(time_since//10**21, uint48), 0, 0, 0))
+            else:
+                log OracleUpdated(updater=msg.sender, system_id=sid, chain_id=cid,
+                                  new_value=new_gasprice, raw_deviation=raw_deviation,
+                                  time_since=convert(time_since//10**21, uint48),
+                                  time_reward=0, deviation_reward=0,
+                                  reward_mult=0)
+
+            if return_rewards:
+                rewards.append(EnhancedReward(system_id=sid,
+                                              chain_id=cid,
+                                              height=rec.old_height,
+                                              gas_price=old_gasprice,
+                                              time_reward=0,
+                                              deviation_reward=0))
             continue
         else:
+            feed: FeedState = self._load_feed(scid)
+
+            # deviation and time_since are used to calculate rewards
+            deviation = self._calc_deviation(feed.scale, convert(raw_deviation, uint256))
 
             # calculate reward
             time_reward, deviation_reward = self._calc_reward(convert(time_since, int256)//1000,
                                                               convert(deviation, int256),
-                                                              coeff)
+                                                              cfg)
          
             # calculate reward multiplier
-            reward_mult = self._calc_reward_mult(scid, time_since//1000)
+            reward_mult, feed = self._calc_reward_mult(feed, time_since//1000, cfg)
+            self._store_feed(scid, feed)
 
             # adjust rewards with multiplier
             time_reward_adj = reward_mult * time_reward // EIGHTEEN_DECIMAL_NUMBER
@@ -523,91 +713,123 @@ def update_many(dat: Bytes[MAX_PAYLOAD_SIZE]) -> DynArray[EnhancedReward, MAX_PA
             time_reward_adj_u = convert(time_reward_adj, uint256)
             deviation_reward_adj_u = convert(deviation_reward_adj, uint256)
 
-            # store rewards
-            self.rewards[msg.sender] += time_reward_adj_u + deviation_reward_adj_u
-            self.total_rewards += time_reward_adj_u + deviation_reward_adj_u
-
-            log OracleUpdated(updater=msg.sender, system_id=sid, chain_id=cid,
-                              new_value=new_gasprice, raw_deviation=raw_deviation,
-                              time_since=convert(time_since//10**21, uint48),
-                              time_reward=time_reward_adj_u, deviation_reward=deviation_reward_adj_u,
-                              reward_mult=reward_mult)
-
-            rewards.append(EnhancedReward(system_id=sid,
-                                          chain_id=cid,
-                                          height=rec.old_height,
-                                          gas_price=old_gasprice,
-                                          time_reward=time_reward_adj_u,
-                                          deviation_reward=deviation_reward_adj_u))
+            updater_rewards += time_reward_adj_u + deviation_reward_adj_u
+
+            # reward_mult is within the output bounds, inside int128, the rewards may not fit uint128
+            if compact_logs and time_reward_adj_u <= MASK_128 and deviation_reward_adj_u <= MASK_128:
+                updates.append(self._pack_update(sid, cid, new_gasprice, raw_deviation,
+                                                 convert(time_since//10**21, uint48),
+                                                 time_reward_adj_u, deviation_reward_adj_u, reward_mult))
+            else:
+                log OracleUpdated(updater=msg.sender, system_id=sid, chain_id=cid,
+                                  new_value=new_gasprice, raw_deviation=raw_deviation,
+                                  time_since=convert(time_since//10**21, uint48),
+                                  time_reward=time_reward_adj_u, deviation_reward=deviation_reward_adj_u,
+                                  reward_mult=reward_mult)
+
+            if return_rewards:
+                rewards.append(EnhancedReward(system_id=sid,
+                                              chain_id=cid,
+                                              height=rec.old_height,
+                                              gas_price=old_gasprice,
+                                              time_reward=time_reward_adj_u,
+                                              deviation_reward=deviation_reward_adj_u))
+
+    # store rewards
+    if updater_rewards != 0:
+        self.rewards[msg.sender] += updater_rewards
+        self.total_rewards += updater_rewards
+
+    if len(updates) != 0:
+        log OraclesUpdated(updater=msg.sender, updates=updates)
 
     return rewards
 
+@internal
+@pure
+def _pack_update(system_id: uint8, chain_id: uint64, new_value: uint240, raw_deviation: uint240, time_since: uint48,
+                 time_reward: uint256, deviation_reward: uint256, reward_mult: int256) -> uint256[4]:
+    # word 0: system_id (8) | new_value (240)
+    # word 1: raw_deviation (240)
+    # word 2: chain_id (64) | time_since (48) | reward_mult (int128)
+    # word 3: time_reward (uint128) | deviation_reward (uint128)
+    # convert reverts rather than truncate if a reward or reward_mult leaves its 128 bit range,
+    # _update_many only packs the updates that fit
+    mult: uint256 = convert(convert(convert(reward_mult, int128), bytes32), uint256) & MASK_128
+
+    return [(convert(system_id, uint256) << 240) | convert(new_value, uint256),
+            convert(raw_deviation, uint256),
+            (convert(chain_id, uint256) << 176) | (convert(time_since, uint256) << 128) | mult,
+            (convert(convert(time_reward, uint128), uint256) << 128) | convert(convert(deviation_reward, uint128), uint256)]
+
 @external
 @view
 def calc_reward(time_since: int256, deviation: int256) -> (int256, int256):
-    coeff: Coefficients = self.coeff
-    return self._calc_reward(time_since, deviation, coeff)
+    return self._calc_reward(time_since, deviation, self._load_config())
 
 @external
 @view
 def calc_time_reward(time_since: int256) -> int256:
-    coeff: Coefficients = self.coeff
-    return self._calc_time_reward(time_since, coeff)
+    return self._calc_time_reward(time_since, self._load_config())
 
 @internal
-@view
-def _calc_time_reward(time_since: int256, coeff: Coefficients) -> int256:
-    return max(min(convert(coeff.zero, int256)*time_since//EIGHTEEN_DECIMAL_NUMBER + 
-           convert(coeff.two, int256)*time_since*time_since//THIRTY_SIX_DECIMAL_NUMBER, self.max_time_reward), self.min_time_reward)
+@pure
+def _calc_time_reward(time_since: int256, cfg: ControllerConfig) -> int256:
+    return max(min(convert(cfg.coeff.zero, int256)*time_since//EIGHTEEN_DECIMAL_NUMBER + 
+           convert(cfg.coeff.two, int256)*time_since*time_since//THIRTY_SIX_DECIMAL_NUMBER, cfg.max_time_reward), cfg.min_time_reward)
 
 @external
 @view
 def calc_deviation_reward(deviation: int256) -> int256:
-    coeff: Coefficients = self.coeff
-    return self._calc_deviation_reward(deviation, coeff)
+    return self._calc_deviation_reward(deviation, self._load_config())
 
 @internal
-@view
-def _calc_deviation_reward(deviation: int256, coeff: Coefficients) -> int256:
-    return max(min(convert(coeff.one, int256)*deviation//EIGHTEEN_DECIMAL_NUMBER +
-           convert(coeff.three, int256)*deviation*deviation//THIRTY_SIX_DECIMAL_NUMBER, self.max_deviation_reward), self.min_deviation_reward)
+@pure
+def _calc_deviation_reward(deviation: int256, cfg: ControllerConfig) -> int256:
+    return max(min(convert(cfg.coeff.one, int256)*deviation//EIGHTEEN_DECIMAL_NUMBER +
+           convert(cfg.coeff.three, int256)*deviation*deviation//THIRTY_SIX_DECIMAL_NUMBER, cfg.max_deviation_reward), cfg.min_deviation_reward)
 
 @internal
-@view
-def _calc_reward(time_since: int256, deviation: int256, coeff: Coefficients) -> (int256, int256):
-    return self._calc_time_reward(time_since, coeff), self._calc_deviation_reward(deviation, coeff)
+@pure
+def _calc_reward(time_since: int256, deviation: int256, cfg: ControllerConfig) -> (int256, int256):
+    return self._calc_time_reward(time_since, cfg), self._calc_deviation_reward(deviation, cfg)
 
 @external
 def test_update_interval_ema(scid: uint72, new_value: uint256) -> uint256:
-    return self._update_interval_ema(scid, new_value)
+    feed: FeedState = self._update_interval_ema(self._load_feed(scid), new_value)
+    self._store_feed(scid, feed)
+    return feed.interval_ema
 
 @internal
-def _update_interval_ema(scid: uint72, new_value: uint256) -> uint256:
-    current_ema: uint256 = self.interval_ema[scid]
-    new_ema: uint256 = (ALPHA_COMP * new_value + EMA_ALPHA * current_ema)//EIGHTEEN_DECIMAL_NUMBER_U
-    self.interval_ema[scid] = new_ema
-    return new_ema
+@pure
+def _update_interval_ema(state: FeedState, new_value: uint256) -> FeedState:
+    feed: FeedState = state
+    feed.interval_ema = (ALPHA_COMP * new_value + EMA_ALPHA * state.interval_ema)//EIGHTEEN_DECIMAL_NUMBER_U
+    return feed
 
 @external
 def test_update_feedback(scid: uint72, error: int256) -> int256:
-    return self._update_feedback(scid, error)
+    feed: FeedState = self._update_feedback(self._load_feed(scid), error, self._load_config())
+    self._store_feed(scid, feed)
+    return feed.last_output
 
 @internal
-def _update_feedback(scid: uint72, error: int256) -> int256:
+@pure
+def _update_feedback(state: FeedState, error: int256, cfg: ControllerConfig) -> FeedState:
     # update feedback mechanism
-    error_integral: int256 = self.error_integral[scid]
-    new_error_integral: int256 = error_integral + error
+    feed: FeedState = state
+    new_error_integral: int256 = state.error_integral + error
 
     pi_output: int256 = 0
-    pi_output = self._get_raw_pi_output(error, new_error_integral)
+    pi_output = self._get_raw_pi_output(error, new_error_integral, cfg)
 
-    bounded_pi_output: int256 = self._bound_pi_output(pi_output)
+    bounded_pi_output: int256 = self._bound_pi_output(pi_output, cfg)
 
-    self.error_integral[scid] = self._clamp_error_integral(bounded_pi_output, error_integral, new_error_integral, error)
+    feed.error_integral = self._clamp_error_integral(bounded_pi_output, state.error_integral, new_error_integral, error, cfg)
 
-    self.last_output[scid] = bounded_pi_output
+    feed.last_output = bounded_pi_output
 
-    return bounded_pi_output
+    return feed
 
 @external
 @view
@@ -621,9 +843,10 @@ def _get_new_pi_output(scid:  uint72, error: int256) -> int256:
     tmp: int256 = 0
     (new_error_integral, tmp) = self._get_new_error_integral(scid, error)
 
+    cfg: ControllerConfig = self._load_config()
     pi_output: int256 = 0
-    pi_output = self._get_raw_pi_output(error, new_error_integral)
+    pi_output = self._get_raw_pi_output(error, new_error_integral, cfg)
 
-    bounded_pi_output: int256 = self._bound_pi_output(pi_output)
+    bounded_pi_output: int256 = self._bound_pi_output(pi_output, cfg)
 
     return bounded_pi_output
@@ -0,0 +1,200 @@
+"""
+Batched view reads of the Oracle and RewardController.
+
+A monitoring pass needs, for every feed, the basefee and tip records from the
+Oracle and scales, error_integral, last_output, interval_ema and count from the
+controller, and the rewards of every updater. Read one getter at a time that is
+O(feeds x fields) round trips. BatchReader packs the record reads into
+getRecords(uint88[]) calls, CHUNK_SIZE keys each, and sends them with every
+controller read as JSON-RPC batch requests of up to max_batch calls, so a pass
+over every feed takes a handful of round trips. A snapshot reads everything at
+one block, so the records, feeds and rewards it returns are consistent.
+
+Providers that don't support batch requests (EthereumTesterProvider, the ape
+test provider) get the same calls one at a time, round_trips counts what was
+actually sent.
+
+BatchReader takes web3 contracts, ape contracts are converted by web3_contract:
+
+    ape run scripts/batch_reads.py --network ethereum:sepolia:infura
+"""
+from typing import NamedTuple
+
+from web3.exceptions import Web3TypeError
+
+from scripts import controller_model as cm
+from scripts.oracle_mirror import BASEFEE_TYPE, TIP_TYPE, Record
+
+# keys per getRecords call
+CHUNK_SIZE = 256
+# calls per JSON-RPC batch request, providers commonly cap batches at 100 to 1000
+DEFAULT_BATCH_SIZE = 100
+
+FEED_FIELDS = ('error_integral', 'last_output', 'interval_ema', 'count', 'scales')
+CONFIG_FIELDS = ('rewards_enabled', 'min_window_size', 'target_time_since', 'control_output',
+                 'output_upper_bound', 'output_lower_bound', 'coeff', 'min_time_reward',
+                 'max_time_reward', 'min_deviation_reward', 'max_deviation_reward')
+
+class Feed(NamedTuple):
+    error_integral: int
+    last_output: int
+    interval_ema: int
+    count: int
+    scale: int
+
+class Snapshot(NamedTuple):
+    block: int
+    cfg: cm.ControllerConfig
+    rewards_enabled: bool
+    records: dict
+    feeds: dict
+    rewards: dict
+
+    def gas_price(self, sid, cid, tip_type=TIP_TYPE):
+        """ (basefee + tip, height, timestamp) like Oracle.getGasPrice, tip_type has to be one of the types read """
+        basefee = self.records[(sid, cid, BASEFEE_TYPE)]
+        tip = self.records[(sid, cid, tip_type)]
+        return basefee.value + tip.value, basefee.height, basefee.timestamp
+
+def record_key(sid, cid, typ):
+    """ the Oracle's uint88 record key """
+    return sid << 80 | cid << 16 | typ
+
+def _scid(sid, cid):
+    return cid << 8 | sid
+
+def _config(values):
+    v = dict(zip(CONFIG_FIELDS, values))
+    kp, ki, co_bias = v['control_output']
+    return cm.ControllerConfig(min_window_size=v['min_window_size'],
+                               target_time_since=v['target_time_since'],
+                               kp=kp,
+                               ki=ki,
+                               co_bias=co_bias,
+                               output_upper_bound=v['output_upper_bound'],
+                               output_lower_bound=v['output_lower_bound'],
+                               coeff=tuple(v['coeff']),
+                               min_time_reward=v['min_time_reward'],
+                               max_time_reward=v['max_time_reward'],
+                               min_deviation_reward=v['min_deviation_reward'],
+                               max_deviation_reward=v['max_deviation_reward'])
+
+class BatchReader:
+    def __init__(self, w3, controller, oracle, max_batch=DEFAULT_BATCH_SIZE, chunk_size=CHUNK_SIZE):
+        self.w3 = w3
+        self.controller = controller
+        self.oracle = oracle
+        self.max_batch = max_batch
+        self.chunk_size = chunk_size
+        self.batching = True
+        self.round_trips = 0
+        self._get_records = oracle.get_function_by_signature('getRecords(uint88[])')
+
+    def _call_batch(self, calls, block):
+        if self.batching:
+            try:
+                with self.w3.batch_requests() as batch:
+                    for fn in calls:
+                        batch.add(fn.call(block_identifier=block))
+                    results = batch.execute()
+                self.round_trips += 1
+                return results
+            except Web3TypeError:
+                # the provider doesn't support batch requests
+                self.batching = False
+        self.round_trips += len(calls)
+        return [fn.call(block_identifier=block) for fn in calls]
+
+    def call(self, calls, block='latest'):
+        """ results of calls, contract functions with their arguments, read at block, in order """
+        calls = list(calls)
+        results = []
+        for i in range(0, len(calls), self.max_batch):
+            results.extend(self._call_batch(calls[i:i + self.max_batch], block))
+        return results
+
+    def _record_calls(self, keys):
+        return [self._get_records([record_key(*k) for k in keys[i:i + self.chunk_size]])
+                for i in range(0, len(keys), self.chunk_size)]
+
+    def _feed_calls(self, chains):
+        return [getattr(self.controller.functions, field)(_scid(sid, cid)) for sid, cid in chains for field in FEED_FIELDS]
+
+    def _reward_calls(self, updaters):
+        return [self.controller.functions.rewards(a) for a in updaters]
+
+    def _config_calls(self):
+        return [getattr(self.controller.functions, field)() for field in CONFIG_FIELDS]
+
+    @staticmethod
+    def _records(keys, results):
+        return dict(zip(keys, (Record(*r) for chunk in results for r in chunk)))
+
+    @staticmethod
+    def _feeds(chains, results):
+        n = len(FEED_FIELDS)
+        return {chain: Feed(*results[i * n:(i + 1) * n]) for i, chain in enumerate(chains)}
+
+    def records(self, keys, block='latest'):
+        """ Oracle records of keys, (sid, cid, typ) tuples """
+        keys = list(keys)
+        return self._records(keys, self.call(self._record_calls(keys), block))
+
+    def feeds(self, chains, block='latest'):
+        """ controller feed state of chains, (sid, cid) pairs """
+        chains = list(chains)
+        return self._feeds(chains, self.call(self._feed_calls(chains), block))
+
+    def rewards(self, updaters, block='latest'):
+        """ accrued rewards of updaters """
+        updaters = list(updaters)
+        return dict(zip(updaters, self.call(self._reward_calls(updaters), block)))
+
+    def snapshot(self, chains, updaters=(), types=(BASEFEE_TYPE, TIP_TYPE), block=None):
+        """
+        the controller configuration, the records of types and feed state of chains, (sid, cid)
+        pairs, and the rewards of updaters, all read at block (the latest by default)
+        """
+        chains, updaters = list(chains), list(updaters)
+        keys = [(sid, cid, typ) for sid, cid in chains for typ in types]
+        if block is None:
+            block = self.w3.eth.block_number
+            self.round_trips += 1
+
+        config_calls = self._config_calls()
+        record_calls = self._record_calls(keys)
+        feed_calls = self._feed_calls(chains)
+        results = self.call(config_calls + record_calls + feed_calls + self._reward_calls(updaters), block)
+
+        config, results = results[:len(config_calls)], results[len(config_calls):]
+        records, results = results[:len(record_calls)], results[len(record_calls):]
+        feeds, rewards = results[:len(feed_calls)], results[len(feed_calls):]
+        return Snapshot(block=block,
+                        cfg=_config(config),
+                        rewards_enabled=config[0],
+                        records=self._records(keys, records),
+                        feeds=self._feeds(chains, feeds),
+                        rewards=dict(zip(updaters, rewards)))
+
+def web3_contract(w3, contract):
+    """ a web3 contract of an ape contract instance """
+    abi = [a.model_dump(mode='json', by_alias=True) for a in contract.contract_type.abi]
+    return w3.eth.contract(address=contract.address, abi=abi)
+
+def main():
+    from ape import chain, project
+
+    from scripts import params
+    from scripts.addresses import reward_addresses
+
+    controller = project.RewardController.at(reward_addresses[chain.chain_id])
+    oracle = project.Oracle.at(controller.oracle())
+    w3 = chain.provider.web3
+    reader = BatchReader(w3, web3_contract(w3, controller), web3_contract(w3, oracle))
+
+    snapshot = reader.snapshot(params.scales.keys())
+    print(f"block {snapshot.block}, {len(snapshot.feeds)} feeds in {reader.round_trips} round trips")
+    for (sid, cid), feed in snapshot.feeds.items():
+        gas_price, height, ts = snapshot.gas_price(sid, cid)
+        print(f"{sid} {cid:>10} gas price {gas_price:>16} height {height:>10} ts {ts} "
+              f"count {feed.count:>6} interval_ema {feed.interval_ema:>8} error_integral {feed.error_integral}")
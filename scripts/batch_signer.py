@@ -0,0 +1,90 @@
+"""
+Batch signing of Oracle payloads.
+
+sign_payloads signs many raw payloads (header and values, see
+scripts/payload_codec.py) on a process pool. The key is loaded once per worker,
+and each payload comes back with its 65 byte r, s, v signature appended (v is
+27 or 28, as the Oracle requires), byte for byte what tests/utils.sign_payload
+produces with the same key. frame joins signed payloads into one update_many
+payload.
+
+Signing runs on eth_keys, which uses coincurve when it is installed and is
+several times faster with it. To compare throughput with one at a time
+signing through eth_account, like the test helper:
+
+    python -m scripts.batch_signer --payloads 20000
+"""
+import argparse
+import os
+import time
+from multiprocessing import Pool
+
+from eth_hash.auto import keccak
+from eth_keys import keys
+
+from scripts import payload_codec
+
+DEFAULT_CHUNKSIZE = 256
+
+def _sign(private_key, data):
+    signature = private_key.sign_msg_hash(keccak(data))
+    return bytes(data) + signature.r.to_bytes(32, 'big') + signature.s.to_bytes(32, 'big') + bytes([signature.v + 27])
+
+def sign_payload(data, private_key):
+    """ data with its signature appended, private_key as bytes or hex """
+    return _sign(_load_key(private_key), data)
+
+def _load_key(private_key):
+    if isinstance(private_key, str):
+        private_key = bytes.fromhex(private_key.removeprefix('0x'))
+    return keys.PrivateKey(private_key)
+
+_key = None
+
+def _init_worker(private_key):
+    global _key
+    _key = _load_key(private_key)
+
+def _sign_worker(data):
+    return _sign(_key, data)
+
+def sign_payloads(payloads, private_key, processes=None, chunksize=DEFAULT_CHUNKSIZE):
+    """ signs every payload of payloads, in order, on a pool of processes (every core by default) """
+    with Pool(processes, initializer=_init_worker, initargs=(private_key,)) as pool:
+        return pool.map(_sign_worker, payloads, chunksize=chunksize)
+
+def frame(signed_payloads):
+    """ one update_many payload from signed payloads """
+    return payload_codec.DELIMITER.join(signed_payloads)
+
+def main():
+    from eth_account import Account
+
+    parser = argparse.ArgumentParser(description="compare batch signing with one at a time signing")
+    parser.add_argument('--payloads', type=int, default=20_000)
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args()
+
+    private_key = os.urandom(32)
+    payloads = [bytes(payload_codec.encode_payload(ts=1_700_000_000_000 + i, sid=2, cid=i % 8, height=i,
+                                                   typ_values={107: 10**9 + i, 322: 10**8 + i}))
+                for i in range(args.payloads)]
+
+    account = Account.from_key(private_key)
+    start = time.perf_counter()
+    serial = []
+    for data in payloads[:args.payloads // 10]:
+        signed = account.unsafe_sign_hash(keccak(data))
+        serial.append(data + signed.r.to_bytes(32, 'big') + signed.s.to_bytes(32, 'big') + bytes([signed.v]))
+    serial_rate = len(serial) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    signed = sign_payloads(payloads, private_key, processes=args.processes)
+    batch_rate = len(signed) / (time.perf_counter() - start)
+
+    assert signed[:len(serial)] == serial
+    print(f"one at a time: {serial_rate:,.0f} payloads/s")
+    print(f"batch ({args.processes or os.cpu_count()} processes): {batch_rate:,.0f} payloads/s")
+
+if __name__ == '__main__':
+    main()
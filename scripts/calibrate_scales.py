@@ -0,0 +1,227 @@
+"""
+Local calibration of params.scales.
+
+A feed's scale is the gas price change the controller counts as one deviation
+(RewardController._calc_deviation divides by it). Here it is estimated as a
+quantile, the median by default, of the absolute change of basefee + tip over
+`interval` ms, target_time_since by default, from a history csv in the
+scripts/replay.py format:
+
+    python -m scripts.calibrate_scales history.csv.gz --window-days 90 --chain-window 2:42161=30 --out scales.py
+
+The history is read once, in chunks. Each chain's gas price is sampled at the
+last record of every interval, and the changes between samples go into one
+quantile sketch per chain and day. Only the sketches of the last window-days are
+kept, so memory stays bounded whatever the length of the history. The output is
+a `scales = {...}` block to paste into scripts/params.py.
+
+The sketch stores counts in logarithmic buckets (as in DDSketch), so quantiles
+are within `relative_accuracy` of the exact value, and the sketches of several
+days merge exactly.
+"""
+import argparse
+import math
+from collections import deque
+
+import numpy as np
+
+from scripts import params
+from scripts import replay
+
+DAY_MS = 86_400_000
+CHUNK_SIZE = 1_000_000
+
+CHAIN_NAMES = {42161: 'arb', 10: 'op', 8453: 'base', 59144: 'linea', 1868: 'soneium', 130: 'unichain', 1: 'eth'}
+
+class QuantileSketch:
+    """ mergeable quantile sketch of non-negative values, with relative error relative_accuracy """
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, values):
+        """ adds a numpy array of values """
+        values = np.asarray(values, dtype=np.float64)
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        self.count += len(values)
+        if len(positive):
+            keys, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True)
+            for k, c in zip(keys.tolist(), counts.tolist()):
+                self.bins[k] = self.bins.get(k, 0) + c
+
+    def merge(self, other):
+        assert other.gamma == self.gamma, "sketches with different accuracies"
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.
+        seen = self.zeros
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                return 2 * self.gamma**k / (self.gamma + 1)
+
+class ChainWindow:
+    """ one sketch per day of the last window_days days of a chain """
+    def __init__(self, window_days, relative_accuracy):
+        self.window_days = window_days
+        self.relative_accuracy = relative_accuracy
+        self.days = deque()
+        self.last_sample = None
+        self.pending = None
+
+    def add(self, timestamps, changes):
+        """ adds changes measured at timestamps (ms, ascending) """
+        day_idx = timestamps // DAY_MS
+        for day in np.unique(day_idx).tolist():
+            if not self.days or self.days[-1][0] != day:
+                self.days.append((day, QuantileSketch(self.relative_accuracy)))
+            self.days[-1][1].add(changes[day_idx == day])
+
+        while self.days and self.days[0][0] <= self.days[-1][0] - self.window_days:
+            self.days.popleft()
+
+    def sketch(self):
+        merged = QuantileSketch(self.relative_accuracy)
+        for _, sketch in self.days:
+            merged.merge(sketch)
+        return merged
+
+class Calibration:
+    """
+    streaming state of a calibration. windows maps (sid, cid) to a window in days
+    overriding window_days
+    """
+    def __init__(self, interval=params.target_time_since // 10**15, window_days=90, windows={},
+                 relative_accuracy=0.01):
+        self.interval = interval
+        self.window_days = window_days
+        self.windows = dict(windows)
+        self.relative_accuracy = relative_accuracy
+        self.chains = {}
+
+    def add(self, records):
+        """ adds a chunk of (sid, cid, height, timestamp, basefee, tip) records """
+        if not records:
+            return
+        sid, cid, _, ts, basefee, tip = (np.array(col, dtype=np.int64) for col in zip(*records))
+        gas_price = basefee + tip
+
+        # per chain, the last record of every interval, in timestamp order
+        order = np.lexsort((ts, cid, sid))
+        sid, cid, ts, gas_price = sid[order], cid[order], ts[order], gas_price[order]
+        slot = ts // self.interval
+        last = np.ones(len(ts), dtype=bool)
+        last[:-1] = (sid[1:] != sid[:-1]) | (cid[1:] != cid[:-1]) | (slot[1:] != slot[:-1])
+        sid, cid, slot, gas_price = sid[last], cid[last], slot[last], gas_price[last]
+
+        starts = np.flatnonzero(np.r_[True, (sid[1:] != sid[:-1]) | (cid[1:] != cid[:-1])])
+        for start, end in zip(starts, np.r_[starts[1:], len(sid)]):
+            key = (int(sid[start]), int(cid[start]))
+            self._add_samples(key, slot[start:end], gas_price[start:end])
+
+    def _add_samples(self, key, slots, gas_prices):
+        chain = self.chains.get(key)
+        if chain is None:
+            chain = self.chains[key] = ChainWindow(self.windows.get(key, self.window_days), self.relative_accuracy)
+
+        # the last sample of a chunk is pending, the next chunk may hold a later record of its interval
+        if chain.pending is not None and chain.pending[0] != slots[0]:
+            slots = np.r_[chain.pending[0], slots]
+            gas_prices = np.r_[chain.pending[1], gas_prices]
+        chain.pending = (int(slots[-1]), int(gas_prices[-1]))
+        self._add_final(chain, slots[:-1], gas_prices[:-1])
+
+    def _add_final(self, chain, slots, gas_prices):
+        if chain.last_sample is not None:
+            slots = np.r_[chain.last_sample[0], slots]
+            gas_prices = np.r_[chain.last_sample[1], gas_prices]
+        if len(slots):
+            chain.last_sample = (int(slots[-1]), int(gas_prices[-1]))
+        if len(slots) > 1:
+            chain.add(slots[1:] * self.interval, np.abs(np.diff(gas_prices)))
+
+    def flush(self):
+        """ adds the pending samples, at the end of the history """
+        for chain in self.chains.values():
+            if chain.pending is not None:
+                slot, gas_price = chain.pending
+                chain.pending = None
+                self._add_final(chain, np.array([slot]), np.array([gas_price]))
+
+    def scales(self, quantile=0.5):
+        """ {(sid, cid): scale} of the chains seen, at least 1 since a scale of 0 means unknown scid """
+        self.flush()
+        scales = {}
+        for key, chain in sorted(self.chains.items()):
+            value = chain.sketch().quantile(quantile)
+            if value is not None:
+                scales[key] = max(int(round(value)), 1)
+        return scales
+
+def calibrate(records, quantile=0.5, chunk_size=CHUNK_SIZE, **kwargs):
+    """ scales of an iterable of records, read chunk_size records at a time """
+    calibration = Calibration(**kwargs)
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            calibration.add(chunk)
+            chunk = []
+    calibration.add(chunk)
+    return calibration.scales(quantile)
+
+def format_scales(scales):
+    """ scales as a scripts/params.py block """
+    lines = []
+    for i, ((sid, cid), scale) in enumerate(scales.items()):
+        end = '}' if i == len(scales) - 1 else ','
+        name = CHAIN_NAMES.get(cid)
+        lines.append(f"({sid}, {cid}): {scale}{end}" + (f" # {name}" if name else ""))
+    return "scales = {" + "\n ".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="calibrate params.scales from a gas price history")
+    parser.add_argument('history', help="csv of sid,cid,height,timestamp,basefee,tip records")
+    parser.add_argument('--quantile', type=float, default=0.5)
+    parser.add_argument('--interval', type=int, default=params.target_time_since // 10**15,
+                        help="ms between the gas price samples compared, target_time_since by default")
+    parser.add_argument('--window-days', type=int, default=90)
+    parser.add_argument('--chain-window', action='append', default=[], help="sid:cid=days, per chain window")
+    parser.add_argument('--relative-accuracy', type=float, default=0.01)
+    parser.add_argument('--out', help="file to write the scales block to")
+    args = parser.parse_args()
+
+    windows = {}
+    for w in args.chain_window:
+        chain, days = w.split('=')
+        sid, cid = chain.split(':')
+        windows[(int(sid), int(cid))] = int(days)
+
+    scales = calibrate(replay.read_history(args.history), quantile=args.quantile, interval=args.interval,
+                       window_days=args.window_days, windows=windows, relative_accuracy=args.relative_accuracy)
+    block = format_scales(scales)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(block + '\n')
+    print(block)
+
+    for key, scale in scales.items():
+        if key in params.scales:
+            print(f"# {key}: {params.scales[key]} -> {scale} ({scale / params.scales[key]:.2f}x)")
+
+if __name__ == '__main__':
+    main()
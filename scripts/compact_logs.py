@@ -0,0 +1,75 @@
+"""
+Decoder for the RewardController compact logging mode.
+
+With compact_logs enabled, update_many emits a single OraclesUpdated event per
+call instead of one OracleUpdated per feed. Each entry of its `updates` array
+packs the OracleUpdated fields of one feed into 4 words:
+
+    word 0: system_id (8) | new_value (240)
+    word 1: raw_deviation (240)
+    word 2: chain_id (64) | time_since (48) | reward_mult (int128)
+    word 3: time_reward (uint128) | deviation_reward (uint128)
+
+A feed whose time_reward or deviation_reward doesn't fit its 128 bits is left
+out of the array and logged with its own OracleUpdated in the same call.
+
+decode_oracles_updated expands them back into per-feed records with the same
+fields as OracleUpdated.
+"""
+from typing import NamedTuple
+
+from eth_abi import decode
+
+ORACLES_UPDATED_TYPES = ['address', 'uint256[4][]']
+
+MASK_48 = 2**48 - 1
+MASK_64 = 2**64 - 1
+MASK_128 = 2**128 - 1
+MASK_240 = 2**240 - 1
+
+class OracleUpdated(NamedTuple):
+    updater: str
+    system_id: int
+    chain_id: int
+    new_value: int
+    raw_deviation: int
+    time_since: int
+    time_reward: int
+    deviation_reward: int
+    reward_mult: int
+
+def pack_update(system_id, chain_id, new_value, raw_deviation, time_since, time_reward, deviation_reward, reward_mult):
+    """ python equivalent of RewardController._pack_update """
+    assert -2**127 <= reward_mult < 2**127
+    assert time_reward <= MASK_128 and deviation_reward <= MASK_128
+
+    return [(system_id << 240) | new_value,
+            raw_deviation,
+            (chain_id << 176) | (time_since << 128) | (reward_mult & MASK_128),
+            (time_reward << 128) | deviation_reward]
+
+def unpack_update(updater, words):
+    w0, w1, w2, w3 = words
+
+    reward_mult = w2 & MASK_128
+    if reward_mult >= 2**127:
+        reward_mult -= 2**128
+
+    return OracleUpdated(updater=updater,
+                         system_id=w0 >> 240,
+                         chain_id=(w2 >> 176) & MASK_64,
+                         new_value=w0 & MASK_240,
+                         raw_deviation=w1 & MASK_240,
+                         time_since=(w2 >> 128) & MASK_48,
+                         time_reward=w3 >> 128,
+                         deviation_reward=w3 & MASK_128,
+                         reward_mult=reward_mult)
+
+def decode_oracles_updated(updater, updates):
+    """ expand the arguments of one OraclesUpdated event into OracleUpdated records """
+    return [unpack_update(updater, words) for words in updates]
+
+def decode_oracles_updated_data(data: bytes):
+    """ same as decode_oracles_updated, from the raw (non-indexed) log data """
+    updater, updates = decode(ORACLES_UPDATED_TYPES, data)
+    return decode_oracles_updated(updater, updates)
@@ -0,0 +1,326 @@
+"""
+Integer reference model of the RewardController math.
+
+Reproduces the controller's fixed point arithmetic exactly, so rewards, reward
+multipliers and feed state can be computed offline instead of deploying the
+contract and sending transactions.
+
+Every function takes either python ints or numpy object arrays of python ints,
+so thousands of feeds can be stepped at once with the same code. Object arrays
+keep the 256 bit intermediate products exact, int64 would overflow.
+
+Vyper's `//` on signed integers rounds toward zero (sdiv), python's floors, so
+signed divisions go through _sdiv. Conditions on which the contract reverts
+raise ControllerRevert with the contract's message.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+EIGHTEEN_DECIMAL_NUMBER = 10**18
+THIRTY_SIX_DECIMAL_NUMBER = 10**36
+
+EMA_ALPHA = 818181818181818176 # 1 - 2/11
+ALPHA_COMP = EIGHTEEN_DECIMAL_NUMBER - EMA_ALPHA
+
+# feed_state packing ranges, see RewardController._store_feed
+INT160_RANGE = (-2**159, 2**159 - 1)
+INT96_RANGE = (-2**95, 2**95 - 1)
+UINT128_MAX = 2**128 - 1
+
+class ControllerRevert(Exception):
+    pass
+
+class ControllerConfig(NamedTuple):
+    min_window_size: int
+    target_time_since: int
+    kp: int
+    ki: int
+    co_bias: int
+    output_upper_bound: int
+    output_lower_bound: int
+    coeff: tuple
+    min_time_reward: int
+    max_time_reward: int
+    min_deviation_reward: int
+    max_deviation_reward: int
+
+    @classmethod
+    def from_params(cls, params, **overrides):
+        """ configuration of a controller deployed with params (see scripts/deploy.py) """
+        cfg = cls(min_window_size=params.default_window_size,
+                  target_time_since=params.target_time_since,
+                  kp=params.kp,
+                  ki=params.ki,
+                  co_bias=params.co_bias,
+                  output_upper_bound=params.output_upper_bound,
+                  output_lower_bound=params.output_lower_bound,
+                  coeff=tuple(params.coeff),
+                  min_time_reward=params.min_reward//2,
+                  max_time_reward=params.max_reward//2,
+                  min_deviation_reward=params.min_reward//2,
+                  max_deviation_reward=params.max_reward//2)
+        return cfg._replace(**overrides)
+
+    @classmethod
+    def from_controller(cls, controller):
+        """ configuration of a deployed controller, read through its public getters """
+        control_output = controller.control_output()
+        coeff = controller.coeff()
+        return cls(min_window_size=controller.min_window_size(),
+                   target_time_since=controller.target_time_since(),
+                   kp=control_output.kp,
+                   ki=control_output.ki,
+                   co_bias=control_output.co_bias,
+                   output_upper_bound=controller.output_upper_bound(),
+                   output_lower_bound=controller.output_lower_bound(),
+                   coeff=(coeff.zero, coeff.one, coeff.two, coeff.three),
+                   min_time_reward=controller.min_time_reward(),
+                   max_time_reward=controller.max_time_reward(),
+                   min_deviation_reward=controller.min_deviation_reward(),
+                   max_deviation_reward=controller.max_deviation_reward())
+
+def _is_array(*xs):
+    return any(isinstance(x, np.ndarray) for x in xs)
+
+def _where(cond, a, b):
+    if _is_array(cond, a, b):
+        return np.where(cond, a, b)
+    return a if cond else b
+
+def _sdiv(a, d):
+    """ vyper signed division, rounds toward zero. d must be positive """
+    if _is_array(a):
+        return np.where(a < 0, -((-a) // d), a // d)
+    return -((-a) // d) if a < 0 else a // d
+
+def _require(ok, msg):
+    if not np.all(ok):
+        raise ControllerRevert(msg)
+
+def as_array(values):
+    """ object array of python ints, for exact vectorized arithmetic """
+    return np.array([int(v) for v in values], dtype=object)
+
+def error(target, measured):
+    return _sdiv((target - measured) * EIGHTEEN_DECIMAL_NUMBER, target)
+
+def calc_deviation(scale, value_diff):
+    _require(scale != 0, "unknown scid")
+    return value_diff * EIGHTEEN_DECIMAL_NUMBER // scale
+
+def bound_pi_output(pi_output, cfg):
+    return _where(pi_output < cfg.output_lower_bound, cfg.output_lower_bound,
+                  _where(pi_output > cfg.output_upper_bound, cfg.output_upper_bound, pi_output))
+
+def clamp_error_integral(bounded_pi_output, error_integral, new_error_integral, new_area, cfg):
+    # reverse-acting controller, see RewardController._clamp_error_integral
+    clamp = (((bounded_pi_output == cfg.output_lower_bound) & (new_area > 0) & (error_integral > 0)) |
+             ((bounded_pi_output == cfg.output_upper_bound) & (new_area < 0) & (error_integral < 0)))
+    return _where(clamp, new_error_integral - new_area, new_error_integral)
+
+def raw_pi_output(error, error_integral, cfg):
+    p_output = _sdiv(error * cfg.kp, EIGHTEEN_DECIMAL_NUMBER)
+    i_output = _sdiv(error_integral * cfg.ki, EIGHTEEN_DECIMAL_NUMBER)
+    return cfg.co_bias + p_output + i_output
+
+def calc_time_reward(time_since, cfg):
+    c = cfg.coeff
+    reward = (_sdiv(c[0] * time_since, EIGHTEEN_DECIMAL_NUMBER) +
+              _sdiv(c[2] * time_since * time_since, THIRTY_SIX_DECIMAL_NUMBER))
+    return _where(reward > cfg.max_time_reward, cfg.max_time_reward,
+                  _where(reward < cfg.min_time_reward, cfg.min_time_reward, reward))
+
+def calc_deviation_reward(deviation, cfg):
+    c = cfg.coeff
+    reward = (_sdiv(c[1] * deviation, EIGHTEEN_DECIMAL_NUMBER) +
+              _sdiv(c[3] * deviation * deviation, THIRTY_SIX_DECIMAL_NUMBER))
+    return _where(reward > cfg.max_deviation_reward, cfg.max_deviation_reward,
+                  _where(reward < cfg.min_deviation_reward, cfg.min_deviation_reward, reward))
+
+class FeedState:
+    """
+    controller state of n feeds, one object array per RewardController.FeedState field.
+    a single feed is FeedState.from_scales([scale])
+    """
+    FIELDS = ('error_integral', 'last_output', 'interval_ema', 'count', 'scale')
+
+    def __init__(self, error_integral, last_output, interval_ema, count, scale):
+        self.error_integral = error_integral
+        self.last_output = last_output
+        self.interval_ema = interval_ema
+        self.count = count
+        self.scale = scale
+
+    @classmethod
+    def from_scales(cls, scales):
+        scale = as_array(scales)
+        zeros = lambda: as_array([0] * len(scale))
+        return cls(zeros(), zeros(), zeros(), zeros(), scale)
+
+    def __len__(self):
+        return len(self.scale)
+
+    def __getitem__(self, idx):
+        """ state of the feeds at idx (copied) """
+        if isinstance(idx, (int, np.integer)):
+            idx = [idx]
+        return FeedState(*(getattr(self, f)[idx].copy() for f in self.FIELDS))
+
+    def __setitem__(self, idx, state):
+        for f in self.FIELDS:
+            getattr(self, f)[idx] = getattr(state, f)
+
+    def copy(self):
+        return FeedState(*(getattr(self, f).copy() for f in self.FIELDS))
+
+    def check(self):
+        """ reverts of RewardController._store_feed """
+        lo, hi = INT160_RANGE
+        _require((self.error_integral >= lo) & (self.error_integral <= hi), "error_integral out of int160 range")
+        lo, hi = INT96_RANGE
+        _require((self.last_output >= lo) & (self.last_output <= hi), "last_output out of int96 range")
+        _require(self.interval_ema <= UINT128_MAX, "RewardController/interval_ema-overflow")
+
+def update_interval_ema(state, new_value):
+    state.interval_ema = (ALPHA_COMP * new_value + EMA_ALPHA * state.interval_ema) // EIGHTEEN_DECIMAL_NUMBER
+    return state
+
+def update_feedback(state, error, cfg):
+    new_error_integral = state.error_integral + error
+    pi_output = raw_pi_output(error, new_error_integral, cfg)
+    bounded_pi_output = bound_pi_output(pi_output, cfg)
+
+    state.error_integral = clamp_error_integral(bounded_pi_output, state.error_integral, new_error_integral, error, cfg)
+    state.last_output = bounded_pi_output
+    return state
+
+def calc_reward_mult(state, time_since, cfg):
+    """
+    reward multiplier and new state (updated in place), time_since in 1e18 seconds.
+    feeds with fewer than min_window_size samples keep a multiplier of 1e18
+    """
+    state = update_interval_ema(state, time_since)
+
+    warm = state.count + 1 < cfg.min_window_size
+    err = error(cfg.target_time_since, state.interval_ema)
+
+    before = (state.error_integral, state.last_output)
+    state = update_feedback(state, err, cfg)
+    state.error_integral = _where(warm, before[0], state.error_integral)
+    state.last_output = _where(warm, before[1], state.last_output)
+    state.count = state.count + 1
+
+    return _where(warm, EIGHTEEN_DECIMAL_NUMBER, state.last_output), state
+
+class Update(NamedTuple):
+    raw_deviation: int
+    time_since: int
+    time_reward: int
+    deviation_reward: int
+    reward_mult: int
+
+def update_feeds(state, old_gasprice, new_gasprice, old_timestamp, new_timestamp, cfg):
+    """
+    one rewarded update_many step for every feed in state (updated in place).
+    gas prices and timestamps (ms) are the oracle's old and new basefee + tip records.
+    returns the OracleUpdated fields as an Update of arrays
+    """
+    old_gasprice, new_gasprice, old_timestamp, new_timestamp = (
+        x if _is_array(x) else as_array([x] * len(state))
+        for x in (old_gasprice, new_gasprice, old_timestamp, new_timestamp))
+
+    _require(new_timestamp >= old_timestamp, "timestamp underflow")
+    raw_deviation = _where(new_gasprice > old_gasprice, new_gasprice - old_gasprice, old_gasprice - new_gasprice)
+    time_since = (new_timestamp - old_timestamp) * EIGHTEEN_DECIMAL_NUMBER
+
+    deviation = calc_deviation(state.scale, raw_deviation)
+    time_reward = calc_time_reward(time_since // 1000, cfg)
+    deviation_reward = calc_deviation_reward(deviation, cfg)
+
+    reward_mult, state = calc_reward_mult(state, time_since // 1000, cfg)
+    state.check()
+
+    time_reward_adj = _sdiv(reward_mult * time_reward, EIGHTEEN_DECIMAL_NUMBER)
+    deviation_reward_adj = _sdiv(reward_mult * deviation_reward, EIGHTEEN_DECIMAL_NUMBER)
+    _require((time_reward_adj >= 0) & (deviation_reward_adj >= 0), "negative reward")
+
+    return Update(raw_deviation=raw_deviation,
+                  time_since=time_since // 10**21,
+                  time_reward=time_reward_adj,
+                  deviation_reward=deviation_reward_adj,
+                  reward_mult=reward_mult)
+
+def update_feed(feed, old_gasprice, new_gasprice, old_timestamp, new_timestamp, cfg):
+    """
+    update_feeds for a single feed on plain ints, for replaying long histories one
+    update at a time. feed is a list [error_integral, last_output, interval_ema, count, scale],
+    updated in place only if the update doesn't revert. returns an Update of ints.
+    signed divisions are inlined (x // d if x >= 0 else -(-x // d)), this runs once per update
+    """
+    if new_timestamp < old_timestamp:
+        raise ControllerRevert("timestamp underflow")
+    error_integral, last_output, interval_ema, count, scale = feed
+    if scale == 0:
+        raise ControllerRevert("unknown scid")
+
+    E18 = EIGHTEEN_DECIMAL_NUMBER
+    E36 = THIRTY_SIX_DECIMAL_NUMBER
+
+    raw_deviation = new_gasprice - old_gasprice if new_gasprice > old_gasprice else old_gasprice - new_gasprice
+    time_since = (new_timestamp - old_timestamp) * E18
+    t = time_since // 1000
+    deviation = raw_deviation * E18 // scale
+
+    c0, c1, c2, c3 = cfg.coeff
+    a = c0 * t
+    b = c2 * t * t
+    time_reward = (a // E18 if a >= 0 else -(-a // E18)) + (b // E36 if b >= 0 else -(-b // E36))
+    if time_reward > cfg.max_time_reward:
+        time_reward = cfg.max_time_reward
+    elif time_reward < cfg.min_time_reward:
+        time_reward = cfg.min_time_reward
+    a = c1 * deviation
+    b = c3 * deviation * deviation
+    deviation_reward = (a // E18 if a >= 0 else -(-a // E18)) + (b // E36 if b >= 0 else -(-b // E36))
+    if deviation_reward > cfg.max_deviation_reward:
+        deviation_reward = cfg.max_deviation_reward
+    elif deviation_reward < cfg.min_deviation_reward:
+        deviation_reward = cfg.min_deviation_reward
+
+    interval_ema = (ALPHA_COMP * t + EMA_ALPHA * interval_ema) // E18
+
+    if count + 1 < cfg.min_window_size:
+        reward_mult = E18
+    else:
+        target = cfg.target_time_since
+        a = (target - interval_ema) * E18
+        err = a // target if a >= 0 else -(-a // target)
+        new_error_integral = error_integral + err
+        a = err * cfg.kp
+        b = new_error_integral * cfg.ki
+        pi_output = cfg.co_bias + (a // E18 if a >= 0 else -(-a // E18)) + (b // E18 if b >= 0 else -(-b // E18))
+        lower, upper = cfg.output_lower_bound, cfg.output_upper_bound
+        last_output = lower if pi_output < lower else upper if pi_output > upper else pi_output
+        if ((last_output == lower and err > 0 and error_integral > 0) or
+                (last_output == upper and err < 0 and error_integral < 0)):
+            new_error_integral -= err
+        error_integral = new_error_integral
+        reward_mult = last_output
+
+    if not INT160_RANGE[0] <= error_integral <= INT160_RANGE[1]:
+        raise ControllerRevert("error_integral out of int160 range")
+    if not INT96_RANGE[0] <= last_output <= INT96_RANGE[1]:
+        raise ControllerRevert("last_output out of int96 range")
+    if interval_ema > UINT128_MAX:
+        raise ControllerRevert("RewardController/interval_ema-overflow")
+
+    a = reward_mult * time_reward
+    b = reward_mult * deviation_reward
+    time_reward_adj = a // E18 if a >= 0 else -(-a // E18)
+    deviation_reward_adj = b // E18 if b >= 0 else -(-b // E18)
+    if time_reward_adj < 0 or deviation_reward_adj < 0:
+        raise ControllerRevert("negative reward")
+
+    feed[:4] = error_integral, last_output, interval_ema, count + 1
+    return Update(raw_deviation, time_since // 10**21, time_reward_adj, deviation_reward_adj, reward_mult)
@@ -0,0 +1,259 @@
+"""
+Columnar, memory-mapped archive of OracleUpdated history.
+
+An archive is a directory with one subdirectory per feed, `<system_id>_<chain_id>`,
+holding one raw little-endian file per field, and a meta.json with the row count
+of every feed:
+
+    block_number  uint64      time_since        uint64
+    log_index     uint32      new_value         uint128
+    updater       20 bytes    raw_deviation     uint128
+    system_id     uint8       time_reward       uint128
+    chain_id      uint64      deviation_reward  uint128
+                              reward_mult       int128
+
+128 bit fields are stored as (lo, hi) uint64 pairs, to_float and to_int convert
+them. The on-chain types are wider, a value that doesn't fit raises ValueError
+when it's archived, no reward or gas price comes close.
+
+Archive opens every file with np.memmap, so a multi-GB history is scanned at
+disk speed, only the pages a query touches are read, and nothing is copied into
+Python objects. Rows of a feed are in block order, Archive.slice finds a block
+range with a binary search on block_number.
+
+ArchiveWriter appends rows, and export_index appends what an event_indexer
+database gained since the last export. meta.json is replaced only after the
+column files are written, and anything past its row counts is ignored by readers
+and truncated by the next writer, so an interrupted export loses nothing:
+
+    python -m scripts.event_archive export --db reward_controller.db --archive oracle_updated
+    python -m scripts.event_archive summary --archive oracle_updated
+"""
+import argparse
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+META = 'meta.json'
+VERSION = 1
+
+U128 = 'u128'
+I128 = 'i128'
+# field -> numpy dtype, or U128 / I128 for (lo, hi) uint64 pairs
+COLUMNS = {
+    'block_number': '<u8',
+    'log_index': '<u4',
+    'updater': 'S20',
+    'system_id': 'u1',
+    'chain_id': '<u8',
+    'new_value': U128,
+    'raw_deviation': U128,
+    'time_since': '<u8',
+    'time_reward': U128,
+    'deviation_reward': U128,
+    'reward_mult': I128,
+}
+FIELDS = tuple(COLUMNS)
+
+MASK_64 = 2**64 - 1
+
+def _dtype(kind):
+    return np.dtype('<u8') if kind in (U128, I128) else np.dtype(kind)
+
+def _width(kind):
+    return 2 if kind in (U128, I128) else 1
+
+RANGES = {U128: (0, 2**128), I128: (-2**127, 2**127)}
+
+def _check(row):
+    for field, kind in COLUMNS.items():
+        if kind in RANGES and not RANGES[kind][0] <= row[field] < RANGES[kind][1]:
+            raise ValueError(f"{field} {row[field]} out of the {kind} range")
+
+def _encode(kind, values):
+    """ a numpy array of python values of a column """
+    if kind == U128 or kind == I128:
+        return np.array([(v & MASK_64, (v >> 64) & MASK_64) for v in values], dtype='<u8').reshape(-1, 2)
+    if kind == 'S20':
+        return np.array([bytes.fromhex(v[2:]) if isinstance(v, str) else bytes(v) for v in values], dtype=kind)
+    return np.array(values, dtype=kind)
+
+def to_float(column, signed=False):
+    """ float64 values of a column, 128 bit ones included """
+    if column.ndim == 2:
+        high = column[:, 1].view(np.int64) if signed else column[:, 1]
+        return column[:, 0].astype(np.float64) + high.astype(np.float64) * 2.**64
+    return column.astype(np.float64)
+
+def to_int(column, signed=False):
+    """ exact python ints of a 128 bit column """
+    values = [int(lo) | int(hi) << 64 for lo, hi in column]
+    return [v - 2**128 if v >= 2**127 else v for v in values] if signed else values
+
+def feed_dir(sid, cid):
+    return f'{sid}_{cid}'
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, META)) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return {'version': VERSION, 'columns': COLUMNS, 'feeds': {}, 'position': None}
+    if meta['version'] != VERSION or meta['columns'] != COLUMNS:
+        raise ValueError(f"{path} has an unsupported archive layout")
+    return meta
+
+class Archive:
+    def __init__(self, path):
+        self.path = path
+        self.meta = _read_meta(path)
+        self._columns = {}
+
+    def feeds(self):
+        """ (system_id, chain_id) of every archived feed """
+        return sorted(tuple(map(int, key.split('_'))) for key in self.meta['feeds'])
+
+    def rows(self, sid, cid):
+        return self.meta['feeds'].get(feed_dir(sid, cid), {'rows': 0})['rows']
+
+    def column(self, sid, cid, field):
+        """ the memory-mapped column of a feed, (rows, 2) for 128 bit fields """
+        key = (sid, cid, field)
+        if key not in self._columns:
+            kind, rows = COLUMNS[field], self.rows(sid, cid)
+            shape = (rows, _width(kind)) if _width(kind) > 1 else (rows,)
+            if rows == 0:
+                self._columns[key] = np.empty(shape, dtype=_dtype(kind))
+            else:
+                self._columns[key] = np.memmap(os.path.join(self.path, feed_dir(sid, cid), field), mode='r',
+                                               dtype=_dtype(kind), shape=shape)
+        return self._columns[key]
+
+    def slice(self, sid, cid, start_block=0, end_block=None, fields=FIELDS):
+        """ {field: column} of a feed's rows with start_block <= block_number < end_block, views of the maps """
+        blocks = self.column(sid, cid, 'block_number')
+        start = np.searchsorted(blocks, start_block, side='left')
+        end = len(blocks) if end_block is None else np.searchsorted(blocks, end_block, side='left')
+        return {field: self.column(sid, cid, field)[start:end] for field in fields}
+
+    def emission(self, start_block=0, end_block=None):
+        """ {(system_id, chain_id): time_reward + deviation_reward} over a block range, as floats """
+        emission = {}
+        for sid, cid in self.feeds():
+            s = self.slice(sid, cid, start_block, end_block, ('time_reward', 'deviation_reward'))
+            emission[(sid, cid)] = float(to_float(s['time_reward']).sum() + to_float(s['deviation_reward']).sum())
+        return emission
+
+class ArchiveWriter:
+    """ appends rows, dicts or tuples of FIELDS, to an archive. flush (or leaving the with block) commits them """
+    def __init__(self, path, buffer_rows=100_000):
+        self.path = path
+        self.buffer_rows = buffer_rows
+        os.makedirs(path, exist_ok=True)
+        self.meta = _read_meta(path)
+        self.buffers = {}
+        self.buffered = 0
+        for key, feed in self.meta['feeds'].items():
+            self._truncate(key, feed['rows'])
+
+    def _truncate(self, key, rows):
+        # drops what an interrupted flush wrote past the committed rows
+        for field, kind in COLUMNS.items():
+            name = os.path.join(self.path, key, field)
+            size = rows * _dtype(kind).itemsize * _width(kind)
+            if os.path.getsize(name) > size:
+                os.truncate(name, size)
+
+    @property
+    def position(self):
+        """ the position of the last row appended from an index, see export_index """
+        return self.meta['position']
+
+    def append(self, row, position=None):
+        if not isinstance(row, dict):
+            row = dict(zip(FIELDS, row))
+        key = feed_dir(row['system_id'], row['chain_id'])
+        feed = self.meta['feeds'].get(key)
+        buffer = self.buffers.get(key)
+        last_block = buffer[-1]['block_number'] if buffer else feed['last_block'] if feed else 0
+        if row['block_number'] < last_block:
+            raise ValueError(f"block {row['block_number']} appended after block {last_block} in feed {key}")
+        _check(row)
+        self.buffers.setdefault(key, []).append(row)
+        self.buffered += 1
+        if position is not None:
+            self.meta['position'] = list(position)
+        if self.buffered >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        for key, rows in self.buffers.items():
+            os.makedirs(os.path.join(self.path, key), exist_ok=True)
+            # a feed not in meta.json yet may have files an interrupted flush left
+            mode = 'ab' if key in self.meta['feeds'] else 'wb'
+            for field, kind in COLUMNS.items():
+                with open(os.path.join(self.path, key, field), mode) as f:
+                    f.write(_encode(kind, [row[field] for row in rows]).tobytes())
+            feed = self.meta['feeds'].setdefault(key, {'rows': 0, 'last_block': 0})
+            feed['rows'] += len(rows)
+            feed['last_block'] = rows[-1]['block_number']
+        self.buffers, self.buffered = {}, 0
+
+        tmp = os.path.join(self.path, META + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.flush()
+
+def export_index(db, path):
+    """ appends the oracle_updated rows of an event_indexer database not archived yet, returns how many """
+    db = sqlite3.connect(db) if isinstance(db, str) else db
+    rows = 0
+    with ArchiveWriter(path) as writer:
+        position = writer.position or [-1, -1, -1]
+        cursor = db.execute("SELECT block_number, log_index, entry, updater, system_id, chain_id, new_value, "
+                            "raw_deviation, time_since, time_reward, deviation_reward, reward_mult FROM oracle_updated "
+                            "WHERE (block_number, log_index, entry) > (?, ?, ?) "
+                            "ORDER BY block_number, log_index, entry", position)
+        for (block, log_index, entry, updater, sid, cid, new_value, raw_deviation,
+             time_since, time_reward, deviation_reward, reward_mult) in cursor:
+            writer.append({'block_number': block, 'log_index': log_index, 'updater': updater,
+                           'system_id': sid, 'chain_id': cid, 'new_value': int(new_value),
+                           'raw_deviation': int(raw_deviation), 'time_since': time_since,
+                           'time_reward': int(time_reward), 'deviation_reward': int(deviation_reward),
+                           'reward_mult': int(reward_mult)},
+                          position=(block, log_index, entry))
+            rows += 1
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="columnar archive of OracleUpdated history")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="append an event_indexer database's new rows")
+    export.add_argument('--db', default='reward_controller.db')
+    export.add_argument('--archive', required=True)
+    summary = sub.add_parser('summary', help="rows and emission per feed")
+    summary.add_argument('--archive', required=True)
+    summary.add_argument('--start-block', type=int, default=0)
+    summary.add_argument('--end-block', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(f"archived {export_index(args.db, args.archive)} rows")
+    else:
+        archive = Archive(args.archive)
+        for (sid, cid), emission in archive.emission(args.start_block, args.end_block).items():
+            print(f"{sid=} {cid=} rows={archive.rows(sid, cid)} emission={emission / 10**18:.6f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Incremental indexer of RewardController events into SQLite.
+
+Indexer pulls the controller's OracleUpdated, OraclesUpdated (compact logs,
+expanded into one oracle_updated row per feed), RewardsToggled and
+RewardsFreeze logs with raw eth_getLogs requests, decodes them straight from
+the log data words, and writes every block range to the database in one
+transaction together with a checkpoint, so a restart resumes after the last
+range written. Only blocks `confirmations` behind the head are indexed, so
+reorged logs aren't recorded.
+
+Block ranges adapt to the deployment's log density: a range that fails (nodes
+cap eth_getLogs by result size or block span) is halved and retried, a range
+returning fewer than target_logs logs doubles the next one, up to max_chunk
+blocks. A quiet backfill moves max_chunk blocks per request, a busy one about
+target_logs logs per request.
+
+uint240 and wider fields don't fit SQLite integers and are stored as decimal
+text, cast them in queries (CAST(time_reward AS REAL)) or convert with int().
+
+    python -m scripts.event_indexer --rpc https://sepolia.infura.io/v3/$WEB3_INFURA_PROJECT_ID --follow
+"""
+import argparse
+import logging
+import sqlite3
+import time
+from functools import lru_cache
+
+from eth_hash.auto import keccak
+from eth_utils import to_checksum_address
+
+from scripts.compact_logs import unpack_update
+
+logger = logging.getLogger(__name__)
+
+ORACLE_UPDATED = '0x' + keccak(b'OracleUpdated(address,uint8,uint64,uint240,uint240,uint48,uint256,uint256,int256)').hex()
+ORACLES_UPDATED = '0x' + keccak(b'OraclesUpdated(address,uint256[4][])').hex()
+REWARDS_TOGGLED = '0x' + keccak(b'RewardsToggled(bool)').hex()
+REWARDS_FREEZE = '0x' + keccak(b'RewardsFreeze(bool)').hex()
+TOPICS = [ORACLE_UPDATED, ORACLES_UPDATED, REWARDS_TOGGLED, REWARDS_FREEZE]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS oracle_updated (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    entry INTEGER NOT NULL,
+    transaction_hash TEXT NOT NULL,
+    updater TEXT NOT NULL,
+    system_id INTEGER NOT NULL,
+    chain_id INTEGER NOT NULL,
+    new_value TEXT NOT NULL,
+    raw_deviation TEXT NOT NULL,
+    time_since INTEGER NOT NULL,
+    time_reward TEXT NOT NULL,
+    deviation_reward TEXT NOT NULL,
+    reward_mult TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index, entry)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS oracle_updated_feed ON oracle_updated (system_id, chain_id, block_number);
+CREATE INDEX IF NOT EXISTS oracle_updated_updater ON oracle_updated (updater, block_number);
+CREATE TABLE IF NOT EXISTS rewards_toggled (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    transaction_hash TEXT NOT NULL,
+    rewards_on INTEGER NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rewards_freeze (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    transaction_hash TEXT NOT NULL,
+    rewards_frozen INTEGER NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoint (
+    address TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL
+);
+"""
+
+INSERT_ORACLE_UPDATED = "INSERT OR REPLACE INTO oracle_updated VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_REWARDS_TOGGLED = "INSERT OR REPLACE INTO rewards_toggled VALUES (?, ?, ?, ?)"
+INSERT_REWARDS_FREEZE = "INSERT OR REPLACE INTO rewards_freeze VALUES (?, ?, ?, ?)"
+
+class RPCError(Exception):
+    pass
+
+_checksum = lru_cache(maxsize=4096)(to_checksum_address)
+
+def _word(data, i):
+    return int.from_bytes(data[32 * i:32 * i + 32], 'big')
+
+def _address(data, i):
+    return _checksum(data[32 * i + 12:32 * i + 32])
+
+class Rows:
+    """ decoded rows per table """
+    def __init__(self):
+        self.oracle_updated = []
+        self.rewards_toggled = []
+        self.rewards_freeze = []
+
+    def __len__(self):
+        return len(self.oracle_updated) + len(self.rewards_toggled) + len(self.rewards_freeze)
+
+def _oracle_updated_row(block, log_index, entry, tx, u):
+    return (block, log_index, entry, tx, u.updater, u.system_id, u.chain_id, str(u.new_value), str(u.raw_deviation),
+            u.time_since, str(u.time_reward), str(u.deviation_reward), str(u.reward_mult))
+
+def decode_logs(logs, rows=None):
+    """ rows of raw eth_getLogs results, hex encoded as nodes return them """
+    rows = Rows() if rows is None else rows
+    for log in logs:
+        if log.get('removed'):
+            continue
+        topic = log['topics'][0]
+        data = bytes.fromhex(log['data'][2:])
+        block, log_index, tx = int(log['blockNumber'], 16), int(log['logIndex'], 16), log['transactionHash']
+
+        if topic == ORACLE_UPDATED:
+            reward_mult = _word(data, 8)
+            if reward_mult >= 2**255:
+                reward_mult -= 2**256
+            rows.oracle_updated.append((block, log_index, 0, tx, _address(data, 0), _word(data, 1), _word(data, 2),
+                                        str(_word(data, 3)), str(_word(data, 4)), _word(data, 5),
+                                        str(_word(data, 6)), str(_word(data, 7)), str(reward_mult)))
+        elif topic == ORACLES_UPDATED:
+            # updater, offset of updates, then its length and 4 words per entry
+            updater = _address(data, 0)
+            start = _word(data, 1) // 32
+            for entry in range(_word(data, start)):
+                words = [_word(data, start + 1 + 4 * entry + j) for j in range(4)]
+                rows.oracle_updated.append(_oracle_updated_row(block, log_index, entry, tx, unpack_update(updater, words)))
+        elif topic == REWARDS_TOGGLED:
+            rows.rewards_toggled.append((block, log_index, tx, _word(data, 0)))
+        elif topic == REWARDS_FREEZE:
+            rows.rewards_freeze.append((block, log_index, tx, _word(data, 0)))
+    return rows
+
+def connect(path):
+    """ the database at path, with the indexer's tables """
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+class Indexer:
+    def __init__(self, w3, address, db, start_block=0, confirmations=12,
+                 chunk_size=2_000, max_chunk=100_000, target_logs=5_000):
+        self.w3 = w3
+        self.address = to_checksum_address(address)
+        if isinstance(db, str):
+            db = connect(db)
+        else:
+            db.executescript(SCHEMA)
+        self.db = db
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.chunk_size = chunk_size
+        self.max_chunk = max_chunk
+        self.target_logs = target_logs
+        self.stats = {'requests': 0, 'retries': 0, 'logs': 0, 'rows': 0}
+
+    @property
+    def checkpoint(self):
+        """ the last block indexed """
+        row = self.db.execute("SELECT block_number FROM checkpoint WHERE address = ?", (self.address,)).fetchone()
+        return row[0] if row else self.start_block - 1
+
+    def _request(self, method, params):
+        self.stats['requests'] += 1
+        response = self.w3.provider.make_request(method, params)
+        if 'error' in response:
+            raise RPCError(response['error'])
+        return response['result']
+
+    def head(self):
+        return int(self._request('eth_blockNumber', []), 16) - self.confirmations
+
+    def get_logs(self, start, end):
+        return self._request('eth_getLogs', [{'address': self.address, 'fromBlock': hex(start),
+                                              'toBlock': hex(end), 'topics': [TOPICS]}])
+
+    def _write(self, rows, end):
+        with self.db:
+            self.db.executemany(INSERT_ORACLE_UPDATED, rows.oracle_updated)
+            self.db.executemany(INSERT_REWARDS_TOGGLED, rows.rewards_toggled)
+            self.db.executemany(INSERT_REWARDS_FREEZE, rows.rewards_freeze)
+            self.db.execute("INSERT OR REPLACE INTO checkpoint VALUES (?, ?)", (self.address, end))
+        self.stats['rows'] += len(rows)
+
+    def _adapt(self, blocks, logs):
+        if logs < self.target_logs // 2:
+            self.chunk_size = min(self.max_chunk, blocks * 2)
+        elif logs > self.target_logs:
+            self.chunk_size = max(1, blocks * self.target_logs // logs)
+
+    def sync(self, to_block=None):
+        """ indexes the blocks after the checkpoint up to to_block (the confirmed head), returns the rows written """
+        to_block = self.head() if to_block is None else to_block
+        start = self.checkpoint + 1
+        rows = 0
+        while start <= to_block:
+            end = min(start + self.chunk_size - 1, to_block)
+            try:
+                logs = self.get_logs(start, end)
+            except Exception as e:
+                if end == start:
+                    raise
+                # too many logs or blocks for the node, or a timeout: halve the range
+                logger.info("eth_getLogs %d-%d failed, retrying a smaller range: %s", start, end, e)
+                self.stats['retries'] += 1
+                self.chunk_size = max(1, (end - start + 1) // 2)
+                continue
+
+            decoded = decode_logs(logs)
+            self._write(decoded, end)
+            self.stats['logs'] += len(logs)
+            rows += len(decoded)
+            self._adapt(end - start + 1, len(logs))
+            start = end + 1
+        return rows
+
+    def run(self, poll_interval=12.):
+        """ syncs every poll_interval seconds, until interrupted """
+        while True:
+            rows = self.sync()
+            logger.info("indexed up to block %d, %d rows", self.checkpoint, rows)
+            time.sleep(poll_interval)
+
+def main():
+    from web3 import Web3, HTTPProvider
+
+    from scripts.addresses import reward_addresses
+
+    parser = argparse.ArgumentParser(description="index RewardController events into sqlite")
+    parser.add_argument('--rpc', required=True)
+    parser.add_argument('--address', help="controller address, reward_addresses of the rpc's chain by default")
+    parser.add_argument('--db', default='reward_controller.db')
+    parser.add_argument('--start-block', type=int, default=0, help="first block of a new database")
+    parser.add_argument('--confirmations', type=int, default=12)
+    parser.add_argument('--follow', action='store_true', help="keep indexing new blocks")
+    parser.add_argument('--poll-interval', type=float, default=12.)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    w3 = Web3(HTTPProvider(args.rpc))
+    address = args.address or reward_addresses[w3.eth.chain_id]
+    indexer = Indexer(w3, address, args.db, start_block=args.start_block, confirmations=args.confirmations)
+
+    start = time.perf_counter()
+    rows = indexer.sync()
+    print(f"indexed up to block {indexer.checkpoint}: {rows} rows in {time.perf_counter() - start:.1f}s {indexer.stats}")
+    if args.follow:
+        try:
+            indexer.run(args.poll_interval)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
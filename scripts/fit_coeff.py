@@ -0,0 +1,139 @@
+"""
+Fitting of the RewardController reward polynomial coefficients.
+
+The controller pays
+
+    time_reward      = coeff[0]*t//1e18 + coeff[2]*t*t//1e36    clamped to [min_reward/2, max_reward/2]
+    deviation_reward = coeff[1]*d//1e18 + coeff[3]*d*d//1e36    clamped to [min_reward/2, max_reward/2]
+
+with t the time since the last update and d the deviation in scales, both with
+18 decimals. fit_coeff solves each quadratic through (min_ts, min_reward/2) and
+(max_ts, max_reward/2), resp. (min_deviation, ...) and (max_deviation, ...), then
+searches the integers around the exact solution for the pair that, with the
+contract's integer arithmetic and clamping, pays exactly min_reward/2 at the
+low end and max_reward/2 at the high end. Rounding the exact solution down can
+leave the high end just short of the max reward, which is the fit error the
+"add 1sec" in the tests works around.
+
+check_fit measures a set of coefficients on a dense grid of time since in ms
+(including the controller's //1000) and of deviations, with controller_model:
+
+    python -m scripts.fit_coeff
+"""
+from fractions import Fraction
+from typing import NamedTuple
+
+import numpy as np
+
+from scripts import controller_model as cm
+from scripts import params
+
+EIGHTEEN_DECIMAL_NUMBER = cm.EIGHTEEN_DECIMAL_NUMBER
+INT96_RANGE = (-2**95, 2**95 - 1)
+
+# integers tried around the exact solution of each coefficient
+SEARCH_RADIUS = 2
+
+class Fit(NamedTuple):
+    low: int            # reward at the low end of the range
+    high: int           # reward at the high end
+    low_error: int      # low - min reward
+    high_error: int     # high - max reward
+    saturates_at: int   # first grid point paying the max reward
+    max_error: float    # largest relative difference to the exact quadratic, between the ends
+    monotonic: bool     # rewards never decrease over the grid
+
+def quadratic(linear, square, x):
+    """ the contract's polynomial, x with 18 decimals. vectorized with controller_model object arrays """
+    return (cm._sdiv(linear * x, EIGHTEEN_DECIMAL_NUMBER) +
+            cm._sdiv(square * x * x, cm.THIRTY_SIX_DECIMAL_NUMBER))
+
+def solve(x_low, x_high, r_low, r_high):
+    """ exact (linear, square) with quadratic through (x_low, r_low) and (x_high, r_high) """
+    a, b = Fraction(x_low, EIGHTEEN_DECIMAL_NUMBER), Fraction(x_high, EIGHTEEN_DECIMAL_NUMBER)
+    square = (r_high - r_low * b / a) / (b * b - a * b)
+    linear = (r_low - square * a * a) / a
+    return linear, square
+
+def fit(x_low, x_high, r_low, r_high):
+    """
+    integer (linear, square) paying at most r_low at x_low and at least r_high at x_high
+    with the contract's arithmetic, as close to both as possible
+    """
+    linear, square = solve(x_low, x_high, r_low, r_high)
+    best = None
+    for dl in range(-SEARCH_RADIUS, SEARCH_RADIUS + 1):
+        for ds in range(-SEARCH_RADIUS, SEARCH_RADIUS + 1):
+            c = (int(linear) + dl, int(square) + ds)
+            low, high = quadratic(*c, x_low), quadratic(*c, x_high)
+            if low > r_low or high < r_high:
+                continue
+            err = (r_low - low) + (high - r_high)
+            if best is None or err < best[0]:
+                best = (err, c)
+
+    assert best is not None, "no integer coefficients within SEARCH_RADIUS reach both ends"
+    for c in best[1]:
+        assert INT96_RANGE[0] <= c <= INT96_RANGE[1], f"{c} out of int96 range"
+    return best[1]
+
+def fit_coeff(params):
+    """ coeff for params, in the order of params.coeff """
+    c0, c2 = fit(params.min_ts, params.max_ts, params.min_reward//2, params.max_reward//2)
+    c1, c3 = fit(params.min_deviation, params.max_deviation, params.min_reward//2, params.max_reward//2)
+    return [c0, c1, c2, c3]
+
+def time_grid(x_high, n):
+    """ about n time since values, as the controller computes them from ms intervals, up to twice x_high """
+    max_ms = 2 * x_high // 10**15
+    ms = range(0, max_ms + 1, max(max_ms // n, 1))
+    return cm.as_array(ms) * EIGHTEEN_DECIMAL_NUMBER // 1000
+
+def deviation_grid(x_high, n):
+    """ about n deviations up to twice x_high """
+    return cm.as_array(range(0, 2 * x_high + 1, max(2 * x_high // n, 1)))
+
+def check_fit(linear, square, x_low, x_high, r_low, r_high, grid):
+    """ measures the clamped rewards of (linear, square) on grid against the exact quadratic through the ends """
+    clamp = lambda r: max(min(r, r_high), r_low)
+    rewards = quadratic(linear, square, grid)
+    clamped = np.where(rewards > r_high, r_high, np.where(rewards < r_low, r_low, rewards))
+
+    # the exact quadratic between the ends as num/den, over one integer denominator
+    exact_linear, exact_square = solve(x_low, x_high, r_low, r_high)
+    inside = ((grid >= x_low) & (grid <= x_high)).astype(bool)
+    x = grid[inside]
+    den = exact_linear.denominator * exact_square.denominator * cm.THIRTY_SIX_DECIMAL_NUMBER
+    num = (exact_linear.numerator * exact_square.denominator * EIGHTEEN_DECIMAL_NUMBER * x +
+           exact_square.numerator * exact_linear.denominator * x * x)
+    num = np.where(num > r_high * den, r_high * den, np.where(num < r_low * den, r_low * den, num))
+    errors = abs(clamped[inside] * den - num) / num
+    max_error = float(errors.max()) if len(errors) else 0.
+
+    saturated = grid[(clamped == r_high).astype(bool)]
+    low, high = clamp(quadratic(linear, square, x_low)), clamp(quadratic(linear, square, x_high))
+    return Fit(low=low, high=high, low_error=low - r_low, high_error=high - r_high,
+               saturates_at=int(saturated[0]) if len(saturated) else None,
+               max_error=max_error,
+               monotonic=bool(np.all(clamped[1:] >= clamped[:-1])))
+
+def check_coeff(coeff, params, n=100_000):
+    """ (time fit, deviation fit) of coeff for params """
+    r_low, r_high = params.min_reward//2, params.max_reward//2
+    time_fit = check_fit(coeff[0], coeff[2], params.min_ts, params.max_ts, r_low, r_high,
+                         time_grid(params.max_ts, n))
+    deviation_fit = check_fit(coeff[1], coeff[3], params.min_deviation, params.max_deviation, r_low, r_high,
+                              deviation_grid(params.max_deviation, n))
+    return time_fit, deviation_fit
+
+def main():
+    for name, coeff in (("params.coeff", list(params.coeff)), ("fitted", fit_coeff(params))):
+        time_fit, deviation_fit = check_coeff(coeff, params)
+        print(f"{name}: {coeff}")
+        print(f"  time      {time_fit}")
+        print(f"  deviation {deviation_fit}")
+
+    print(f"coeff = {fit_coeff(params)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Long running asyncio keeper.
+
+Every poll_interval seconds the keeper reads the gasnet payload of every
+configured (sid, cid) concurrently, and passes the round through a pipeline of
+stages connected by bounded queues:
+
+    fetch -> decode -> filter -> pack -> submit
+
+    fetch   getValues of every chain at once, so a round takes one RPC latency
+    decode  drops payloads with a bad framing (payload_assembler.candidate)
+    filter  drops stale, reverting and underpaying payloads (RewardFilter.select)
+    pack    packs the rest into update_many calls (payload_assembler.assemble)
+    submit  sends the calls, best rewarded first, and applies them to the filter
+
+With a mirror (OracleMirror) and updates() -> (sid, cid) pairs of the chains
+other keepers updated since the last call (oracle_updates reads them from the
+controller's OracleUpdated logs), every round first re-reads those chains'
+records into the mirror and the filter, so their payloads are predicted against
+the chain instead of our last update. With a reader (batch_reads.BatchReader)
+the records come from a snapshot that carries the chains' feed state too, and
+the filter's feeds are refreshed with them, in the same batched round trip. Our own accepted payloads are applied to
+the mirror like they are to the filter.
+
+A payload is pending in the filter from the filter stage on, so a round fetched
+while it's in flight doesn't select it again. It is applied once its call went
+through, and released, to be selected again, if the call failed or its round
+was dropped or left out of the calls.
+
+A slow stage doesn't hold the others back: when a queue is full the oldest
+round waiting in it is dropped, as a newer round of the same chains is behind
+it. stop() (SIGINT or SIGTERM under main) ends the polling, and the rounds
+already fetched go through the remaining stages before run returns, so no
+transaction is abandoned half sent.
+
+The keeper takes its I/O as two coroutines, fetch(sid, cid) -> bytes and
+submit(call) -> bool, main builds them on web3 for gasnet and ape for the
+controller:
+
+    ape run scripts/keeper.py --network ethereum:sepolia:infura
+"""
+import asyncio
+import json
+import logging
+import signal
+
+from scripts import payload_assembler
+from scripts.oracle_mirror import BASEFEE_TYPE
+
+logger = logging.getLogger(__name__)
+
+# marks the end of the rounds in a queue
+_DONE = object()
+
+class Keeper:
+    def __init__(self, chains, fetch, submit, reward_filter, limits=payload_assembler.Limits(),
+                 poll_interval=12., queue_size=2, max_calls=None, mirror=None, updates=None,
+                 reader=None):
+        self.chains = list(chains)
+        self.fetch = fetch
+        self.submit = submit
+        self.reward_filter = reward_filter
+        self.limits = limits
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_calls = max_calls
+        self.mirror = mirror
+        self.updates = updates
+        self.reader = reader
+        self.stats = {'rounds': 0, 'fetch_errors': 0, 'invalid': 0, 'dropped_rounds': 0, 'calls': 0, 'failed_calls': 0,
+                      'refreshes': 0, 'refresh_errors': 0}
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _release(self, item):
+        # a round of candidates or calls that won't be sent, its payloads can be selected again
+        for x in item:
+            if isinstance(x, payload_assembler.Call):
+                self._release(x.candidates)
+            elif isinstance(x, payload_assembler.Candidate):
+                self.reward_filter.release(x.payload)
+
+    def _put_latest(self, queue, item):
+        if queue.full():
+            self._release(queue.get_nowait())
+            self.stats['dropped_rounds'] += 1
+        queue.put_nowait(item)
+
+    async def _fetch_one(self, sid, cid):
+        try:
+            return await self.fetch(sid, cid)
+        except Exception as e:
+            logger.warning("fetch %s %s failed: %s", sid, cid, e)
+            self.stats['fetch_errors'] += 1
+            return None
+
+    async def _fetch_stage(self, out):
+        while not self._stopping.is_set():
+            payloads = await asyncio.gather(*(self._fetch_one(sid, cid) for sid, cid in self.chains))
+            self.stats['rounds'] += 1
+            self._put_latest(out, [p for p in payloads if p])
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        await out.put(_DONE)
+
+    async def _stage(self, inp, out, process):
+        # takes rounds from inp, puts process(round) in out, until _DONE
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                if out is not None:
+                    await out.put(_DONE)
+                return
+            result = await process(item)
+            if out is not None and result:
+                self._put_latest(out, result)
+
+    async def _decode(self, payloads):
+        valid = []
+        for payload in payloads:
+            try:
+                valid.append(payload_assembler.candidate(payload).payload)
+            except payload_assembler.InvalidPayload as e:
+                logger.warning("invalid payload: %s", e)
+                self.stats['invalid'] += 1
+        return valid
+
+    async def _refresh(self):
+        # re-reads the records of the chains other keepers updated
+        feeds = {}
+        try:
+            chains = set(await self.updates())
+            tip_type = self.reward_filter.tip_type
+            if chains and self.reader is not None:
+                snapshot = await asyncio.to_thread(self.reader.snapshot, chains, types=(BASEFEE_TYPE, tip_type))
+                self.mirror.load(snapshot.records)
+                feeds = snapshot.feeds
+            elif chains:
+                await asyncio.to_thread(self.mirror.bootstrap_gas_prices, chains, tip_type)
+        except Exception as e:
+            logger.warning("refresh failed: %s", e)
+            self.stats['refresh_errors'] += 1
+            return
+        for sid, cid in chains:
+            gas_price, height, ts = self.mirror.getGasPrice(sid, cid, tip_type)
+            # the chain may not have caught up with our last update yet
+            if height << 48 | ts > self.reward_filter.records.get((sid, cid), (0,))[0]:
+                self.reward_filter.set_record(sid, cid, height, ts, gas_price)
+                if (sid, cid) in feeds:
+                    self.reward_filter.set_feed(sid, cid, *feeds[(sid, cid)])
+                self.stats['refreshes'] += 1
+
+    async def _filter(self, payloads):
+        if self.updates is not None:
+            await self._refresh()
+        return self.reward_filter.select(payloads)
+
+    async def _pack(self, candidates):
+        calls = payload_assembler.assemble(candidates, self.limits, self.max_calls)
+        packed = {c.payload for call in calls for c in call.candidates}
+        self._release(c for c in candidates if c.payload not in packed)
+        return calls
+
+    async def _submit(self, calls):
+        for call in calls:
+            try:
+                ok = await self.submit(call)
+            except Exception as e:
+                logger.warning("update_many failed: %s", e)
+                ok = False
+            if ok:
+                self.stats['calls'] += 1
+                for c in call.candidates:
+                    self.reward_filter.apply(c.payload)
+                    if self.mirror is not None:
+                        self.mirror.apply_payload(c.payload)
+            else:
+                self.stats['failed_calls'] += 1
+                self._release(call.candidates)
+
+    async def run(self):
+        """ runs until stop() and the rounds already fetched are submitted """
+        queues = [asyncio.Queue(self.queue_size) for _ in range(4)]
+        await asyncio.gather(self._fetch_stage(queues[0]),
+                             self._stage(queues[0], queues[1], self._decode),
+                             self._stage(queues[1], queues[2], self._filter),
+                             self._stage(queues[2], queues[3], self._pack),
+                             self._stage(queues[3], None, self._submit))
+
+def gasnet_fetcher(rpc, address, abi):
+    """ fetch(sid, cid) reading getValues of the gasnet contract at address """
+    from web3 import AsyncWeb3, AsyncHTTPProvider
+
+    w3 = AsyncWeb3(AsyncHTTPProvider(rpc))
+    gasnet = w3.eth.contract(address=address, abi=abi)
+
+    async def fetch(sid, cid):
+        return await gasnet.functions.getValues(sid, cid).call()
+
+    return fetch
+
+def oracle_updates(w3, address, start_block, updater=None):
+    """
+    updates() reading the (sid, cid) of the OracleUpdated and OraclesUpdated logs of the
+    controller at address from start_block on, a block range per call, leaving out updater's
+    """
+    from scripts import event_indexer
+
+    next_block = start_block
+
+    def get_logs():
+        nonlocal next_block
+        head = w3.eth.block_number
+        if head < next_block:
+            return []
+        response = w3.provider.make_request('eth_getLogs', [{
+            'address': address, 'fromBlock': hex(next_block), 'toBlock': hex(head),
+            'topics': [[event_indexer.ORACLE_UPDATED, event_indexer.ORACLES_UPDATED]]}])
+        if 'error' in response:
+            raise event_indexer.RPCError(response['error'])
+        next_block = head + 1
+        return response['result']
+
+    async def updates():
+        rows = event_indexer.decode_logs(await asyncio.to_thread(get_logs)).oracle_updated
+        return {(row[5], row[6]) for row in rows if row[4] != updater}
+
+    return updates
+
+def ape_submitter(controller, account):
+    """ submit(call) sending update_many_no_return from an ape account, in a thread so the pipeline keeps running """
+    async def submit(call):
+        tx = await asyncio.to_thread(controller.update_many_no_return, call.dat, sender=account,
+                                     gas=call.gas, raise_on_revert=False)
+        return not tx.failed
+
+    return submit
+
+def main():
+    from ape import accounts, chain, project
+
+    from scripts import params
+    from scripts.addresses import gasnet_contract, reward_addresses
+    from scripts.batch_reads import BatchReader, web3_contract
+    from scripts.oracle_mirror import OracleMirror
+    from scripts.reward_filter import RewardFilter, gas_reward
+
+    logging.basicConfig(level=logging.INFO)
+
+    controller = project.RewardController.at(reward_addresses[chain.chain_id])
+    account = accounts.load("blocknative_dev")
+
+    # every chain's records and feed state in a few batched round trips, instead of calls per chain
+    w3 = chain.provider.web3
+    oracle = project.Oracle.at(controller.oracle())
+    reader = BatchReader(w3, web3_contract(w3, controller), web3_contract(w3, oracle))
+    # payloads have to pay for their gas at the gas price we start at
+    tip_type = controller.tip_reward_type()
+    reward_filter = RewardFilter(cfg=None, reward_per_gas=gas_reward(chain.provider.gas_price), tip_type=tip_type)
+    snapshot = reader.snapshot(params.scales.keys(), types=(BASEFEE_TYPE, tip_type))
+    reward_filter.load_snapshot(snapshot)
+
+    # seeded with the snapshot's records, and refreshed with the snapshots of the chains other keepers update
+    mirror = OracleMirror(oracle)
+    mirror.load(snapshot.records)
+
+    with open('tests/gasnet_oracle_v2.json') as f:
+        abi = json.load(f)['abi']
+
+    keeper = Keeper(params.scales.keys(),
+                    gasnet_fetcher('https://rpc.gas.network', gasnet_contract, abi),
+                    ape_submitter(controller, account),
+                    reward_filter,
+                    payload_assembler.Limits(gas_price_receipts=controller.gas_price_receipts()),
+                    mirror=mirror,
+                    updates=oracle_updates(w3, controller.address, snapshot.block + 1, account.address),
+                    reader=reader)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, keeper.stop)
+        await keeper.run()
+
+    asyncio.run(run())
+    print(keeper.stats)
@@ -0,0 +1,117 @@
+"""
+In-memory mirror of Oracle records.
+
+OracleMirror keeps the Oracle's (sid, cid, typ) records locally, so reading the
+current gas price of a chain doesn't cost a round trip per type. It is
+bootstrapped, and refreshed by polling, with batched getRecords(RecordKey[])
+calls, and kept current between polls from what we send: the payloads update_many
+accepted (apply_payload, with the Oracle's rule that only a newer height and
+timestamp replace a record) and storeValuesWithReceipt receipts (apply_receipts).
+
+Reads go through get, getRecord and getGasPrice, with the Oracle's signatures,
+so the mirror can stand in for the contract (e.g. in RewardFilter.load). A key
+that isn't mirrored, or whose record is older than max_age seconds, is read from
+the Oracle and mirrored.
+"""
+import time
+from typing import NamedTuple
+
+from scripts import payload_codec as codec
+
+BASEFEE_TYPE = 107
+TIP_TYPE = 322
+
+# keys per getRecords call
+CHUNK_SIZE = 256
+
+class Record(NamedTuple):
+    height: int
+    timestamp: int
+    value: int
+
+EMPTY_RECORD = Record(0, 0, 0)
+
+class OracleMirror:
+    def __init__(self, oracle, max_age=60., clock=time.monotonic):
+        self.oracle = oracle
+        self.max_age = max_age
+        self.clock = clock
+        self.records = {}
+        self.updated_at = {}
+        self.misses = 0
+
+    def _set(self, key, record, now):
+        self.records[key] = Record(*record)
+        self.updated_at[key] = now
+
+    def bootstrap(self, keys):
+        """ mirrors keys, (sid, cid, typ) tuples, with getRecords """
+        keys = list(keys)
+        for i in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[i:i + CHUNK_SIZE]
+            now = self.clock()
+            for key, record in zip(chunk, self.oracle.getRecords(chunk)):
+                self._set(key, record, now)
+
+    def load(self, records):
+        """ mirrors records read elsewhere, {(sid, cid, typ): record} like a batch_reads Snapshot's """
+        now = self.clock()
+        for key, record in records.items():
+            self._set(key, record, now)
+
+    def bootstrap_gas_prices(self, chains, tip_type=TIP_TYPE):
+        """ mirrors the basefee and tip of chains, (sid, cid) pairs """
+        self.bootstrap((sid, cid, typ) for sid, cid in chains for typ in (BASEFEE_TYPE, tip_type))
+
+    def refresh(self, stale_only=True):
+        """ polls the mirrored keys, or only those older than max_age """
+        now = self.clock()
+        keys = [k for k in self.records if not stale_only or now - self.updated_at[k] > self.max_age]
+        self.bootstrap(keys)
+        return len(keys)
+
+    def _update(self, key, record, now):
+        # the Oracle only replaces a record with a newer (height, timestamp)
+        old = self.records.get(key, EMPTY_RECORD)
+        if (record.height, record.timestamp) > (old.height, old.timestamp):
+            self.records[key] = record
+        if key in self.records:
+            self.updated_at[key] = now
+
+    def apply_payload(self, payload):
+        """ applies the records of a signed payload (v1, envelope or several) update_many accepted """
+        now = self.clock()
+        for p in codec.decode_payloads(payload):
+            for typ, value in p.values.items():
+                self._update((p.sid, p.cid, typ), Record(p.height, p.ts, value), now)
+
+    def apply_receipts(self, receipts):
+        """ applies storeValuesWithReceipt receipts, (record key, old record, new record) each """
+        now = self.clock()
+        for key, _, new in receipts:
+            if new[0] != 0:
+                self._update(tuple(key), Record(*new), now)
+
+    def is_fresh(self, key):
+        return key in self.records and self.clock() - self.updated_at[key] <= self.max_age
+
+    def getRecord(self, sid, cid, typ):
+        key = (sid, cid, typ)
+        if not self.is_fresh(key):
+            self.misses += 1
+            self._set(key, self.oracle.getRecord(sid, cid, typ), self.clock())
+        return self.records[key]
+
+    def get(self, sid, cid, typ):
+        """ (value, height, timestamp) like Oracle.get """
+        r = self.getRecord(sid, cid, typ)
+        return r.value, r.height, r.timestamp
+
+    def getGasPrice(self, sid, cid, tip_type=TIP_TYPE):
+        """
+        (basefee + tip, height, timestamp) like Oracle.getGasPrice, read per type so it works
+        on oracles without getGasPrice, and with the controller's tip_reward_type
+        """
+        basefee = self.getRecord(sid, cid, BASEFEE_TYPE)
+        tip = self.getRecord(sid, cid, tip_type)
+        return basefee.value + tip.value, basefee.height, basefee.timestamp
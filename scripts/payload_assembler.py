@@ -0,0 +1,196 @@
+"""
+Packing of chain payloads into update_many calls.
+
+A call's dat is limited to MAX_PAYLOAD_SIZE bytes, payloads joined by the 31 byte
+DELIMITER, and to MAX_PAYLOADS oracle receipts. A controller pairing per value
+receipts (storeValuesWithReceipt, the default) takes one for every value of
+every record, one with gas_price_receipts enabled takes one GasPriceReceipt per
+chain (a v1 payload is one chain, an envelope one per record). Its gas must also stay within a budget,
+estimated with a linear GasModel, 3M gas by default like update_multi.py has
+always sent, which binds before the size limit for payloads with many values.
+
+assemble checks every candidate's framing, the way the Oracle walks it with a
+(payloadlen + 4) * 32 stride, then packs them into as few calls as it can. The
+candidates go in by expected reward, highest first, into the first call with
+room (first fit). If first fit by decreasing size needs fewer calls, that packing
+is used instead. With max_calls only reward order first fit is used, and a
+candidate is left out only if none of the max_calls calls had room for it after
+every better rewarded candidate went in.
+
+Calls come out ordered by expected reward, highest first, so a keeper that can
+only send some of them sends the best ones.
+"""
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from scripts import payload_codec as codec
+
+MAX_PAYLOAD_SIZE = 16384
+MAX_PAYLOADS = 32
+
+GAS_PRICE_TYPES = (107, 322)
+
+class GasModel(NamedTuple):
+    """
+    estimated update_many gas, base + per_record * chains + per_word * payload words.
+
+    the controller side was measured in py-evm against a stub oracle: about 118k a call,
+    19k a chain and 524 a word of dat (calldata and copies). the Oracle side is from
+    opcode costs: ecrecover, the gas price slot's load and store, and about 5k for every
+    other value word it stores. per_word charges every word as a stored value, so the
+    estimate stays above the gas used whatever the payloads carry. refit it with fit on
+    the samples tests/test_gas.py measures
+    """
+    base: int = 125_000
+    per_record: int = 20_000
+    per_word: int = 5_600
+
+    def estimate(self, records, words):
+        return self.base + self.per_record * records + self.per_word * words
+
+    @classmethod
+    def fit(cls, samples):
+        """
+        least squares GasModel of (records, words, gas_used) samples, with the base
+        raised until no sample's gas is underestimated
+        """
+        samples = list(samples)
+        a = np.array([(1, records, words) for records, words, _ in samples], dtype=float)
+        gas = np.array([g for _, _, g in samples], dtype=float)
+        _, per_record, per_word = np.linalg.lstsq(a, gas, rcond=None)[0]
+        model = cls(0, max(math.ceil(per_record), 0), max(math.ceil(per_word), 0))
+        return model._replace(base=max(g - model.estimate(records, words) for records, words, g in samples))
+
+class Limits(NamedTuple):
+    max_size: int = MAX_PAYLOAD_SIZE
+    max_records: int = MAX_PAYLOADS
+    gas_limit: int = 3_000_000
+    gas_model: GasModel = GasModel()
+    # the controller's gas_price_receipts, max_records counts chains instead of values
+    gas_price_receipts: bool = False
+
+    def receipts(self, c):
+        """ oracle receipts of a Candidate """
+        return c.records if self.gas_price_receipts else c.values
+
+class Candidate(NamedTuple):
+    payload: bytes
+    records: int
+    expected_reward: int = 0
+    values: int = 0
+
+class Call(NamedTuple):
+    dat: bytes
+    candidates: list
+    records: int
+    expected_reward: int
+    gas: int
+
+class InvalidPayload(ValueError):
+    pass
+
+def _check_record(view, offset, end):
+    """ checks the v1 record at offset, returns the offset after its values and their number """
+    if offset + codec.WORD_SIZE > end:
+        raise InvalidPayload("record header out of bounds")
+    version, _, _, _, _, plen = codec.decode_header(view, offset)
+    if version != codec.VERSION:
+        raise InvalidPayload(f"unsupported record version {version}")
+    values_end = offset + codec.WORD_SIZE * (plen + 1)
+    if values_end > end:
+        raise InvalidPayload("record values out of bounds")
+    types = codec.decode_values(view, offset + codec.WORD_SIZE, plen)
+    if not all(typ in types for typ in GAS_PRICE_TYPES):
+        raise InvalidPayload("record without a basefee and tip")
+    return values_end, plen
+
+def candidate(payload, expected_reward=0):
+    """ a Candidate of one signed payload (v1 or envelope), raises InvalidPayload if its framing is wrong """
+    view = memoryview(payload)
+    if len(view) < codec.WORD_SIZE:
+        raise InvalidPayload("payload shorter than a header")
+    version, _, _, _, _, plen = codec.decode_header(view, 0)
+    if len(view) != codec.payload_size(plen):
+        raise InvalidPayload(f"{len(view)} bytes, the header announces {codec.payload_size(plen)}")
+
+    signed_end = codec.WORD_SIZE * (plen + 1)
+    if version == codec.VERSION:
+        _, values = _check_record(view, 0, signed_end)
+        records = 1
+    elif version == codec.ENVELOPE_VERSION:
+        offset, records, values = codec.WORD_SIZE, 0, 0
+        while offset < signed_end:
+            offset, plen = _check_record(view, offset, signed_end)
+            records += 1
+            values += plen
+        if records == 0:
+            raise InvalidPayload("empty envelope")
+    else:
+        raise InvalidPayload(f"unsupported version {version}")
+
+    if view[-1] not in (27, 28):
+        raise InvalidPayload("invalid signer v param")
+
+    return Candidate(bytes(payload), records, expected_reward, values)
+
+class _Bin:
+    def __init__(self):
+        self.candidates = []
+        self.size = -len(codec.DELIMITER)
+        self.records = 0
+        self.receipts = 0
+        self.words = 0
+
+    def fits(self, c, limits):
+        words = len(c.payload) // codec.WORD_SIZE
+        return (self.size + len(codec.DELIMITER) + len(c.payload) <= limits.max_size and
+                self.receipts + limits.receipts(c) <= limits.max_records and
+                limits.gas_model.estimate(self.records + c.records, self.words + words) <= limits.gas_limit)
+
+    def add(self, c, limits):
+        self.candidates.append(c)
+        self.size += len(codec.DELIMITER) + len(c.payload)
+        self.records += c.records
+        self.receipts += limits.receipts(c)
+        self.words += len(c.payload) // codec.WORD_SIZE
+
+def _first_fit(candidates, limits, max_calls=None):
+    bins = []
+    for c in candidates:
+        for b in bins:
+            if b.fits(c, limits):
+                b.add(c, limits)
+                break
+        else:
+            if max_calls is not None and len(bins) == max_calls:
+                continue
+            b = _Bin()
+            if not b.fits(c, limits):
+                raise InvalidPayload("payload over the limits of a call on its own")
+            b.add(c, limits)
+            bins.append(b)
+    return bins
+
+def _call(b, limits):
+    candidates = sorted(b.candidates, key=lambda c: -c.expected_reward)
+    return Call(dat=codec.DELIMITER.join(c.payload for c in candidates),
+                candidates=candidates,
+                records=b.records,
+                expected_reward=sum(c.expected_reward for c in candidates),
+                gas=limits.gas_model.estimate(b.records, b.words))
+
+def assemble(candidates, limits=Limits(), max_calls=None):
+    """ update_many calls for candidates (Candidate or signed payload bytes), best first """
+    candidates = [c if isinstance(c, Candidate) else candidate(c) for c in candidates]
+
+    by_reward = sorted(candidates, key=lambda c: -c.expected_reward)
+    bins = _first_fit(by_reward, limits, max_calls)
+    if max_calls is None:
+        by_size = _first_fit(sorted(candidates, key=lambda c: (-len(c.payload), -c.expected_reward)), limits)
+        if len(by_size) < len(bins):
+            bins = by_size
+
+    calls = [_call(b, limits) for b in bins]
+    return sorted(calls, key=lambda call: -call.expected_reward)
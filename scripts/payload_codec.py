@@ -0,0 +1,153 @@
+"""
+Codec for the Oracle payload wire format.
+
+A v1 payload is a 32 byte header, plen 32 byte values and a 65 byte r, s, v
+signature over the header and values:
+
+    header: 6 empty bytes | plen (16) | ts (48) | sid (8) | cid (64) | height (64) | version (8)
+    value:  typ (16) | value (240)
+
+update_many payloads are several of them, each but the last followed by the 31
+byte DELIMITER, so the next payload starts (plen + 4) * 32 bytes after the
+previous one. A version 2 envelope has the same framing, with plen counting the
+words of the v1 headers and values it holds and a single signature after them.
+
+Encoding writes into one preallocated bytearray with struct.pack_into, decoding
+reads with struct.unpack_from from a memoryview, so neither copies or
+concatenates payload bytes. encode_payloads and decode_payloads work on whole
+batches, the signatures decode_payloads returns are views into the input.
+"""
+import struct
+from typing import NamedTuple
+
+VERSION = 1
+ENVELOPE_VERSION = 2
+
+WORD_SIZE = 32
+SIGNATURE_SIZE = 65
+DELIMITER = b'0' * 31
+
+# ts is split into its top 16 and low 32 bits, values into 16, 32, 64, 64 and 64 bits
+HEADER = struct.Struct('>6xHHIBQQB')
+VALUE = struct.Struct('>HHIQQQ')
+
+MASK_32 = 2**32 - 1
+MASK_64 = 2**64 - 1
+
+class Payload(NamedTuple):
+    version: int
+    height: int
+    cid: int
+    sid: int
+    ts: int
+    values: dict
+    signature: memoryview
+
+def payload_size(plen):
+    """ bytes of a signed v1 payload with plen values, without delimiter """
+    return WORD_SIZE * (plen + 1) + SIGNATURE_SIZE
+
+def stride(plen):
+    """ offset of the next payload after one with plen words, as the Oracle reads them """
+    return WORD_SIZE * (plen + 4)
+
+def encode_header_into(buf, offset, plen, ts, sid, cid, height, version=VERSION):
+    HEADER.pack_into(buf, offset, plen, ts >> 32, ts & MASK_32, sid, cid, height, version)
+    return offset + WORD_SIZE
+
+def encode_values_into(buf, offset, typ_values):
+    pack_into = VALUE.pack_into
+    for typ, val in typ_values.items():
+        pack_into(buf, offset, typ, val >> 224, (val >> 192) & MASK_32,
+                  (val >> 128) & MASK_64, (val >> 64) & MASK_64, val & MASK_64)
+        offset += WORD_SIZE
+    return offset
+
+def encode_payload_into(buf, offset, ts, sid, cid, height, typ_values, signature=None, version=VERSION):
+    """
+    writes a payload at offset, returns the offset after it. without a signature
+    only the signed part (header and values) is written
+    """
+    offset = encode_header_into(buf, offset, len(typ_values), ts, sid, cid, height, version)
+    offset = encode_values_into(buf, offset, typ_values)
+    if signature is not None:
+        buf[offset:offset + SIGNATURE_SIZE] = signature
+        offset += SIGNATURE_SIZE
+    return offset
+
+def encode_payload(ts, sid, cid, height, typ_values, signature=None, version=VERSION):
+    size = WORD_SIZE * (len(typ_values) + 1) + (SIGNATURE_SIZE if signature is not None else 0)
+    buf = bytearray(size)
+    encode_payload_into(buf, 0, ts, sid, cid, height, typ_values, signature, version)
+    return buf
+
+def encode_payloads(payloads):
+    """
+    one update_many payload from a list of dicts of encode_payload arguments, all with a
+    signature, delimited as the Oracle expects
+    """
+    size = sum(payload_size(len(p['typ_values'])) for p in payloads) + len(DELIMITER) * max(len(payloads) - 1, 0)
+    buf = bytearray(size)
+    offset = 0
+    for i, p in enumerate(payloads):
+        if i:
+            buf[offset:offset + len(DELIMITER)] = DELIMITER
+            offset += len(DELIMITER)
+        offset = encode_payload_into(buf, offset, **p)
+    return buf
+
+def decode_header(buf, offset=0):
+    """ (version, height, cid, sid, ts, plen) of the header at offset """
+    plen, ts_hi, ts_lo, sid, cid, height, version = HEADER.unpack_from(buf, offset)
+    return version, height, cid, sid, ts_hi << 32 | ts_lo, plen
+
+def decode_values(buf, offset, plen):
+    """ {typ: value} of the plen values at offset """
+    unpack_from = VALUE.unpack_from
+    values = {}
+    for _ in range(plen):
+        typ, a, b, c, d, e = unpack_from(buf, offset)
+        values[typ] = (((a << 32 | b) << 64 | c) << 64 | d) << 64 | e
+        offset += WORD_SIZE
+    return values
+
+def decode_payload(buf, offset=0):
+    """ the signed v1 payload at offset, and the offset of the next one """
+    view = memoryview(buf)
+    version, height, cid, sid, ts, plen = decode_header(view, offset)
+    values = decode_values(view, offset + WORD_SIZE, plen)
+    sig = offset + WORD_SIZE * (plen + 1)
+    return Payload(version, height, cid, sid, ts, values, view[sig:sig + SIGNATURE_SIZE]), offset + stride(plen)
+
+def decode_payloads(buf):
+    """
+    every record of an update_many payload, envelopes expanded into their records,
+    which share the envelope's signature
+    """
+    view = memoryview(buf)
+    end = len(view)
+    payloads = []
+    offset = 0
+    while offset < end:
+        version, height, cid, sid, ts, plen = decode_header(view, offset)
+        sig = offset + WORD_SIZE * (plen + 1)
+        signature = view[sig:sig + SIGNATURE_SIZE]
+        if version == ENVELOPE_VERSION:
+            record = offset + WORD_SIZE
+            while record < sig:
+                r_version, r_height, r_cid, r_sid, r_ts, r_plen = decode_header(view, record)
+                values = decode_values(view, record + WORD_SIZE, r_plen)
+                payloads.append(Payload(r_version, r_height, r_cid, r_sid, r_ts, values, signature))
+                record += WORD_SIZE * (r_plen + 1)
+            assert record == sig, "invalid envelope"
+        else:
+            payloads.append(Payload(version, height, cid, sid, ts,
+                                    decode_values(view, offset + WORD_SIZE, plen), signature))
+        offset += stride(plen)
+    return payloads
+
+def signed_data(buf, offset=0):
+    """ view of the header and values the signature of the payload at offset covers """
+    view = memoryview(buf)
+    plen = HEADER.unpack_from(view, offset)[0]
+    return view[offset:offset + WORD_SIZE * (plen + 1)]
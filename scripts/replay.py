@@ -0,0 +1,163 @@
+"""
+Historical replay of the RewardController.
+
+Streams a recorded sequence of gasnet updates (sid, cid, height, timestamp,
+basefee, tip) through controller_model as if each one had been sent to
+update_many, and reports what the controller would have paid: per update
+time_reward, deviation_reward and reward_mult, and the running total_rewards.
+
+The oracle side is mirrored too. A record only updates its chain if its
+(height, timestamp) is newer than the stored one, otherwise it is stale and
+earns nothing, and the old gas price and timestamp of a rewarded update are the
+ones of the last record stored for the chain (zero before the first one).
+A replay of a window that starts mid-history is seeded with the oracle records
+and feed state live at its start, a batch_reads Snapshot read at the window's
+first block, instead of starting every chain from zero.
+
+Each update is replayed as its own update_many call. An update the contract
+would revert on (unknown scid, timestamp going backwards, negative reward, ...)
+stores nothing and is counted in Replay.reverts, instead of reverting the rest
+of the keeper batch it was sent in.
+
+History is read row by row, so months of updates never need to fit in memory:
+
+    python -m scripts.replay history.csv.gz --kp -3000000000000000000 --out rewards.csv
+
+The input is a csv with a sid,cid,height,timestamp,basefee,tip header,
+timestamps in ms like the oracle's.
+"""
+import argparse
+import csv
+import gzip
+from typing import NamedTuple
+
+from scripts import controller_model as cm
+from scripts import params
+
+FIELDS = ('sid', 'cid', 'height', 'timestamp', 'basefee', 'tip')
+
+# stamp, timestamp, gas price of a chain before its first record
+EMPTY_RECORD = (0, 0, 0)
+
+class ReplayUpdate(NamedTuple):
+    sid: int
+    cid: int
+    height: int
+    timestamp: int
+    gas_price: int
+    raw_deviation: int
+    time_since: int
+    time_reward: int
+    deviation_reward: int
+    reward_mult: int
+    total_rewards: int
+
+class Replay:
+    """
+    controller and oracle state replayed so far. scales maps (sid, cid) to the
+    feed scale, like params.scales. initial, a batch_reads Snapshot, seeds the
+    records and feed state of its chains
+    """
+    def __init__(self, cfg, scales, initial=None):
+        self.cfg = cfg
+        self.scales = dict(scales)
+        self.records = {}
+        self.feeds = {}
+        self.rewards = {}
+        self.total_rewards = 0
+        self.updates = 0
+        self.stale = 0
+        self.reverts = 0
+        if initial is not None:
+            self.load_snapshot(initial)
+
+    def load_snapshot(self, snapshot):
+        """ sets the records and feed states of the chains of a batch_reads Snapshot """
+        for (sid, cid), feed in snapshot.feeds.items():
+            gas_price, height, ts = snapshot.gas_price(sid, cid)
+            if height or ts:
+                self.records[(sid, cid)] = (height << 48 | ts, ts, gas_price)
+            self.feeds[(sid, cid)] = list(feed)
+
+    def step(self, sid, cid, height, timestamp, basefee, tip):
+        """ replays one record, returns its ReplayUpdate or None if it was stale or reverted """
+        key = (sid, cid)
+        old_stamp, old_timestamp, old_gas_price = self.records.get(key, EMPTY_RECORD)
+        stamp = height << 48 | timestamp
+        if stamp <= old_stamp:
+            self.stale += 1
+            return None
+
+        feed = self.feeds.get(key)
+        if feed is None:
+            feed = self.feeds[key] = [0, 0, 0, 0, self.scales.get(key, 0)]
+
+        gas_price = basefee + tip
+        try:
+            update = cm.update_feed(feed, old_gas_price, gas_price, old_timestamp, timestamp, self.cfg)
+        except cm.ControllerRevert:
+            self.reverts += 1
+            return None
+
+        self.records[key] = (stamp, timestamp, gas_price)
+        reward = update.time_reward + update.deviation_reward
+        self.rewards[key] = self.rewards.get(key, 0) + reward
+        self.total_rewards += reward
+        self.updates += 1
+
+        return ReplayUpdate(sid, cid, height, timestamp, gas_price, update.raw_deviation, update.time_since,
+                            update.time_reward, update.deviation_reward, update.reward_mult, self.total_rewards)
+
+    def run(self, records):
+        """ replays an iterable of (sid, cid, height, timestamp, basefee, tip), yielding the rewarded updates """
+        step = self.step
+        for record in records:
+            update = step(*record)
+            if update is not None:
+                yield update
+
+def read_history(path):
+    """ streams the records of a history csv (gzipped if it ends in .gz) as tuples of ints """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        assert tuple(header) == FIELDS, f"expected a {','.join(FIELDS)} header, got {header}"
+        for row in reader:
+            yield tuple(map(int, row))
+
+def write_updates(path, updates):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ReplayUpdate._fields)
+        writer.writerows(updates)
+
+def main():
+    parser = argparse.ArgumentParser(description="replay gasnet history through the reward controller")
+    parser.add_argument('history', help="csv of sid,cid,height,timestamp,basefee,tip records")
+    parser.add_argument('--out', help="csv to write every rewarded update to")
+    parser.add_argument('--kp', type=int)
+    parser.add_argument('--ki', type=int)
+    parser.add_argument('--target-time-since', type=int, help="in 1e18 seconds, like params.target_time_since")
+    parser.add_argument('--coeff', type=int, nargs=4)
+    args = parser.parse_args()
+
+    overrides = {k: v for k, v in (('kp', args.kp), ('ki', args.ki),
+                                   ('target_time_since', args.target_time_since),
+                                   ('coeff', args.coeff and tuple(args.coeff))) if v is not None}
+    replay = Replay(cm.ControllerConfig.from_params(params, **overrides), params.scales)
+
+    updates = replay.run(read_history(args.history))
+    if args.out:
+        write_updates(args.out, updates)
+    else:
+        for _ in updates:
+            pass
+
+    for (sid, cid), reward in sorted(replay.rewards.items()):
+        print(f"{sid=} {cid=} rewards={reward/10**18:.6f}")
+    print(f"updates={replay.updates} stale={replay.stale} reverts={replay.reverts}")
+    print(f"total_rewards={replay.total_rewards/10**18:.6f}")
+
+if __name__ == '__main__':
+    main()
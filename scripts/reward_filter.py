@@ -0,0 +1,185 @@
+"""
+Keeper pre-filter predicting update_many rewards locally.
+
+RewardFilter caches each chain's oracle gas price record and the controller's
+feed state, and predicts what a payload would pay with controller_model's
+exact reward math, without any RPC. Payloads predicted to pay less than
+min_reward plus the gas they add to an update_many call (reward_per_gas, see
+gas_reward), to be skipped by the Oracle as stale (what comes back as
+new_height == 0), or to revert the call (unknown scid, timestamp going back)
+are dropped before they're sent. The rest come back as payload_assembler
+Candidates with their predicted reward, ready for assemble.
+
+The caches are filled once, with load (a few view calls per chain) or
+load_snapshot (a batch_reads Snapshot, a handful of round trips for every chain),
+and then kept current with apply, which replays a sent payload the way update_many would.
+The payloads select returns are pending until they're applied, or released if
+their call failed or was never sent, and later selects predict on top of them,
+so a payload still in flight comes back stale instead of being sent again.
+Other keepers' updates aren't seen until the next load, until then predictions
+for their chains are optimistic, those payloads are at worst stale on chain and
+pay nothing.
+"""
+from typing import NamedTuple
+
+from scripts import controller_model as cm
+from scripts import payload_assembler
+from scripts import payload_codec as codec
+from scripts.oracle_mirror import BASEFEE_TYPE, TIP_TYPE
+
+# stamp, timestamp, gas price of a chain the Oracle has no record of
+EMPTY_RECORD = (0, 0, 0)
+
+# rewards (18 decimals) a keeper takes for an ether of gas, rewards aren't priced so 1:1 by default
+REWARD_PER_ETH = 10**18
+
+class Prediction(NamedTuple):
+    sid: int
+    cid: int
+    height: int
+    ts: int
+    gas_price: int
+    time_reward: int
+    deviation_reward: int
+    stale: bool = False
+    revert: str = None
+
+    @property
+    def reward(self):
+        return self.time_reward + self.deviation_reward
+
+def _scid(sid, cid):
+    return cid << 8 | sid
+
+def gas_reward(gas_price, reward_per_eth=REWARD_PER_ETH):
+    """ reward_per_gas of a keeper paying gas_price wei a gas """
+    return gas_price * reward_per_eth // 10**18
+
+class RewardFilter:
+    def __init__(self, cfg, rewards_enabled=True, min_reward=0, reward_per_gas=0,
+                 gas_model=payload_assembler.GasModel(), tip_type=TIP_TYPE):
+        self.cfg = cfg
+        self.rewards_enabled = rewards_enabled
+        # the controller's tip_reward_type, the tip it adds to the basefee
+        self.tip_type = tip_type
+        self.min_reward = min_reward
+        self.reward_per_gas = reward_per_gas
+        self.gas_model = gas_model
+        self.records = {}
+        self.feeds = {}
+        # payload -> {(sid, cid): (record, feed)} of the selected payloads not yet applied or released
+        self.pending = {}
+
+    def set_record(self, sid, cid, height, ts, gas_price):
+        self.records[(sid, cid)] = (height << 48 | ts, ts, gas_price)
+
+    def set_feed(self, sid, cid, error_integral, last_output, interval_ema, count, scale):
+        self.feeds[(sid, cid)] = [error_integral, last_output, interval_ema, count, scale]
+
+    def load(self, controller, oracle, chains):
+        """
+        caches the oracle records and feed states of chains, (sid, cid) pairs, and the controller's
+        config. records are read per type with get, which every oracle has (or an OracleMirror)
+        """
+        self.cfg = cm.ControllerConfig.from_controller(controller)
+        self.rewards_enabled = controller.rewards_enabled()
+        self.tip_type = controller.tip_reward_type()
+        for sid, cid in chains:
+            basefee, height, ts = oracle.get(sid, cid, BASEFEE_TYPE)
+            tip, _, _ = oracle.get(sid, cid, self.tip_type)
+            self.set_record(sid, cid, height, ts, basefee + tip)
+            scid = _scid(sid, cid)
+            self.set_feed(sid, cid, controller.error_integral(scid), controller.last_output(scid),
+                          controller.interval_ema(scid), controller.count(scid), controller.scales(scid))
+
+    def load_snapshot(self, snapshot):
+        """ caches the records, feed states and config of a batch_reads Snapshot, read with the tip_type records """
+        self.cfg = snapshot.cfg
+        self.rewards_enabled = snapshot.rewards_enabled
+        for (sid, cid), feed in snapshot.feeds.items():
+            gas_price, height, ts = snapshot.gas_price(sid, cid, self.tip_type)
+            self.set_record(sid, cid, height, ts, gas_price)
+            self.set_feed(sid, cid, *feed)
+
+    def _predict_record(self, p, records, feeds):
+        key = (p.sid, p.cid)
+        old_stamp, old_ts, old_gas_price = records.get(key, EMPTY_RECORD)
+        if BASEFEE_TYPE not in p.values or self.tip_type not in p.values:
+            # the controller only updates a chain on a basefee and tip pair
+            return Prediction(p.sid, p.cid, p.height, p.ts, 0, 0, 0, stale=True)
+        gas_price = p.values[BASEFEE_TYPE] + p.values[self.tip_type]
+        if p.height << 48 | p.ts <= old_stamp:
+            return Prediction(p.sid, p.cid, p.height, p.ts, gas_price, 0, 0, stale=True)
+
+        feed = feeds.get(key)
+        feed = list(feed) if feed is not None else [0, 0, 0, 0, 0]
+        revert = None
+        if not self.rewards_enabled:
+            # update_many still checks the timestamps and the scid, but leaves the feed alone
+            if p.ts < old_ts:
+                revert = "timestamp underflow"
+            elif feed[4] == 0:
+                revert = "unknown scid"
+            update = cm.Update(0, 0, 0, 0, 0)
+        else:
+            try:
+                update = cm.update_feed(feed, old_gas_price, gas_price, old_ts, p.ts, self.cfg)
+            except cm.ControllerRevert as e:
+                revert = str(e)
+
+        if revert is not None:
+            return Prediction(p.sid, p.cid, p.height, p.ts, gas_price, 0, 0, revert=revert)
+
+        records[key] = (p.height << 48 | p.ts, p.ts, gas_price)
+        feeds[key] = feed
+        return Prediction(p.sid, p.cid, p.height, p.ts, gas_price, update.time_reward, update.deviation_reward)
+
+    def predict(self, payload, records=None, feeds=None):
+        """
+        predictions for every record of a signed payload (v1 or envelope), against the
+        cached state or the records and feeds given, which are updated as update_many would
+        """
+        records = dict(self.records) if records is None else records
+        feeds = dict(self.feeds) if feeds is None else feeds
+        return [self._predict_record(p, records, feeds) for p in codec.decode_payloads(payload)]
+
+    def gas_cost(self, candidate):
+        """ reward_per_gas times the gas a Candidate adds to an update_many call """
+        words = len(candidate.payload) // codec.WORD_SIZE
+        return self.reward_per_gas * (self.gas_model.per_record * candidate.records + self.gas_model.per_word * words)
+
+    def select(self, payloads):
+        """
+        payload_assembler Candidates of the payloads worth sending, predicted to pay at least
+        min_reward plus their gas_cost, with their predicted reward. a payload is predicted
+        against the cache as updated by the pending payloads and the payloads before it,
+        and is pending once selected
+        """
+        records, feeds = dict(self.records), dict(self.feeds)
+        for state in self.pending.values():
+            for key, (record, feed) in state.items():
+                records[key], feeds[key] = record, feed
+        candidates = []
+        for payload in payloads:
+            candidate = payload_assembler.candidate(payload)
+            trial_records, trial_feeds = dict(records), dict(feeds)
+            predictions = self.predict(payload, trial_records, trial_feeds)
+            reward = sum(p.reward for p in predictions)
+            if any(p.revert for p in predictions) or all(p.stale for p in predictions):
+                continue
+            if reward < self.min_reward + self.gas_cost(candidate):
+                continue
+            records, feeds = trial_records, trial_feeds
+            self.pending[payload] = {key: (records[key], feeds[key])
+                                     for key in {(p.sid, p.cid) for p in predictions if not p.stale}}
+            candidates.append(candidate._replace(expected_reward=reward))
+        return candidates
+
+    def apply(self, payload):
+        """ updates the cache with a payload update_many accepted """
+        self.pending.pop(payload, None)
+        return self.predict(payload, self.records, self.feeds)
+
+    def release(self, payload):
+        """ forgets a selected payload that wasn't accepted, so it can be selected again """
+        self.pending.pop(payload, None)
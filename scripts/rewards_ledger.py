@@ -0,0 +1,137 @@
+"""
+Snapshot of every updater's accrued rewards.
+
+get_updaters_chunk(start, count) returns at most 256 (updater, rewards) entries
+and the controller registers up to MAX_UPDATERS = 2**18 updaters, so walking
+them one chunk after the other is up to 1024 sequential calls. snapshot pins a
+block number, reads n_updaters and total_rewards at it, and reads every chunk at
+the same block concurrently, at most max_connections calls in flight, retrying
+a failed call a few times.
+
+The ledger is checked before it's returned: one entry per registered updater,
+no address twice, and the rewards summing to total_rewards, so a payout never
+starts from a partial or inconsistent walk (LedgerMismatch otherwise).
+write_ledger writes it as csv sorted by address, under a header line with the
+block and totals, read_ledger reads it back and checks it again:
+
+    python -m scripts.rewards_ledger --rpc https://sepolia.infura.io/v3/$WEB3_INFURA_PROJECT_ID --out ledger.csv
+"""
+import argparse
+import asyncio
+import time
+from typing import NamedTuple
+
+CHUNK_SIZE = 256
+MAX_CONNECTIONS = 16
+RETRIES = 3
+
+# the RewardController getters a snapshot reads
+LEDGER_ABI = [
+    {'name': 'n_updaters', 'type': 'function', 'stateMutability': 'view', 'inputs': [],
+     'outputs': [{'name': '', 'type': 'uint32'}]},
+    {'name': 'total_rewards', 'type': 'function', 'stateMutability': 'view', 'inputs': [],
+     'outputs': [{'name': '', 'type': 'uint256'}]},
+    {'name': 'get_updaters_chunk', 'type': 'function', 'stateMutability': 'view',
+     'inputs': [{'name': 'start', 'type': 'uint256'}, {'name': 'count', 'type': 'uint256'}],
+     'outputs': [{'name': '', 'type': 'tuple[]', 'components': [{'name': 'address', 'type': 'address'},
+                                                                 {'name': 'total_rewards', 'type': 'uint256'}]}]},
+]
+
+class LedgerMismatch(Exception):
+    pass
+
+class Ledger(NamedTuple):
+    block: int
+    n_updaters: int
+    total_rewards: int
+    rewards: dict
+
+def check(ledger):
+    """ raises LedgerMismatch if ledger isn't every updater's rewards, adding up to total_rewards """
+    if len(ledger.rewards) != ledger.n_updaters:
+        raise LedgerMismatch(f"{len(ledger.rewards)} updaters read, the controller has {ledger.n_updaters}")
+    total = sum(ledger.rewards.values())
+    if total != ledger.total_rewards:
+        raise LedgerMismatch(f"updater rewards sum to {total}, total_rewards is {ledger.total_rewards}")
+    return ledger
+
+async def _call(fn, block, semaphore, retries):
+    for attempt in range(retries + 1):
+        async with semaphore:
+            try:
+                return await fn.call(block_identifier=block)
+            except Exception:
+                if attempt == retries:
+                    raise
+        await asyncio.sleep(0.1 * 2**attempt)
+
+async def snapshot(controller, block=None, chunk_size=CHUNK_SIZE, max_connections=MAX_CONNECTIONS, retries=RETRIES):
+    """ the checked Ledger of an AsyncWeb3 controller contract at block, the latest by default """
+    if block is None:
+        block = await controller.w3.eth.block_number
+    semaphore = asyncio.Semaphore(max_connections)
+    f = controller.functions
+
+    n_updaters, total_rewards = await asyncio.gather(_call(f.n_updaters(), block, semaphore, retries),
+                                                     _call(f.total_rewards(), block, semaphore, retries))
+    chunks = await asyncio.gather(*(_call(f.get_updaters_chunk(start, min(chunk_size, n_updaters - start)),
+                                          block, semaphore, retries)
+                                    for start in range(0, n_updaters, chunk_size)))
+    rewards = {}
+    for chunk in chunks:
+        for address, amount in chunk:
+            if address in rewards:
+                raise LedgerMismatch(f"{address} listed twice")
+            rewards[address] = amount
+    return check(Ledger(block, n_updaters, total_rewards, rewards))
+
+def write_ledger(path, ledger):
+    with open(path, 'w') as f:
+        f.write(f"# block={ledger.block} n_updaters={ledger.n_updaters} total_rewards={ledger.total_rewards}\n")
+        f.write("address,rewards\n")
+        for address in sorted(ledger.rewards, key=lambda a: int(a, 16)):
+            f.write(f"{address},{ledger.rewards[address]}\n")
+
+def read_ledger(path):
+    """ the checked Ledger written at path """
+    with open(path) as f:
+        header = dict(field.split('=') for field in f.readline().removeprefix('# ').split())
+        assert f.readline().strip() == "address,rewards"
+        rewards = {}
+        for line in f:
+            address, amount = line.rstrip().split(',')
+            rewards[address] = int(amount)
+    return check(Ledger(int(header['block']), int(header['n_updaters']), int(header['total_rewards']), rewards))
+
+async def _main(args):
+    import aiohttp
+    from web3 import AsyncHTTPProvider, AsyncWeb3
+
+    from scripts.addresses import reward_addresses
+
+    provider = AsyncHTTPProvider(args.rpc)
+    # one pooled connection per call in flight
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.max_connections)) as session:
+        await provider.cache_async_session(session)
+        w3 = AsyncWeb3(provider)
+        address = args.address or reward_addresses[await w3.eth.chain_id]
+        controller = w3.eth.contract(address=address, abi=LEDGER_ABI)
+        return await snapshot(controller, args.block, max_connections=args.max_connections)
+
+def main():
+    parser = argparse.ArgumentParser(description="snapshot every updater's rewards at one block")
+    parser.add_argument('--rpc', required=True)
+    parser.add_argument('--address', help="controller address, reward_addresses of the rpc's chain by default")
+    parser.add_argument('--block', type=int, help="the latest by default")
+    parser.add_argument('--max-connections', type=int, default=MAX_CONNECTIONS)
+    parser.add_argument('--out', default='ledger.csv')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ledger = asyncio.run(_main(args))
+    write_ledger(args.out, ledger)
+    print(f"block {ledger.block}: {ledger.n_updaters} updaters, total_rewards {ledger.total_rewards / 10**18:.6f}, "
+          f"in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Parameter sweep of the RewardController PI gains and bounds.
+
+Replays a recorded update stream (see scripts/replay.py) once per parameter
+point on a process pool, each worker reading the history once, and reports for
+each point:
+
+    emission            total_rewards paid over the history
+    interval            mean time between rewarded updates of a feed, in seconds. a
+                        feed's first update has no previous one and is left out
+    interval_ema        mean final interval_ema of the feeds, in seconds
+    target_time_since   in seconds, what the controller steers interval_ema to
+    upper_saturated     fraction of rewarded updates with reward_mult at output_upper_bound
+    lower_saturated     same for output_lower_bound
+
+Points are grids (the product of the values given for each parameter) or
+random samples of ranges. Points the controller's constructor would reject
+(output_lower_bound above output_upper_bound, target_time_since not positive)
+are left out of grids and redrawn in samples. Results are appended to a jsonl file as points finish,
+and points already in it are skipped, so an interrupted sweep resumes where it
+stopped:
+
+    python -m scripts.sweep history.csv.gz results.jsonl \\
+        --param kp=-4e18,-2e18,-1e18 --param ki=-2e17,-1e17 --param min_window_size=5,10
+
+    python -m scripts.sweep history.csv.gz results.jsonl --samples 10000 --seed 1 \\
+        --param kp=-4e18:-1e17 --param ki=-4e17:-1e16
+
+Values are exact integers in the units of scripts/params.py, scientific
+notation is accepted. Parameters are ControllerConfig fields, default_window_size
+is min_window_size.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+from decimal import Decimal
+from multiprocessing import Pool
+
+from scripts import controller_model as cm
+from scripts import params
+from scripts import replay
+
+SWEEP_PARAMS = ('kp', 'ki', 'co_bias', 'output_upper_bound', 'output_lower_bound', 'min_window_size',
+                'target_time_since')
+
+def evaluate(cfg, scales, records, initial=None):
+    """ replays records under cfg, seeded from the batch_reads Snapshot initial if given, returns the point's metrics """
+    r = replay.Replay(cfg, scales, initial)
+    upper = lower = time_since = intervals = 0
+    # the first update of a feed is timed from 0 unless initial has a record of it
+    seen = set(r.records)
+    for update in r.run(records):
+        key = (update.sid, update.cid)
+        if key in seen:
+            time_since += update.time_since
+            intervals += 1
+        else:
+            seen.add(key)
+        if update.reward_mult == cfg.output_upper_bound:
+            upper += 1
+        elif update.reward_mult == cfg.output_lower_bound:
+            lower += 1
+
+    n = max(r.updates, 1)
+    emas = [feed[2] for feed in r.feeds.values() if feed[3]]
+    return {'emission': r.total_rewards,
+            'updates': r.updates,
+            'stale': r.stale,
+            'reverts': r.reverts,
+            'interval': time_since / max(intervals, 1),
+            'interval_ema': sum(emas) / max(len(emas), 1) / 10**18,
+            'target_time_since': cfg.target_time_since / 10**18,
+            'upper_saturated': upper / n,
+            'lower_saturated': lower / n}
+
+def point_key(point):
+    return json.dumps(point, sort_keys=True)
+
+def valid(point):
+    """ whether a controller could be deployed with point, the params of scripts/params.py elsewhere """
+    cfg = cm.ControllerConfig.from_params(params, **point)
+    return cfg.output_lower_bound <= cfg.output_upper_bound and cfg.target_time_since > 0
+
+def grid(values):
+    """ every valid combination of the values of each parameter, values is {name: [v, ...]} """
+    names = sorted(values)
+    for combination in itertools.product(*(values[name] for name in names)):
+        point = dict(zip(names, combination))
+        if valid(point):
+            yield point
+
+def samples(ranges, n, seed, max_draws=1000):
+    """ n uniform random valid points, ranges is {name: (lo, hi)}. invalid draws are redrawn, up to max_draws times a point """
+    rng = random.Random(seed)
+    names = sorted(ranges)
+    for _ in range(n):
+        for _ in range(max_draws):
+            point = {name: rng.randint(*ranges[name]) for name in names}
+            if valid(point):
+                break
+        else:
+            raise ValueError(f"no valid point in {max_draws} draws of {ranges}")
+        yield point
+
+def load_results(path):
+    """ results of a previous run, keyed by point. a line cut off by an interruption is ignored """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[point_key(result['point'])] = result
+    return results
+
+def _cut_off(path):
+    """ whether the last line of path was cut off by an interruption """
+    with open(path, 'rb') as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+_records = None
+_scales = None
+
+def _init_worker(history, scales):
+    # parsed once per worker, every point it evaluates replays the same records
+    global _records, _scales
+    _records = list(replay.read_history(history))
+    _scales = scales
+
+def _run_point(point):
+    cfg = cm.ControllerConfig.from_params(params, **point)
+    return {'point': point, **evaluate(cfg, _scales, _records)}
+
+def sweep(history, results_path, points, scales=params.scales, processes=None):
+    """
+    evaluates the points not already in results_path on a process pool, appending each
+    result as it finishes. returns every result in results_path, previous runs included
+    """
+    results = load_results(results_path)
+    todo = [p for p in {point_key(p): p for p in points}.values() if point_key(p) not in results]
+    if not todo:
+        return list(results.values())
+
+    with Pool(processes, initializer=_init_worker, initargs=(history, dict(scales))) as pool, \
+            open(results_path, 'a') as f:
+        if _cut_off(results_path):
+            f.write('\n')
+        for result in pool.imap_unordered(_run_point, todo):
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            results[point_key(result['point'])] = result
+
+    return list(results.values())
+
+def parse_int(s):
+    return int(Decimal(s))
+
+def main():
+    parser = argparse.ArgumentParser(description="sweep the reward controller parameters over a recorded history")
+    parser.add_argument('history', help="csv of sid,cid,height,timestamp,basefee,tip records")
+    parser.add_argument('results', help="jsonl file results are appended to, and resumed from")
+    parser.add_argument('--param', action='append', default=[],
+                        help="name=v1,v2,... for a grid or name=lo:hi with --samples")
+    parser.add_argument('--samples', type=int, help="evaluate this many random points instead of a grid")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, help="pool size, every core by default")
+    args = parser.parse_args()
+
+    spec = {}
+    for p in args.param:
+        name, values = p.split('=', 1)
+        assert name in SWEEP_PARAMS, f"{name} is not one of {', '.join(SWEEP_PARAMS)}"
+        if args.samples:
+            lo, hi = values.split(':')
+            spec[name] = (parse_int(lo), parse_int(hi))
+        else:
+            spec[name] = [parse_int(v) for v in values.split(',')]
+
+    points = list(samples(spec, args.samples, args.seed) if args.samples else grid(spec))
+    assert points, "no valid point, output_lower_bound is above output_upper_bound everywhere"
+    results = sweep(args.history, args.results, points, processes=args.processes)
+
+    for result in sorted(results, key=lambda r: r['emission']):
+        print(json.dumps(result))
+
+if __name__ == '__main__':
+    main()
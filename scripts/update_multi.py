@@ -12,8 +12,9 @@ from ape import project, chain
 from scripts.abis import gas_oracle_v2_abi
 from scripts import params
 from scripts.addresses import reward_addresses
+from scripts import payload_assembler
+from scripts.reward_filter import RewardFilter, gas_reward
 
-DELIMITER = b'0000000000000000000000000000000'
 rewards = reward_addresses[chain.chain_id]
 controller = project.RewardController.at(rewards)
 
@@ -31,25 +32,32 @@ total_rewards = controller.total_rewards()
 print(f"{rewards_before=}")
 print(f"{total_rewards=}")
 
-payload = b''
-for i, scid in enumerate(params.scales.keys()):
+payloads = []
+for scid in params.scales.keys():
     # read gasnet
     sid = scid[0]
     cid = scid[1]
     dat: bytes = oracle_gasnet.functions.getValues(sid, cid).call()
-    if i != 0:
-          payload += DELIMITER
-    payload += dat
+    payloads.append(dat)
 
-rewards = controller.update_many.call(payload)
-print("pending rewards")
-print(rewards)
+# predict rewards locally and drop stale chains and those paying less than their gas, instead of an eth_call
+reward_filter = RewardFilter(cfg=None, reward_per_gas=gas_reward(chain.provider.gas_price))
+reward_filter.load(controller, project.Oracle.at(controller.oracle()), params.scales.keys())
+candidates = reward_filter.select(payloads)
+print("predicted rewards")
+print([c.expected_reward for c in candidates])
 
-# update oracle w/ gasnet payload
-tx = controller.update_many(payload, sender=account, raise_on_revert=True, gas=3000000)
-tx.show_trace(True)
+# as many update_many calls as the payload size, receipt and gas limits need
+limits = payload_assembler.Limits(gas_price_receipts=controller.gas_price_receipts())
+for call in payload_assembler.assemble(candidates, limits):
+    # update oracle w/ gasnet payload
+    tx = controller.update_many(call.dat, sender=account, raise_on_revert=True, gas=max(call.gas, 3000000))
+    tx.show_trace(True)
 
-print(tx.events)
+    for c in call.candidates:
+        reward_filter.apply(c.payload)
+
+    print(tx.events)
 
 rewards_after = controller.rewards(account)
 print(f"{rewards_after=}")
@@ -0,0 +1,137 @@
+import pytest
+from web3 import EthereumTesterProvider, HTTPProvider, Web3
+
+import params
+from rpc import RPCServer
+from scripts import controller_model as cm
+from scripts.batch_reads import BatchReader, Feed, Snapshot, record_key
+from scripts.oracle_mirror import OracleMirror, Record
+from scripts.reward_filter import RewardFilter
+from utils import deploy_vyper
+
+CHAINS = [(2, cid) for cid in range(1, 41)]
+SCALES = {chain: 10**12 + i for i, chain in enumerate(CHAINS)}
+UPDATERS = [Web3.to_checksum_address(f'0x{i:040x}') for i in range(1, 6)]
+
+# stand-in for the Oracle's getRecords(uint88[]), records set directly
+ORACLE = """
+struct Record:
+    height: uint64
+    timestamp: uint48
+    value: uint240
+
+records: HashMap[uint88, Record]
+
+@external
+def set_record(key: uint88, height: uint64, timestamp: uint48, _value: uint240):
+    self.records[key] = Record(height=height, timestamp=timestamp, value=_value)
+
+@external
+@view
+def getRecords(keys: DynArray[uint88, 256]) -> DynArray[Record, 256]:
+    records: DynArray[Record, 256] = []
+    for key: uint88 in keys:
+        records.append(self.records[key])
+    return records
+"""
+
+@pytest.fixture(scope='module')
+def deployment():
+    provider = EthereumTesterProvider()
+    w3 = Web3(provider)
+    w3.eth.default_account = w3.eth.accounts[0]
+    oracle = deploy_vyper(w3, ORACLE)
+    with open('contracts/RewardController.vy') as f:
+        controller = deploy_vyper(w3, f.read(), params.kp, params.ki, params.co_bias, params.output_upper_bound,
+                                  params.output_lower_bound, params.target_time_since, params.tip_reward_type,
+                                  params.min_reward, params.max_reward, params.default_window_size,
+                                  oracle.address, params.coeff, params.min_fee)
+
+    for i, (sid, cid) in enumerate(CHAINS):
+        oracle.functions.set_record(record_key(sid, cid, 107), 100 + i, 1_000 * i, 10**9 + i).transact()
+        oracle.functions.set_record(record_key(sid, cid, 322), 100 + i, 1_000 * i, 10**8 + i).transact()
+    controller.functions.set_scales([(sid, cid, scale) for (sid, cid), scale in SCALES.items()]).transact()
+    sid, cid = CHAINS[0]
+    controller.functions.test_update_interval_ema(cid << 8 | sid, 30_000).transact()
+    controller.functions.test_update_feedback(cid << 8 | sid, -10**17).transact()
+    return provider, w3, oracle, controller
+
+@pytest.fixture
+def rpc(deployment):
+    _, w3, _, _ = deployment
+    server = RPCServer(w3).start()
+    yield server
+    server.stop()
+
+def batch_reader(deployment, rpc, **kw):
+    _, _, oracle, controller = deployment
+    w3 = Web3(HTTPProvider(rpc.url))
+    return BatchReader(w3, w3.eth.contract(address=controller.address, abi=controller.abi),
+                       w3.eth.contract(address=oracle.address, abi=oracle.abi), **kw)
+
+def expected_feed(controller, sid, cid):
+    scid = cid << 8 | sid
+    f = controller.functions
+    return Feed(f.error_integral(scid).call(), f.last_output(scid).call(), f.interval_ema(scid).call(),
+                f.count(scid).call(), f.scales(scid).call())
+
+class TestBatchReads:
+    def test_snapshot(self, deployment, rpc):
+        _, _, _, controller = deployment
+        reader = batch_reader(deployment, rpc)
+        snapshot = reader.snapshot(CHAINS, UPDATERS)
+
+        # 11 config reads, 1 getRecords, 200 feed reads and 5 rewards: 3 batches and the block number
+        assert reader.batching
+        assert reader.round_trips == 4
+        assert rpc.posts == 4
+
+        assert isinstance(snapshot, Snapshot)
+        assert snapshot.cfg == cm.ControllerConfig.from_params(params)
+        assert snapshot.rewards_enabled is False
+        assert snapshot.rewards == {a: 0 for a in UPDATERS}
+        for i, (sid, cid) in enumerate(CHAINS):
+            assert snapshot.records[(sid, cid, 107)] == Record(100 + i, 1_000 * i, 10**9 + i)
+            assert snapshot.gas_price(sid, cid) == (11 * 10**8 + 2 * i, 100 + i, 1_000 * i)
+            assert snapshot.feeds[(sid, cid)] == expected_feed(controller, sid, cid)
+
+        feed = snapshot.feeds[CHAINS[0]]
+        assert feed.interval_ema > 0 and feed.error_integral != 0 and feed.last_output != 0
+        assert feed.scale == SCALES[CHAINS[0]]
+
+    def test_records_chunks(self, deployment, rpc):
+        reader = batch_reader(deployment, rpc, chunk_size=16, max_batch=2)
+        keys = [(sid, cid, typ) for sid, cid in CHAINS for typ in (107, 322, 999)]
+        records = reader.records(keys)
+
+        # 120 keys in 8 getRecords calls, sent 2 per batch
+        assert reader.round_trips == 4
+        assert list(records) == keys
+        assert records[(*CHAINS[3], 322)] == Record(103, 3_000, 10**8 + 3)
+        assert records[(*CHAINS[3], 999)] == Record(0, 0, 0)
+
+    def test_without_batching(self, deployment):
+        _, w3, oracle, controller = deployment
+        reader = BatchReader(w3, controller, oracle)
+        feeds = reader.feeds(CHAINS[:2])
+
+        # the tester provider has no batch requests, the calls go one at a time
+        assert not reader.batching
+        assert reader.round_trips == 10
+        assert feeds[CHAINS[0]] == expected_feed(controller, *CHAINS[0])
+        assert reader.rewards(UPDATERS[:2]) == {UPDATERS[0]: 0, UPDATERS[1]: 0}
+
+    def test_load_snapshot(self, deployment, rpc):
+        snapshot = batch_reader(deployment, rpc).snapshot(CHAINS)
+
+        reward_filter = RewardFilter(cfg=None)
+        reward_filter.load_snapshot(snapshot)
+        assert reward_filter.cfg == snapshot.cfg
+        sid, cid = CHAINS[1]
+        assert reward_filter.records[(sid, cid)] == (101 << 48 | 1_000, 1_000, 11 * 10**8 + 2)
+        assert reward_filter.feeds[(sid, cid)] == list(snapshot.feeds[(sid, cid)])
+
+        mirror = OracleMirror(oracle=None)
+        mirror.load(snapshot.records)
+        assert mirror.getGasPrice(sid, cid) == snapshot.gas_price(sid, cid)
+        assert mirror.misses == 0
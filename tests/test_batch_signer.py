@@ -0,0 +1,42 @@
+import random
+
+from eth_account import Account
+from eth_hash.auto import keccak
+from eth_keys import keys
+
+from scripts import batch_signer
+from scripts import payload_codec as codec
+
+PRIVATE_KEY = bytes(range(1, 33))
+
+def raw_payloads(n, seed=0):
+    rng = random.Random(seed)
+    return [bytes(codec.encode_payload(ts=rng.randrange(2**48), sid=2, cid=rng.randrange(2**64),
+                                       height=rng.randrange(2**64),
+                                       typ_values={107: rng.randrange(2**240), 322: rng.randrange(2**240)}))
+            for _ in range(n)]
+
+class TestBatchSigner:
+    def test_matches_one_at_a_time(self):
+        payloads = raw_payloads(200)
+        signed = batch_signer.sign_payloads(payloads, PRIVATE_KEY, processes=2, chunksize=16)
+
+        account = Account.from_key(PRIVATE_KEY)
+        for data, s in zip(payloads, signed):
+            sig = account.unsafe_sign_hash(keccak(data))
+            assert s == data + sig.r.to_bytes(32, 'big') + sig.s.to_bytes(32, 'big') + bytes([sig.v])
+
+        assert batch_signer.sign_payload(payloads[0], '0x' + PRIVATE_KEY.hex()) == signed[0]
+
+    def test_frame(self):
+        payloads = raw_payloads(20, seed=1)
+        framed = batch_signer.frame(batch_signer.sign_payloads(payloads, PRIVATE_KEY, processes=1))
+
+        signer = keys.PrivateKey(PRIVATE_KEY).public_key
+        decoded = codec.decode_payloads(framed)
+        assert len(decoded) == len(payloads)
+        for data, d in zip(payloads, decoded):
+            r, s, v = d.signature[:32], d.signature[32:64], d.signature[64]
+            assert v in (27, 28)
+            signature = keys.Signature(vrs=(v - 27, int.from_bytes(r, 'big'), int.from_bytes(s, 'big')))
+            assert signature.recover_public_key_from_msg_hash(keccak(data)) == signer
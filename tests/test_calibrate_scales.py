@@ -0,0 +1,74 @@
+import random
+
+import numpy as np
+import pytest
+
+from scripts import calibrate_scales as cs
+
+DAY_MS = cs.DAY_MS
+INTERVAL = 1_800_000
+
+def history(rng, days, keys, every=12_000):
+    # a record every 12s per chain, with a random walk gas price
+    gas_prices = {k: 10**9 for k in keys}
+    for i, ts in enumerate(range(0, days * DAY_MS, every)):
+        for k in keys:
+            gas_prices[k] = max(gas_prices[k] + rng.randint(-10**6, 10**6), 1)
+            yield (*k, i + 1, ts, gas_prices[k], 0)
+
+def exact_changes(records, key, start=0):
+    last = {}
+    for sid, cid, _, ts, bf, tip in records:
+        if (sid, cid) == key:
+            last[ts // INTERVAL] = bf + tip
+    slots = sorted(last)
+    return [abs(last[b] - last[a]) for a, b in zip(slots, slots[1:]) if b * INTERVAL >= start]
+
+class TestCalibrateScales:
+    def test_sketch_quantiles(self):
+        rng = np.random.default_rng(0)
+        values = rng.lognormal(20, 2, 100_000)
+        sketch = cs.QuantileSketch(0.01)
+        sketch.add(np.r_[values[:50_000], np.zeros(1000)])
+        other = cs.QuantileSketch(0.01)
+        other.add(values[50_000:])
+        sketch.merge(other)
+
+        exact = np.sort(np.r_[values, np.zeros(1000)])
+        for q in (0.001, 0.1, 0.5, 0.9, 0.99):
+            expected = exact[int(q * (len(exact) - 1))]
+            assert sketch.quantile(q) == pytest.approx(expected, rel=0.01, abs=0)
+
+    def test_matches_exact_median(self):
+        keys = [(2, 1), (2, 10)]
+        records = list(history(random.Random(0), 3, keys))
+        scales = cs.calibrate(records, interval=INTERVAL)
+        for key in keys:
+            assert scales[key] == pytest.approx(np.median(exact_changes(records, key)), rel=0.02)
+
+    def test_chunks_dont_change_scales(self):
+        records = list(history(random.Random(1), 2, [(2, 1), (2, 10)]))
+        whole = cs.calibrate(records, interval=INTERVAL)
+        for chunk_size in (1, 999, 10_000):
+            assert cs.calibrate(records, chunk_size=chunk_size, interval=INTERVAL) == whole
+
+    def test_chain_window(self):
+        rng = random.Random(2)
+        records = list(history(rng, 4, [(2, 1), (2, 10)]))
+        # the last 4 days are much calmer on both chains
+        gp = 10**9
+        for i, ts in enumerate(range(4 * DAY_MS, 8 * DAY_MS, 12_000)):
+            gp += rng.randint(-10**3, 10**3)
+            records += [(2, 1, 10**6 + i, ts, gp, 0), (2, 10, 10**6 + i, ts, gp, 0)]
+
+        scales = cs.calibrate(records, interval=INTERVAL, window_days=8, windows={(2, 10): 2})
+        assert scales[(2, 1)] > 10**4
+        assert scales[(2, 10)] == pytest.approx(np.median(exact_changes(records, (2, 10), start=6 * DAY_MS)),
+                                                rel=0.02)
+
+    def test_format_scales(self):
+        block = cs.format_scales({(2, 42161): 359179550584, (2, 10): 6889789, (3, 5): 7})
+        assert block == "scales = {(2, 42161): 359179550584, # arb\n (2, 10): 6889789, # op\n (3, 5): 7}"
+        scope = {}
+        exec(block, scope)
+        assert scope['scales'][(3, 5)] == 7
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+from web3 import EthereumTesterProvider, Web3
+
+import params
+from scripts.compact_logs import pack_update, unpack_update, decode_oracles_updated, decode_oracles_updated_data
+from eth_abi import encode
+from test_controller_model import ORACLE
+from utils import deploy_vyper
+
+UPDATER = '0x' + '11' * 20
+
+def random_update(rng):
+    return {"system_id": rng.randint(0, 2**8-1),
+            "chain_id": rng.randint(0, 2**64-1),
+            "new_value": rng.randint(0, 2**240-1),
+            "raw_deviation": rng.randint(0, 2**240-1),
+            "time_since": rng.randint(0, 2**48-1),
+            "time_reward": rng.randint(0, 2**128-1),
+            "deviation_reward": rng.randint(0, 2**128-1),
+            "reward_mult": rng.randint(-2**127, 2**127-1)}
+
+class TestCompactLogs:
+    def test_round_trip(self):
+        rng = random.Random(0)
+        for _ in range(1000):
+            u = random_update(rng)
+            rec = unpack_update(UPDATER, pack_update(**u))
+            assert rec._asdict() == {"updater": UPDATER, **u}
+
+    def test_decode_data(self):
+        rng = random.Random(1)
+        updates = [random_update(rng) for _ in range(32)]
+        data = encode(['address', 'uint256[4][]'], [UPDATER, [pack_update(**u) for u in updates]])
+
+        records = decode_oracles_updated_data(data)
+        assert len(records) == 32
+        for r, u in zip(records, updates):
+            assert r._asdict() == {"updater": UPDATER, **u}
+
+    def test_decode_empty(self):
+        assert decode_oracles_updated(UPDATER, []) == []
+
+    @pytest.mark.parametrize("max_deviation_reward", [2**128 - 1, 2**128])
+    def test_rewards_past_128_bits(self, max_deviation_reward):
+        # a deviation past the max deviation reward, during the warmup's 1e18 reward_mult, pays
+        # exactly max_deviation_reward: packed up to 2**128-1, its own OracleUpdated past it
+        w3 = Web3(EthereumTesterProvider())
+        w3.eth.default_account = w3.eth.accounts[0]
+        oracle = deploy_vyper(w3, ORACLE)
+        coeff = [params.coeff[0], 2**94, params.coeff[2], 0]
+        with open('contracts/RewardController.vy') as f:
+            controller = deploy_vyper(w3, f.read(), params.kp, params.ki, params.co_bias, params.output_upper_bound,
+                                      params.output_lower_bound, params.target_time_since, params.tip_reward_type,
+                                      params.min_reward, 2 * max_deviation_reward, params.default_window_size,
+                                      oracle.address, coeff, params.min_fee)
+        controller.functions.enable_rewards().transact()
+        controller.functions.enable_compact_logs().transact()
+        controller.functions.set_scales([(2, 1, 10**9), (2, 2, 1)]).transact()
+
+        receipts = []
+        for cid, old, new in ((1, 10**9, 2 * 10**9), (2, 1, 2**40)):
+            receipts.append((2, cid, 107, 1, 1_000_000, old, 2, 1_600_000, new))
+            receipts.append((2, cid, 322, 1, 1_000_000, 0, 2, 1_600_000, 0))
+        oracle.functions.set_receipts(receipts).transact()
+
+        rewards = controller.functions.update_many(b'').call()
+        assert rewards[1][5] == max_deviation_reward
+        receipt = w3.eth.get_transaction_receipt(controller.functions.update_many(b'').transact())
+        packed = controller.events.OraclesUpdated().process_receipt(receipt)
+        single = controller.events.OracleUpdated().process_receipt(receipt)
+
+        records = decode_oracles_updated(packed[0].args.updater, packed[0].args.updates)
+        if max_deviation_reward < 2**128:
+            assert [(r.chain_id, r.deviation_reward) for r in records] == [(1, rewards[0][5]), (2, rewards[1][5])]
+            assert single == ()
+        else:
+            assert [(r.chain_id, r.deviation_reward) for r in records] == [(1, rewards[0][5])]
+            assert [(e.args.chain_id, e.args.deviation_reward) for e in single] == [(2, 2**128)]
+        assert controller.functions.rewards(w3.eth.default_account).call() == sum(r[4] + r[5] for r in rewards)
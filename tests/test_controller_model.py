@@ -0,0 +1,220 @@
+import random
+import pytest
+from web3 import EthereumTesterProvider, Web3
+
+import params
+from scripts import controller_model as cm
+from utils import deploy_vyper
+
+CFG = cm.ControllerConfig.from_params(params)
+N_FEEDS = 2000
+
+# returns the per element receipts it was given, basefee then tip of each chain
+ORACLE = """
+struct RecordReceipt:
+    systemid: uint8
+    cid: uint64
+    typ: uint16
+    old_height: uint64
+    old_timestamp: uint48
+    old_value: uint240
+    new_height: uint64
+    new_timestamp: uint48
+    new_value: uint240
+
+receipts: DynArray[RecordReceipt, 32]
+
+@external
+def set_receipts(receipts: DynArray[RecordReceipt, 32]):
+    self.receipts = receipts
+
+@external
+@payable
+def storeValuesWithReceipt(dat: Bytes[16384]) -> DynArray[RecordReceipt, 32]:
+    return self.receipts
+"""
+
+def random_updates(rng, n):
+    old_gp = [rng.randint(10**6, 10**11) for _ in range(n)]
+    new_gp = [rng.randint(10**6, 10**11) for _ in range(n)]
+    old_ts = [rng.randint(0, 10**12) for _ in range(n)]
+    new_ts = [ts + rng.randint(1000, 4_000_000) for ts in old_ts]
+    return old_gp, new_gp, old_ts, new_ts
+
+class TestControllerModel:
+    def test_config_from_params(self):
+        assert CFG.min_time_reward == params.min_reward//2
+        assert CFG.max_deviation_reward == params.max_reward//2
+        assert CFG._replace(kp=0).kp == 0
+        assert cm.ControllerConfig.from_params(params, kp=0) == CFG._replace(kp=0)
+
+    def test_signed_division_rounds_to_zero(self):
+        assert cm.error(3, 4) == -333333333333333333
+        assert cm.error(3, 2) == 333333333333333333
+        assert list(cm.error(3, cm.as_array([4, 2]))) == [-333333333333333333, 333333333333333333]
+
+    def test_rewards_bounds(self):
+        assert cm.calc_time_reward(0, CFG) == CFG.min_time_reward
+        assert cm.calc_time_reward(10**30, CFG) == CFG.max_time_reward
+        assert cm.calc_deviation_reward(0, CFG) == CFG.min_deviation_reward
+        assert cm.calc_deviation_reward(10**30, CFG) == CFG.max_deviation_reward
+
+    def test_warmup(self):
+        state = cm.FeedState.from_scales([10**9])
+        for i in range(CFG.min_window_size - 1):
+            reward_mult, state = cm.calc_reward_mult(state, 600 * 10**18, CFG)
+            assert reward_mult[0] == 10**18
+            assert state.error_integral[0] == 0
+
+        reward_mult, state = cm.calc_reward_mult(state, 600 * 10**18, CFG)
+        assert reward_mult[0] == state.last_output[0] != 10**18
+        assert state.count[0] == CFG.min_window_size
+
+    def test_vectorized_matches_scalar(self):
+        rng = random.Random(0)
+        scales = [rng.randint(10**6, 10**12) for _ in range(N_FEEDS)]
+        state = cm.FeedState.from_scales(scales)
+        singles = [cm.FeedState.from_scales([s]) for s in scales]
+
+        for _ in range(CFG.min_window_size + 3):
+            old_gp, new_gp, old_ts, new_ts = random_updates(rng, N_FEEDS)
+            update = cm.update_feeds(state, cm.as_array(old_gp), cm.as_array(new_gp),
+                                     cm.as_array(old_ts), cm.as_array(new_ts), CFG)
+
+            # feeds one at a time, for a sample of them
+            for i in range(0, N_FEEDS, 97):
+                single = cm.update_feeds(singles[i], old_gp[i], new_gp[i], old_ts[i], new_ts[i], CFG)
+                assert tuple(x[0] for x in single) == tuple(x[i] for x in update)
+                assert singles[i].error_integral[0] == state.error_integral[i]
+                assert singles[i].interval_ema[0] == state.interval_ema[i]
+
+    def test_subset_update(self):
+        state = cm.FeedState.from_scales([10**9] * 4)
+        idx = [1, 3]
+        sub = state[idx]
+        cm.update_feeds(sub, cm.as_array([10**9, 10**9]), cm.as_array([2*10**9, 2*10**9]),
+                        cm.as_array([0, 0]), cm.as_array([600_000, 600_000]), CFG)
+        state[idx] = sub
+
+        assert list(state.count) == [0, 1, 0, 1]
+
+    def test_reverts(self):
+        state = cm.FeedState.from_scales([0])
+        with pytest.raises(cm.ControllerRevert, match="unknown scid"):
+            cm.update_feeds(state, 1, 2, 0, 1000, CFG)
+
+        state = cm.FeedState.from_scales([10**9])
+        with pytest.raises(cm.ControllerRevert):
+            cm.update_feeds(state, 1, 2, 1000, 0, CFG)
+
+    def test_update_feed_matches_update_feeds(self):
+        rng = random.Random(1)
+        scales = [rng.randint(10**6, 10**12) for _ in range(50)]
+        state = cm.FeedState.from_scales(scales)
+        feeds = [[0, 0, 0, 0, s] for s in scales]
+
+        for _ in range(CFG.min_window_size + 3):
+            old_gp, new_gp, old_ts, new_ts = random_updates(rng, len(scales))
+            update = cm.update_feeds(state, cm.as_array(old_gp), cm.as_array(new_gp),
+                                     cm.as_array(old_ts), cm.as_array(new_ts), CFG)
+            for i, feed in enumerate(feeds):
+                single = cm.update_feed(feed, old_gp[i], new_gp[i], old_ts[i], new_ts[i], CFG)
+                assert tuple(single) == tuple(x[i] for x in update)
+                assert feed == [getattr(state, f)[i] for f in cm.FeedState.FIELDS]
+
+    def test_update_feed_matches_update_feeds_saturated(self):
+        # narrow output bounds, intervals far off target and large deviations, so the PI output
+        # clamps at both bounds, the integral stops winding up and the rewards clamp
+        cfg = CFG._replace(min_window_size=2, output_upper_bound=2 * 10**18, output_lower_bound=5 * 10**17)
+        rng = random.Random(3)
+        scales = [rng.randint(10**3, 10**6) for _ in range(40)]
+        state = cm.FeedState.from_scales(scales)
+        feeds = [[0, 0, 0, 0, s] for s in scales]
+
+        ts = [0] * len(scales)
+        reward_mults = set()
+        for step in range(30):
+            # fast updates, then slow ones
+            gap = 1_000 if step < 15 else 20_000_000
+            new_ts = [t + rng.randint(gap, 2 * gap) for t in ts]
+            old_gp = [rng.randint(1, 10**12) for _ in scales]
+            new_gp = [rng.randint(1, 10**12) for _ in scales]
+            update = cm.update_feeds(state, cm.as_array(old_gp), cm.as_array(new_gp),
+                                     cm.as_array(ts), cm.as_array(new_ts), cfg)
+            for i, feed in enumerate(feeds):
+                single = cm.update_feed(feed, old_gp[i], new_gp[i], ts[i], new_ts[i], cfg)
+                assert tuple(single) == tuple(x[i] for x in update)
+                assert feed == [getattr(state, f)[i] for f in cm.FeedState.FIELDS]
+            reward_mults.update(update.reward_mult)
+            ts = new_ts
+
+        assert {cfg.output_lower_bound, cfg.output_upper_bound} <= reward_mults
+
+    def test_update_feed_revert_keeps_state(self):
+        feed = [0, 0, 0, 0, 10**9]
+        with pytest.raises(cm.ControllerRevert, match="timestamp underflow"):
+            cm.update_feed(feed, 1, 2, 1000, 0, CFG)
+        with pytest.raises(cm.ControllerRevert, match="negative reward"):
+            cm.update_feed(feed, 1, 2, 0, 1000, CFG._replace(min_time_reward=-1, coeff=(-10**18, 0, 0, 0)))
+        assert feed == [0, 0, 0, 0, 10**9]
+
+    def test_matches_the_contract(self):
+        # random updates through the compiled RewardController and the model
+        w3 = Web3(EthereumTesterProvider())
+        w3.eth.default_account = w3.eth.accounts[0]
+        oracle = deploy_vyper(w3, ORACLE)
+        with open('contracts/RewardController.vy') as f:
+            controller = deploy_vyper(w3, f.read(), params.kp, params.ki, params.co_bias, params.output_upper_bound,
+                                      params.output_lower_bound, params.target_time_since, params.tip_reward_type,
+                                      params.min_reward, params.max_reward, params.default_window_size,
+                                      oracle.address, params.coeff, params.min_fee)
+        controller.functions.enable_rewards().transact()
+
+        rng = random.Random(2)
+        n = 16
+        chains = [(2, i + 1) for i in range(n)]
+        scales = [rng.randint(10**8, 10**12) for _ in chains]
+        controller.functions.set_scales([(sid, cid, s) for (sid, cid), s in zip(chains, scales)]).transact()
+        state = cm.FeedState.from_scales(scales)
+        feeds = [[0, 0, 0, 0, s] for s in scales]
+
+        gas_price = [rng.randint(10**6, 10**11) for _ in chains]
+        ts = [rng.randint(0, 10**12) for _ in chains]
+        total = 0
+        for height in range(1, CFG.min_window_size + 6):
+            new_gas_price = [rng.randint(10**6, 10**11) for _ in chains]
+            new_ts = [t + rng.randint(1000, 4_000_000) for t in ts]
+
+            receipts = []
+            for (sid, cid), old, new, old_ts, t in zip(chains, gas_price, new_gas_price, ts, new_ts):
+                old_tip, new_tip = rng.randint(0, old), rng.randint(0, new)
+                receipts.append((sid, cid, 107, height - 1, old_ts, old - old_tip, height, t, new - new_tip))
+                receipts.append((sid, cid, 322, height - 1, old_ts, old_tip, height, t, new_tip))
+            oracle.functions.set_receipts(receipts).transact()
+
+            expected = cm.update_feeds(state, cm.as_array(gas_price), cm.as_array(new_gas_price),
+                                       cm.as_array(ts), cm.as_array(new_ts), CFG)
+            singles = [cm.update_feed(feed, *args, CFG) for feed, *args in zip(feeds, gas_price, new_gas_price, ts, new_ts)]
+            assert singles == [tuple(int(x[i]) for x in expected) for i in range(n)]
+            rewards = controller.functions.update_many(b'').call()
+            receipt = w3.eth.get_transaction_receipt(controller.functions.update_many(b'').transact())
+            events = controller.events.OracleUpdated().process_receipt(receipt)
+
+            assert [(e.args.chain_id, e.args.raw_deviation, e.args.time_since, e.args.time_reward,
+                     e.args.deviation_reward, e.args.reward_mult) for e in events] == \
+                   [(cid, *(int(x[i]) for x in expected)) for i, (_, cid) in enumerate(chains)]
+            assert [(r[4], r[5]) for r in rewards] == \
+                   [(int(t), int(d)) for t, d in zip(expected.time_reward, expected.deviation_reward)]
+            for i, (sid, cid) in enumerate(chains):
+                scid = cid << 8 | sid
+                assert controller.functions.error_integral(scid).call() == state.error_integral[i]
+                assert controller.functions.last_output(scid).call() == state.last_output[i]
+                assert controller.functions.interval_ema(scid).call() == state.interval_ema[i]
+                assert controller.functions.count(scid).call() == state.count[i] == height
+
+            total += int(sum(expected.time_reward) + sum(expected.deviation_reward))
+            assert controller.functions.rewards(w3.eth.default_account).call() == total
+            gas_price, ts = new_gas_price, new_ts
+
+        # past the warmup the multipliers come from the PI controller
+        assert len(set(state.last_output)) > 1
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+
+from scripts import event_indexer
+from scripts.event_archive import Archive, ArchiveWriter, export_index, to_float, to_int
+
+UPDATER = '0x' + 'ab' * 20
+
+def row(block, cid, i, sid=2):
+    return {'block_number': block, 'log_index': i, 'updater': UPDATER, 'system_id': sid, 'chain_id': cid,
+            'new_value': 10**9 * (i + 1), 'raw_deviation': 2**100 + i, 'time_since': 60_000 + i,
+            'time_reward': 10**20 + i, 'deviation_reward': 10**18 * i, 'reward_mult': -10**17 * i}
+
+def index_row(r, entry=0, tx='0x' + '00' * 32):
+    return (r['block_number'], r['log_index'], entry, tx, r['updater'], r['system_id'], r['chain_id'],
+            str(r['new_value']), str(r['raw_deviation']), r['time_since'], str(r['time_reward']),
+            str(r['deviation_reward']), str(r['reward_mult']))
+
+class TestEventArchive:
+    def test_write_and_slice(self, tmp_path):
+        path = str(tmp_path / 'archive')
+        with ArchiveWriter(path) as writer:
+            for i in range(100):
+                writer.append(row(1_000 + 10 * i, 1 + i % 2, i))
+
+        archive = Archive(path)
+        assert archive.feeds() == [(2, 1), (2, 2)]
+        assert archive.rows(2, 1) == 50
+
+        blocks = archive.column(2, 1, 'block_number')
+        assert isinstance(blocks, np.memmap)
+        assert list(blocks[:3]) == [1_000, 1_020, 1_040]
+
+        s = archive.slice(2, 1, start_block=1_100, end_block=1_200)
+        assert list(s['block_number']) == [1_100, 1_120, 1_140, 1_160, 1_180]
+        assert list(s['log_index']) == [10, 12, 14, 16, 18]
+        assert s['updater'][0] == bytes.fromhex(UPDATER[2:])
+        assert list(s['chain_id']) == [1] * 5
+        assert to_int(s['raw_deviation']) == [2**100 + i for i in (10, 12, 14, 16, 18)]
+        assert to_int(s['reward_mult'], signed=True) == [-10**17 * i for i in (10, 12, 14, 16, 18)]
+        assert to_float(s['reward_mult'], signed=True)[0] == pytest.approx(-10**18)
+        assert to_float(s['time_reward'])[0] == pytest.approx(10**20)
+
+        assert archive.slice(2, 1, start_block=5_000)['block_number'].size == 0
+        assert archive.slice(2, 8453)['time_reward'].shape == (0, 2)
+
+        emission = archive.emission()
+        assert emission[(2, 1)] == pytest.approx(sum(10**20 + i + 10**18 * i for i in range(0, 100, 2)))
+
+    def test_append_and_validation(self, tmp_path):
+        path = str(tmp_path / 'archive')
+        with ArchiveWriter(path, buffer_rows=3) as writer:
+            for i in range(10):
+                writer.append(row(100 + i, 1, i))
+        with ArchiveWriter(path) as writer:
+            writer.append(row(110, 1, 10))
+            with pytest.raises(ValueError):
+                writer.append(row(100, 1, 11))
+            with pytest.raises(ValueError):
+                writer.append({**row(111, 1, 12), 'time_reward': 2**128})
+        assert list(Archive(path).column(2, 1, 'block_number')) == list(range(100, 111))
+
+    def test_interrupted_flush(self, tmp_path):
+        path = str(tmp_path / 'archive')
+        with ArchiveWriter(path) as writer:
+            writer.append(row(100, 1, 0))
+
+        # column bytes written without meta.json, as by a flush that didn't finish
+        with open(os.path.join(path, '2_1', 'block_number'), 'ab') as f:
+            f.write(b'\xff' * 8)
+        os.makedirs(os.path.join(path, '2_5'))
+        with open(os.path.join(path, '2_5', 'block_number'), 'wb') as f:
+            f.write(b'\xff' * 8)
+        assert Archive(path).rows(2, 1) == 1
+
+        with ArchiveWriter(path) as writer:
+            writer.append(row(101, 1, 1))
+            writer.append(row(101, 5, 2))
+        archive = Archive(path)
+        assert list(archive.column(2, 1, 'block_number')) == [100, 101]
+        assert list(archive.column(2, 5, 'block_number')) == [101]
+
+    def test_export_index(self, tmp_path):
+        db = event_indexer.connect(':memory:')
+        rows = [row(100 + i // 3, 1 + i % 3, i) for i in range(30)]
+        with db:
+            db.executemany(event_indexer.INSERT_ORACLE_UPDATED, [index_row(r) for r in rows[:20]])
+
+        path = str(tmp_path / 'archive')
+        assert export_index(db, path) == 20
+        assert export_index(db, path) == 0
+        with db:
+            db.executemany(event_indexer.INSERT_ORACLE_UPDATED, [index_row(r) for r in rows[20:]])
+        assert export_index(db, path) == 10
+
+        archive = Archive(path)
+        assert sum(archive.rows(*feed) for feed in archive.feeds()) == 30
+        s = archive.slice(2, 3)
+        assert list(s['log_index']) == list(range(2, 30, 3))
+        assert to_int(s['time_reward']) == [10**20 + i for i in range(2, 30, 3)]
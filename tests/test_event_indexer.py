@@ -0,0 +1,152 @@
+import pytest
+import vyper
+from eth_utils import event_abi_to_log_topic
+from web3 import EthereumTesterProvider, HTTPProvider, Web3
+
+from rpc import RPCServer
+from scripts import event_indexer
+from scripts.compact_logs import pack_update
+from scripts.event_indexer import Indexer
+from utils import deploy_vyper
+
+# emits the RewardController's events as given
+EMITTER = """
+event OracleUpdated:
+    updater: address
+    system_id: uint8
+    chain_id: uint64
+    new_value: uint240
+    raw_deviation: uint240
+    time_since: uint48
+    time_reward: uint256
+    deviation_reward: uint256
+    reward_mult: int256
+
+event OraclesUpdated:
+    updater: address
+    updates: DynArray[uint256[4], 32]
+
+event RewardsToggled:
+    rewards_on: bool
+
+event RewardsFreeze:
+    rewards_frozen: bool
+
+@external
+def oracle_updated(system_id: uint8, chain_id: uint64, new_value: uint240, raw_deviation: uint240, time_since: uint48,
+                   time_reward: uint256, deviation_reward: uint256, reward_mult: int256):
+    log OracleUpdated(updater=msg.sender, system_id=system_id, chain_id=chain_id, new_value=new_value,
+                      raw_deviation=raw_deviation, time_since=time_since, time_reward=time_reward,
+                      deviation_reward=deviation_reward, reward_mult=reward_mult)
+
+@external
+def oracles_updated(updates: DynArray[uint256[4], 32]):
+    log OraclesUpdated(updater=msg.sender, updates=updates)
+
+@external
+def toggle(rewards_on: bool):
+    log RewardsToggled(rewards_on=rewards_on)
+
+@external
+def freeze(frozen: bool):
+    log RewardsFreeze(rewards_frozen=frozen)
+"""
+
+def update(i):
+    return (2, i, 10**9 * i, 2**239 + i, 60_000 + i, 10**25 + i, 3 * 10**24, -10**17 * i)
+
+@pytest.fixture(scope='module')
+def chain():
+    w3 = Web3(EthereumTesterProvider())
+    w3.eth.default_account = w3.eth.accounts[0]
+    emitter = deploy_vyper(w3, EMITTER)
+    f = emitter.functions
+    f.toggle(True).transact()
+    for i in range(1, 6):
+        f.oracle_updated(*update(i)).transact()
+    f.freeze(True).transact()
+    f.oracles_updated([pack_update(*update(i)) for i in range(6, 9)]).transact()
+    f.freeze(False).transact()
+    for i in range(9, 30):
+        f.oracle_updated(*update(i)).transact()
+    server = RPCServer(w3).start()
+    yield w3, emitter, server
+    server.stop()
+
+def indexer(chain, db, **kw):
+    w3, emitter, server = chain
+    return Indexer(Web3(HTTPProvider(server.url)), emitter.address, db, confirmations=0, **kw)
+
+def oracle_updated(db):
+    return [(sid, cid, int(value), int(deviation), int(mult)) for sid, cid, value, deviation, mult in db.execute(
+        "SELECT system_id, chain_id, new_value, raw_deviation, reward_mult FROM oracle_updated "
+        "ORDER BY block_number, log_index, entry")]
+
+class TestEventIndexer:
+    def test_topics_match_the_controller(self):
+        with open('contracts/RewardController.vy') as f:
+            abi = vyper.compile_code(f.read(), output_formats=['abi'])['abi']
+        topics = {e['name']: '0x' + event_abi_to_log_topic(e).hex() for e in abi if e['type'] == 'event'}
+        assert event_indexer.ORACLE_UPDATED == topics['OracleUpdated']
+        assert event_indexer.ORACLES_UPDATED == topics['OraclesUpdated']
+        assert event_indexer.REWARDS_TOGGLED == topics['RewardsToggled']
+        assert event_indexer.REWARDS_FREEZE == topics['RewardsFreeze']
+
+    def test_sync(self, chain, tmp_path):
+        w3, emitter, _ = chain
+        ix = indexer(chain, str(tmp_path / 'events.db'))
+        assert ix.sync() == 32
+        assert ix.checkpoint == w3.eth.block_number
+
+        db = ix.db
+        expected = [update(i) for i in range(1, 30)]
+        assert oracle_updated(db) == [(u[0], u[1], u[2], u[3], u[7]) for u in expected]
+        row = db.execute("SELECT updater, time_since, time_reward, deviation_reward FROM oracle_updated "
+                         "WHERE chain_id = 7").fetchone()
+        assert row == (w3.eth.default_account, 60_007, str(10**25 + 7), str(3 * 10**24))
+        assert db.execute("SELECT entry FROM oracle_updated WHERE chain_id IN (6, 7, 8)").fetchall() == [(0,), (1,), (2,)]
+        assert db.execute("SELECT rewards_on FROM rewards_toggled").fetchall() == [(1,)]
+        assert db.execute("SELECT rewards_frozen FROM rewards_freeze ORDER BY block_number").fetchall() == [(1,), (0,)]
+
+    def test_resumes_from_checkpoint(self, chain, tmp_path):
+        w3, emitter, server = chain
+        path = str(tmp_path / 'events.db')
+        ix = indexer(chain, path)
+        ix.sync(to_block=10)
+        assert ix.checkpoint == 10
+        ix.db.close()
+
+        # a new indexer on the same database continues after block 10
+        ix = indexer(chain, path)
+        assert ix.checkpoint == 10
+        ix.sync()
+        assert len(oracle_updated(ix.db)) == 29
+        assert ix.checkpoint == w3.eth.block_number
+
+        emitter.functions.oracle_updated(*update(30)).transact()
+        assert ix.sync() == 1
+        assert oracle_updated(ix.db)[-1][1] == 30
+
+    def test_adaptive_ranges(self, chain):
+        w3, _, server = chain
+        ix = indexer(chain, ':memory:', chunk_size=1, target_logs=100)
+
+        calls = []
+        get_logs = ix.get_logs
+        def capped_get_logs(start, end):
+            # a node refusing ranges over 8 blocks
+            calls.append((start, end))
+            if end - start + 1 > 8:
+                raise event_indexer.RPCError({'code': -32005, 'message': 'query returned more than 10000 results'})
+            return get_logs(start, end)
+        ix.get_logs = capped_get_logs
+
+        ix.sync()
+        full = indexer(chain, ':memory:')
+        full.sync()
+        assert oracle_updated(ix.db) == oracle_updated(full.db)
+        assert ix.stats['retries'] > 0
+        assert max(end - start + 1 for start, end in calls) > 8
+        # ranges grew from 1 block, and no range was skipped
+        covered = [block for start, end in calls if end - start + 1 <= 8 for block in range(start, end + 1)]
+        assert sorted(covered) == list(range(0, w3.eth.block_number + 1))
@@ -0,0 +1,55 @@
+from fractions import Fraction
+
+import params
+from scripts import controller_model as cm
+from scripts import fit_coeff
+
+COEFF = fit_coeff.fit_coeff(params)
+CFG = cm.ControllerConfig.from_params(params, coeff=tuple(COEFF))
+
+class TestFitCoeff:
+    def test_ends_are_exact(self):
+        assert cm.calc_time_reward(params.min_ts, CFG) == params.min_reward//2
+        assert cm.calc_time_reward(params.max_ts, CFG) == params.max_reward//2
+        assert cm.calc_deviation_reward(params.min_deviation, CFG) == params.min_reward//2
+        assert cm.calc_deviation_reward(params.max_deviation, CFG) == params.max_reward//2
+
+        # one ms short of max_ts doesn't saturate
+        time_since = (params.max_ts//10**18 * 1000 - 1) * 10**18 // 1000
+        assert cm.calc_time_reward(time_since, CFG) < params.max_reward//2
+
+    def test_solve(self):
+        linear, square = fit_coeff.solve(params.min_ts, params.max_ts, 2, 10)
+        assert linear * 1 + square * 1 == 2
+        x = params.max_ts // 10**18
+        assert linear * x + square * x * x == 10
+
+    def test_check_coeff(self):
+        time_fit, deviation_fit = fit_coeff.check_coeff(COEFF, params, n=2000)
+        for fit in (time_fit, deviation_fit):
+            assert fit.low_error == fit.high_error == 0
+            assert fit.monotonic
+            assert fit.max_error < 1e-12
+        assert time_fit.saturates_at == params.max_ts
+        assert deviation_fit.saturates_at == params.max_deviation
+
+        # the deployed coefficients fall short of the max time reward at max_ts
+        time_fit, _ = fit_coeff.check_coeff(list(params.coeff), params, n=2000)
+        assert time_fit.high_error < 0
+        assert time_fit.saturates_at > params.max_ts
+
+    def test_max_error_is_exact(self):
+        # against the exact quadratic in Fractions, grid point by grid point
+        r_low, r_high = params.min_reward//2, params.max_reward//2
+        grid = fit_coeff.time_grid(params.max_ts, 500)
+        fit = fit_coeff.check_fit(*params.coeff[::2], params.min_ts, params.max_ts, r_low, r_high, grid)
+
+        linear, square = fit_coeff.solve(params.min_ts, params.max_ts, r_low, r_high)
+        errors = []
+        for x in grid:
+            if params.min_ts <= x <= params.max_ts:
+                reward = max(min(fit_coeff.quadratic(*params.coeff[::2], int(x)), r_high), r_low)
+                xs = Fraction(int(x), 10**18)
+                exact = max(min(linear * xs + square * xs * xs, r_high), r_low)
+                errors.append(abs(reward - exact) / exact)
+        assert fit.max_error == float(max(errors))
@@ -0,0 +1,190 @@
+import time
+import random
+import pytest
+from web3 import Web3
+
+from fixture import owner, oracle, controller
+from scripts import params
+from scripts.payload_assembler import GasModel
+import utils
+
+web3 = Web3()
+
+DELIMITER = b'0000000000000000000000000000000'
+
+# feeds per update_many call
+FEED_COUNTS = [1, 2, 4, 8, 16]
+
+# up to MAX_PAYLOADS=32 feeds, past 16 with the oracle's combined gas price receipts,
+# per element receipts take one for the basefee and one for the tip of a feed
+NO_RETURN_FEED_COUNTS = [1, 8, 16, 32]
+
+def build_records(n, ts, height, sid=2, extra_types=0):
+    records = []
+    for i in range(n):
+        typ_values = utils.create_typ_values(random.randint(10**8, 10**11))
+        typ_values.update({1000 + j: random.randint(1, 10**18) for j in range(extra_types)})
+        records.append({
+            "plen": len(typ_values),
+            "ts": ts,
+            "sid": sid,
+            "cid": i+1,
+            "height": height,
+            "typ_values": typ_values
+            })
+
+    return records
+
+def build_payload(signer, n, ts, height, sid=2, records=None):
+    if records is None:
+        records = build_records(n, ts, height, sid)
+
+    payload = b''
+    for i, payload_params in enumerate(records):
+        if i != 0:
+            payload += DELIMITER
+
+        payload += utils.create_signed_payload(web3=web3, signer=signer, **payload_params)
+
+    return payload
+
+def update_gas(owner, controller, n, rounds=3, return_rewards=True):
+    """
+    gas used by update_many (update_many_no_return if not return_rewards) for n feeds,
+    after a first update has initialized oracle and controller storage for every feed
+    """
+    controller.set_scales([(2, i+1, 10**9) for i in range(n)], sender=owner)
+    controller.enable_rewards(sender=owner)
+    if n > 16:
+        controller.enable_gas_price_receipts(sender=owner)
+
+    ts = int(time.time() * 1000)
+    gas = []
+    for r in range(rounds):
+        payload = build_payload(owner, n, ts + r*60000, 100 + r)
+        update = controller.update_many if return_rewards else controller.update_many_no_return
+        tx = update(payload, sender=owner)
+        assert len(tx.events) == n
+        gas.append(tx.gas_used)
+
+    return gas[-1]
+
+class TestGas:
+    # ape test tests/test_gas.py -s  --network ethereum:local:foundry
+    @pytest.mark.parametrize("n", FEED_COUNTS)
+    def test_update_many_gas(self, owner, controller, n):
+        gas = update_gas(owner, controller, n)
+        print(f"update_many {n=}: {gas=} gas_per_feed={gas//n}")
+
+    def test_update_many_gas_per_feed(self, owner, oracle, controller, chain):
+        # updater rewards are written once per call, so the per feed cost
+        # should fall as more feeds are batched
+        gas_per_feed = []
+        for n in FEED_COUNTS:
+            snap = chain.snapshot()
+            gas_per_feed.append(update_gas(owner, controller, n) // n)
+            chain.restore(snap)
+
+        print(list(zip(FEED_COUNTS, gas_per_feed)))
+        assert gas_per_feed == sorted(gas_per_feed, reverse=True)
+
+    def test_gas_model(self, owner, oracle, controller, chain):
+        # (records, words, gas_used) of updates with few and many values per payload, through
+        # per value receipts (up to MAX_PAYLOADS values a call) and combined gas price receipts.
+        # the payload assembler's default GasModel must not underestimate any of them
+        samples = []
+        for gas_price_receipts in (False, True):
+            for extra_types in (0, 6, 24):
+                for n in FEED_COUNTS:
+                    if not gas_price_receipts and n * (2 + extra_types) > 32:
+                        continue
+                    snap = chain.snapshot()
+                    controller.set_scales([(2, i+1, 10**9) for i in range(n)], sender=owner)
+                    controller.enable_rewards(sender=owner)
+                    if gas_price_receipts:
+                        controller.enable_gas_price_receipts(sender=owner)
+                    ts = int(time.time() * 1000)
+                    for r in range(2):
+                        records = build_records(n, ts + r*60000, 100 + r, extra_types=extra_types)
+                        payload = build_payload(owner, n, 0, 0, records=records)
+                        tx = controller.update_many(payload, sender=owner)
+                    samples.append((n, len(payload) // 32, tx.gas_used))
+                    chain.restore(snap)
+
+        fitted = GasModel.fit(samples)
+        print(f"{fitted=}")
+        for records, words, gas in samples:
+            assert gas <= GasModel().estimate(records, words)
+
+    @pytest.mark.parametrize("n", NO_RETURN_FEED_COUNTS)
+    def test_update_many_no_return_gas(self, owner, oracle, controller, chain, n):
+        snap = chain.snapshot()
+        gas = update_gas(owner, controller, n)
+        chain.restore(snap)
+        gas_no_return = update_gas(owner, controller, n, return_rewards=False)
+
+        print(f"{n=}: update_many={gas} update_many_no_return={gas_no_return} saved={gas - gas_no_return}")
+        assert gas_no_return < gas
+
+    def test_update_many_no_return_result(self, owner, controller):
+        controller.set_scales([(2, 1, 10**9)], sender=owner)
+        payload = build_payload(owner, 1, int(time.time() * 1000), 100)
+
+        assert len(controller.update_many.call(payload)) == 1
+        # same update, no result
+        tx = controller.update_many_no_return(payload, sender=owner)
+        assert len(tx.events) == 1
+
+    def test_update_many_stale_gas(self, owner, oracle, controller):
+        # a payload that can't update any record skips signature recovery
+        n = 8
+        controller.set_scales([(2, i+1, 10**9) for i in range(n)], sender=owner)
+        payload = build_payload(owner, n, int(time.time() * 1000), 100)
+
+        tx = controller.update_many(payload, sender=owner)
+        assert len(tx.events) == n
+        mirror = utils.gas_price_mirror(oracle, [(2, i+1) for i in range(n)])
+        values = [utils.get_current_gasprice(oracle, 2, i+1, mirror) for i in range(n)]
+        assert values[0] == utils.get_current_gasprice(oracle, 2, 1)
+
+        tx_stale = controller.update_many(payload, sender=owner)
+        assert len(tx_stale.events) == 0
+        mirror.refresh(stale_only=False)
+        assert [utils.get_current_gasprice(oracle, 2, i+1, mirror) for i in range(n)] == values
+        assert mirror.misses == 0
+
+        print(f"{n=}: fresh={tx.gas_used} stale={tx_stale.gas_used} stale_per_feed={tx_stale.gas_used//n}")
+
+    def test_update_many_envelope_gas(self, owner, oracle, controller, chain):
+        # one signature for every chain stores the same records as a signature per chain
+        n = len(params.scales)
+        controller.set_scales([(2, i+1, 10**9) for i in range(n)], sender=owner)
+        controller.enable_rewards(sender=owner)
+        records = build_records(n, int(time.time() * 1000), 100)
+
+        snap = chain.snapshot()
+        tx = controller.update_many(build_payload(owner, n, 0, 0, records=records), sender=owner)
+        values = [utils.get_current_gasprice(oracle, 2, i+1) for i in range(n)]
+        chain.restore(snap)
+
+        envelope = utils.create_signed_envelope(web3=web3, signer=owner, records=records)
+        tx_envelope = controller.update_many(envelope, sender=owner)
+
+        assert len(tx_envelope.events) == len(tx.events) == n
+        assert [utils.get_current_gasprice(oracle, 2, i+1) for i in range(n)] == values
+        print(f"{n=}: per chain={tx.gas_used} envelope={tx_envelope.gas_used} saved={tx.gas_used - tx_envelope.gas_used}")
+        assert tx_envelope.gas_used < tx.gas_used
+
+    @pytest.mark.parametrize("n", [1, 7, 16])
+    def test_store_values_with_receipt_gas(self, owner, oracle, n):
+        # each record is one storage slot: per feed (basefee + tip) gas for the
+        # first write of a record and for the following updates
+        ts = int(time.time() * 1000)
+        gas = []
+        for r in range(3):
+            payload = build_payload(owner, n, ts + r*60000, 100 + r)
+            tx = oracle.storeValuesWithReceipt(payload, sender=owner)
+            gas.append(tx.gas_used)
+
+        print(f"storeValuesWithReceipt {n=}: first_per_feed={gas[0]//n} update_per_feed={gas[-1]//n}")
+        assert gas[-1] < gas[0]
@@ -0,0 +1,264 @@
+import asyncio
+import time
+
+from web3 import EthereumTesterProvider, HTTPProvider, Web3
+
+import params
+from rpc import RPCServer
+from scripts import batch_reads
+from scripts import batch_signer
+from scripts import controller_model as cm
+from scripts import payload_codec as codec
+from scripts.compact_logs import pack_update
+from scripts.keeper import Keeper, oracle_updates
+from scripts.oracle_mirror import OracleMirror, Record
+from utils import deploy_vyper
+from scripts.reward_filter import RewardFilter
+
+# emits the RewardController's update events as given
+EMITTER = """
+event OracleUpdated:
+    updater: address
+    system_id: uint8
+    chain_id: uint64
+    new_value: uint240
+    raw_deviation: uint240
+    time_since: uint48
+    time_reward: uint256
+    deviation_reward: uint256
+    reward_mult: int256
+
+event OraclesUpdated:
+    updater: address
+    updates: DynArray[uint256[4], 32]
+
+@external
+def oracle_updated(system_id: uint8, chain_id: uint64):
+    log OracleUpdated(updater=msg.sender, system_id=system_id, chain_id=chain_id, new_value=0,
+                      raw_deviation=0, time_since=0, time_reward=0, deviation_reward=0, reward_mult=0)
+
+@external
+def oracles_updated(updates: DynArray[uint256[4], 32]):
+    log OraclesUpdated(updater=msg.sender, updates=updates)
+"""
+
+PRIVATE_KEY = bytes(range(1, 33))
+CHAINS = list(params.scales)
+LATENCY = 0.05
+
+def new_filter():
+    f = RewardFilter(cm.ControllerConfig.from_params(params))
+    for (sid, cid), scale in params.scales.items():
+        f.set_feed(sid, cid, 0, 0, 0, 0, scale)
+    return f
+
+class Gasnet:
+    """ serves a new signed payload per chain every `every` fetches, after LATENCY """
+    def __init__(self, every=1):
+        self.every = every
+        self.fetches = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch(self, sid, cid):
+        self.fetches += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(LATENCY)
+        self.in_flight -= 1
+        height = self.fetches // (len(CHAINS) * self.every) + 1
+        raw = codec.encode_payload(ts=height * 60_000, sid=sid, cid=cid, height=height,
+                                   typ_values={107: 10**9 * height, 322: 10**8})
+        return batch_signer.sign_payload(raw, PRIVATE_KEY)
+
+class Submitter:
+    def __init__(self, delay=0., fail=0):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    async def submit(self, call):
+        await asyncio.sleep(self.delay)
+        self.calls.append(call)
+        return len(self.calls) > self.fail
+
+class Oracle:
+    """ getRecords of records in a dict """
+    def __init__(self):
+        self.records = {}
+
+    def getRecords(self, keys):
+        return [self.records.get(tuple(k), (0, 0, 0)) for k in keys]
+
+async def run_for(keeper, seconds):
+    task = asyncio.create_task(keeper.run())
+    await asyncio.sleep(seconds)
+    keeper.stop()
+    await asyncio.wait_for(task, 5)
+
+class TestKeeper:
+    def test_concurrent_fetch_and_submit(self):
+        gasnet, submitter = Gasnet(), Submitter()
+        keeper = Keeper(CHAINS, gasnet.fetch, submitter.submit, new_filter(), poll_interval=0.01)
+
+        start = time.monotonic()
+        asyncio.run(run_for(keeper, 0.3))
+        elapsed = time.monotonic() - start
+
+        # every chain of a round is fetched at once
+        assert gasnet.max_in_flight == len(CHAINS)
+        assert keeper.stats['rounds'] <= elapsed / LATENCY + 1
+        assert keeper.stats['rounds'] >= 3
+
+        submitted = [c for call in submitter.calls for c in call.candidates]
+        assert len(submitted) == len(CHAINS) * keeper.stats['rounds']
+        assert keeper.stats['calls'] == len(submitter.calls) == keeper.stats['rounds']
+
+    def test_stale_rounds_are_filtered(self):
+        # gasnet only has new heights every other round
+        gasnet, submitter = Gasnet(every=2), Submitter()
+        reward_filter = new_filter()
+        keeper = Keeper(CHAINS, gasnet.fetch, submitter.submit, reward_filter, poll_interval=0.01)
+        asyncio.run(run_for(keeper, 0.35))
+
+        heights = [c.payload for call in submitter.calls for c in call.candidates]
+        assert len(heights) == len(set(heights))
+        assert reward_filter.records[CHAINS[0]][0] >> 48 == max(
+            codec.decode_payloads(p)[0].height for p in heights)
+
+    def test_graceful_shutdown_submits_fetched_rounds(self):
+        gasnet, submitter = Gasnet(), Submitter(delay=0.2)
+        keeper = Keeper(CHAINS, gasnet.fetch, submitter.submit, new_filter(), poll_interval=0., queue_size=1)
+        asyncio.run(run_for(keeper, 0.3))
+
+        # the slow submit dropped some rounds, but every round past the fetch stage was sent
+        assert keeper.stats['dropped_rounds'] > 0
+        assert keeper.stats['calls'] == len(submitter.calls) > 0
+        assert keeper.stats['calls'] + keeper.stats['dropped_rounds'] == keeper.stats['rounds']
+
+    def test_fetch_errors_and_invalid_payloads(self):
+        gasnet = Gasnet()
+
+        async def fetch(sid, cid):
+            if cid == 1:
+                raise ConnectionError("rpc down")
+            payload = await gasnet.fetch(sid, cid)
+            return payload[:-1] + b'\x00' if cid == 10 else payload
+
+        submitter = Submitter()
+        keeper = Keeper(CHAINS, fetch, submitter.submit, new_filter(), poll_interval=0.01)
+        asyncio.run(run_for(keeper, 0.1))
+
+        assert keeper.stats['fetch_errors'] == keeper.stats['rounds']
+        assert keeper.stats['invalid'] == keeper.stats['rounds']
+        sent = {codec.decode_payloads(c.payload)[0].cid for call in submitter.calls for c in call.candidates}
+        assert sent == {cid for _, cid in CHAINS} - {1, 10}
+
+    def test_in_flight_payloads_are_submitted_once(self):
+        # gasnet keeps serving the same heights, rounds are fetched while the first call is in flight
+        gasnet, submitter = Gasnet(every=1000), Submitter(delay=0.2)
+        reward_filter = new_filter()
+        keeper = Keeper(CHAINS, gasnet.fetch, submitter.submit, reward_filter, poll_interval=0.01)
+        asyncio.run(run_for(keeper, 0.3))
+
+        assert keeper.stats['rounds'] > 2
+        submitted = [c.payload for call in submitter.calls for c in call.candidates]
+        assert len(submitted) == len(set(submitted)) == len(CHAINS)
+        assert reward_filter.pending == {}
+
+    def test_failed_calls_are_released(self):
+        gasnet, submitter = Gasnet(every=1000), Submitter(delay=0.05, fail=1)
+        reward_filter = new_filter()
+        keeper = Keeper(CHAINS, gasnet.fetch, submitter.submit, reward_filter, poll_interval=0.01)
+        asyncio.run(run_for(keeper, 0.3))
+
+        # the payloads of the failed call were selected again and sent once more
+        assert keeper.stats['failed_calls'] == 1
+        assert keeper.stats['calls'] == 1
+        assert [c.payload for c in submitter.calls[0].candidates] == [c.payload for c in submitter.calls[1].candidates]
+        assert reward_filter.pending == {}
+
+    def test_other_keepers_updates_refresh_the_mirror(self):
+        gasnet, submitter = Gasnet(every=1000), Submitter()
+        oracle = Oracle()
+        mirror = OracleMirror(oracle)
+        mirror.bootstrap_gas_prices(CHAINS)
+
+        # another keeper already sent the first chain's height 1 payload
+        sid, cid = CHAINS[0]
+        oracle.records[(sid, cid, 107)] = (1, 60_000, 10**9)
+        oracle.records[(sid, cid, 322)] = (1, 60_000, 10**8)
+        updated = [{(sid, cid)}]
+
+        async def updates():
+            return updated.pop() if updated else set()
+
+        reward_filter = new_filter()
+        keeper = Keeper(CHAINS, gasnet.fetch, submitter.submit, reward_filter, poll_interval=0.01,
+                        mirror=mirror, updates=updates)
+        asyncio.run(run_for(keeper, 0.2))
+
+        assert keeper.stats['refreshes'] == 1
+        sent = [codec.decode_payloads(c.payload)[0] for call in submitter.calls for c in call.candidates]
+        assert sorted((p.sid, p.cid) for p in sent) == sorted(CHAINS[1:])
+        # our own payloads are applied to the mirror
+        for p in sent:
+            assert mirror.get(p.sid, p.cid, 107) == (10**9, 1, 60_000)
+        assert mirror.getGasPrice(sid, cid) == (10**9 + 10**8, 1, 60_000)
+
+    def test_oracle_updates(self):
+        w3 = Web3(EthereumTesterProvider())
+        ours, other = w3.eth.accounts[:2]
+        w3.eth.default_account = ours
+        emitter = deploy_vyper(w3, EMITTER)
+        server = RPCServer(w3).start()
+        try:
+            updates = oracle_updates(Web3(HTTPProvider(server.url)), emitter.address, w3.eth.block_number + 1, ours)
+            f = emitter.functions
+            f.oracle_updated(2, 1).transact({'from': other})
+            f.oracle_updated(2, 10).transact({'from': ours})
+            f.oracles_updated([pack_update(2, cid, 0, 0, 0, 0, 0, 0) for cid in (8453, 130)]).transact({'from': other})
+            assert asyncio.run(updates()) == {(2, 1), (2, 8453), (2, 130)}
+
+            # each block range is read once
+            assert asyncio.run(updates()) == set()
+            f.oracle_updated(2, 59144).transact({'from': other})
+            assert asyncio.run(updates()) == {(2, 59144)}
+        finally:
+            server.stop()
+
+    def test_refresh_from_snapshots(self):
+        gasnet, submitter = Gasnet(every=1000), Submitter()
+        oracle = Oracle()
+        mirror = OracleMirror(oracle)
+        sid, cid = CHAINS[0]
+        feed = batch_reads.Feed(5, 10**18, 60 * 10**18, 3, params.scales[(sid, cid)])
+
+        class Reader:
+            def __init__(self):
+                self.chains = []
+
+            def snapshot(self, chains, types):
+                self.chains.append(set(chains))
+                assert types == (107, 322)
+                records = {(sid, cid, 107): Record(1, 30_000, 10**9), (sid, cid, 322): Record(1, 30_000, 10**8)}
+                return batch_reads.Snapshot(0, None, True, records, {(sid, cid): feed}, {})
+
+        reader = Reader()
+        updated = [{(sid, cid)}]
+
+        async def updates():
+            return updated.pop() if updated else set()
+
+        reward_filter = new_filter()
+        keeper = Keeper(CHAINS, gasnet.fetch, submitter.submit, reward_filter, poll_interval=0.01,
+                        mirror=mirror, updates=updates, reader=reader)
+        asyncio.run(run_for(keeper, 0.1))
+
+        # the snapshot's records and feed state, then our height 1 payload on top of them
+        assert reader.chains == [{(sid, cid)}]
+        assert keeper.stats['refreshes'] == 1
+        assert mirror.getGasPrice(sid, cid) == (10**9 + 10**8, 1, 60_000)
+        expected = list(feed)
+        cm.update_feed(expected, 10**9 + 10**8, 10**9 + 10**8, 30_000, 60_000, reward_filter.cfg)
+        assert reward_filter.feeds[(sid, cid)] == expected
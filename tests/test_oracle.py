@@ -4,7 +4,11 @@ from web3 import Web3
 
 from ape import accounts
 
+from scripts import payload_codec
 from fixture import controller, owner, oracle
+import utils
+
+web3 = Web3()
 
 FORTY_FIVE_DECIMAL_NUMBER   = int(10 ** 45)
 TWENTY_SEVEN_DECIMAL_NUMBER = int(10 ** 27)
@@ -37,16 +41,7 @@ def assertGt(x, y):
 def assertLt(x, y):
     assert x < y
 
-def create_payload(plen, ts, sid, cid, height, typ_values={}, version=1):
-    empty = 0
-    header = empty.to_bytes(6, 'big') + plen.to_bytes(2, 'big') + ts.to_bytes(6, 'big') + sid.to_bytes(1, 'big') + \
-            cid.to_bytes(8, 'big') + height.to_bytes(8, 'big') + version.to_bytes(1, 'big')
-
-    values = b''
-    for typ, val in typ_values.items():
-        values += typ.to_bytes(2, 'big') + val.to_bytes(30, 'big')
-
-    return header + values
+create_payload = utils.create_raw_payload
 
 class TestOracle:
     def _test_prepare_header(self, store):
@@ -280,4 +275,96 @@ class TestOracle:
         assert bf_height == 12345678
         assert bf_ts == 9876543210
 
+    def test_store_wide_values(self, oracle, owner):
+        # records are packed into one slot, values over 144 bits are kept aside
+        sid = 2
+        cid = 56
+        ts = 9876543210
+        typ_values = {107: 10000000000,
+                      199: 2**200,
+                      322: 2**144 - 1}
+
+        a = utils.create_signed_payload(web3=web3, signer=owner, plen=len(typ_values), ts=ts, sid=sid, cid=cid,
+                                        height=12345678, typ_values=typ_values)
+        oracle.storeValues(a, sender=owner)
+
+        for typ, val in typ_values.items():
+            assert oracle.get(sid, cid, typ) == (val, 12345678, ts)
+            assert oracle.getValue(sid, cid, typ) == val
+            record = oracle.getRecord(sid, cid, typ)
+            assert (record.height, record.timestamp, record.value) == (12345678, ts, val)
+
+        # a narrow value replaces a wide one
+        typ_values = {199: 20000000000}
+        b = utils.create_signed_payload(web3=web3, signer=owner, plen=len(typ_values), ts=ts + 1, sid=sid, cid=cid,
+                                        height=12345679, typ_values=typ_values)
+        oracle.storeValues(b, sender=owner)
+
+        assert oracle.get(sid, cid, 199) == (20000000000, 12345679, ts + 1)
+        assert oracle.get(sid, cid, 322) == (2**144 - 1, 12345678, ts)
+
+        oracle.ownerSetGasPrice(sid, cid, ts + 2, 12345680, 2**239, 2**144 - 1, sender=owner)
+        assert oracle.get(sid, cid, 107) == (2**239, 12345680, ts + 2)
+        assert oracle.get(sid, cid, 322) == (2**144 - 1, 12345680, ts + 2)
+
+        # the owner can still set a basefee or tip alone, the other keeps its value and stamp
+        oracle.ownerSetValues(sid, cid, 107, ts + 3, 12345681, 2**200, sender=owner)
+        assert oracle.get(sid, cid, 107) == (2**200, 12345681, ts + 3)
+        assert oracle.get(sid, cid, 322) == (2**144 - 1, 12345680, ts + 2)
+        assert oracle.getGasPrice(sid, cid) == (2**200 + 2**144 - 1, 12345681, ts + 3)
+
+    def test_gas_price_record(self, oracle, owner):
+        # basefee and tip share one record per chain, read back per type or combined
+        sid = 2
+        cid = 56
+        ts = 9876543210
+        typ_values = {107: 10000000000,
+                      199: 20000000000,
+                      322: 500000000}
+
+        a = utils.create_signed_payload(web3=web3, signer=owner, plen=len(typ_values), ts=ts, sid=sid, cid=cid,
+                                        height=12345678, typ_values=typ_values)
+        oracle.storeValues(a, sender=owner)
 
+        assert oracle.get(sid, cid, 107) == (10000000000, 12345678, ts)
+        assert oracle.get(sid, cid, 322) == (500000000, 12345678, ts)
+        assert oracle.getGasPrice(sid, cid) == (10500000000, 12345678, ts)
+
+        # a record with only a tip keeps the basefee and its stamp, and doesn't revert the others
+        typ_values = {322: 600000000}
+        b = utils.create_signed_payload(web3=web3, signer=owner, plen=len(typ_values), ts=ts + 1, sid=sid, cid=cid,
+                                        height=12345679, typ_values=typ_values)
+        other = utils.create_signed_payload(web3=web3, signer=owner, plen=2, ts=ts, sid=sid, cid=57,
+                                            height=12345678, typ_values={107: 7, 322: 8})
+        receipts = oracle.storeValuesWithReceipt.call(b + payload_codec.DELIMITER + other)
+        assert [(r.record.typ, r.new_record.height) for r in receipts] == [(322, 12345679), (107, 12345678), (322, 12345678)]
+        oracle.storeValues(b + payload_codec.DELIMITER + other, sender=owner)
+
+        assert oracle.get(sid, cid, 107) == (10000000000, 12345678, ts)
+        assert oracle.get(sid, cid, 322) == (600000000, 12345679, ts + 1)
+        assert oracle.getGasPrice(sid, cid) == (10600000000, 12345678, ts)
+        assert oracle.get(sid, cid, 199) == (20000000000, 12345678, ts)
+        assert oracle.getGasPrice(sid, 57) == (15, 12345678, ts)
+
+        # a record with both, no newer than the lone tip, only replaces the basefee
+        typ_values = {107: 11000000000, 322: 700000000}
+        c = utils.create_signed_payload(web3=web3, signer=owner, plen=len(typ_values), ts=ts + 1, sid=sid, cid=cid,
+                                        height=12345679, typ_values=typ_values)
+        receipts = oracle.storeValuesWithReceipt.call(c)
+        assert [(r.record.typ, r.new_record.value) for r in receipts] == [(107, 11000000000), (322, 0)]
+        # combined receipts pair each chain's basefee and tip, the lone tip stays unpaired
+        assert [r.cid for r in oracle.storeValuesWithGasPriceReceipt.call(b + payload_codec.DELIMITER + other)] == [57]
+        oracle.storeValues(c, sender=owner)
+
+        assert oracle.get(sid, cid, 107) == (11000000000, 12345679, ts + 1)
+        assert oracle.get(sid, cid, 322) == (600000000, 12345679, ts + 1)
+
+        # a newer record with both replaces both
+        typ_values = {107: 12000000000, 322: 800000000}
+        d = utils.create_signed_payload(web3=web3, signer=owner, plen=len(typ_values), ts=ts + 2, sid=sid, cid=cid,
+                                        height=12345680, typ_values=typ_values)
+        oracle.storeValues(d, sender=owner)
+
+        assert oracle.get(sid, cid, 107) == (12000000000, 12345680, ts + 2)
+        assert oracle.get(sid, cid, 322) == (800000000, 12345680, ts + 2)
+        assert oracle.getGasPrice(sid, cid) == (12800000000, 12345680, ts + 2)
@@ -0,0 +1,90 @@
+import pytest
+
+from scripts import batch_signer
+from scripts import payload_codec as codec
+from scripts.oracle_mirror import OracleMirror, Record
+
+PRIVATE_KEY = bytes(range(1, 33))
+ETH = (2, 1)
+OP = (2, 10)
+
+class Oracle:
+    """ records in a dict, counting the calls a mirror makes """
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+
+    def getRecords(self, keys):
+        self.calls.append(('getRecords', len(keys)))
+        return [self.records.get(tuple(k), (0, 0, 0)) for k in keys]
+
+    def getRecord(self, sid, cid, typ):
+        self.calls.append(('getRecord', (sid, cid, typ)))
+        return self.records.get((sid, cid, typ), (0, 0, 0))
+
+class Clock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+def payload(sid, cid, height, ts, basefee, tip):
+    raw = codec.encode_payload(ts=ts, sid=sid, cid=cid, height=height, typ_values={107: basefee, 322: tip})
+    return batch_signer.sign_payload(raw, PRIVATE_KEY)
+
+@pytest.fixture
+def oracle():
+    return Oracle({(*ETH, 107): (100, 1_000, 30 * 10**9), (*ETH, 322): (100, 1_000, 10**9),
+                   (*OP, 107): (50, 2_000, 10**6), (*OP, 322): (50, 2_000, 10**5)})
+
+class TestOracleMirror:
+    def test_bootstrap_and_reads(self, oracle):
+        mirror = OracleMirror(oracle, clock=Clock())
+        mirror.bootstrap_gas_prices([ETH, OP])
+        assert oracle.calls == [('getRecords', 4)]
+
+        assert mirror.getGasPrice(*ETH) == (31 * 10**9, 100, 1_000)
+        assert mirror.get(*OP, 107) == (10**6, 50, 2_000)
+        assert mirror.getRecord(*OP, 322) == Record(50, 2_000, 10**5)
+        assert len(oracle.calls) == 1
+
+        # a miss reads the Oracle once, then is mirrored
+        assert mirror.get(2, 8453, 107) == (0, 0, 0)
+        mirror.get(2, 8453, 107)
+        assert oracle.calls[1:] == [('getRecord', (2, 8453, 107))]
+        assert mirror.misses == 1
+
+    def test_stale_records(self, oracle):
+        clock = Clock()
+        mirror = OracleMirror(oracle, max_age=10, clock=clock)
+        mirror.bootstrap_gas_prices([ETH, OP])
+
+        clock.now = 11
+        oracle.records[(*ETH, 107)] = (101, 1_500, 40 * 10**9)
+        assert mirror.get(*ETH, 107) == (40 * 10**9, 101, 1_500)
+        assert mirror.refresh() == 3
+        assert oracle.calls[-1] == ('getRecords', 3)
+        assert mirror.refresh() == 0
+
+    def test_apply_payload(self, oracle):
+        clock = Clock()
+        mirror = OracleMirror(oracle, max_age=10, clock=clock)
+        mirror.bootstrap_gas_prices([ETH, OP])
+
+        clock.now = 20
+        # newer for ETH, stale for OP
+        mirror.apply_payload(payload(*ETH, 101, 1_600, 35 * 10**9, 2 * 10**9) + codec.DELIMITER +
+                             payload(*OP, 50, 2_000, 10**7, 10**5))
+        assert mirror.getGasPrice(*ETH) == (37 * 10**9, 101, 1_600)
+        assert mirror.get(*OP, 107) == (10**6, 50, 2_000)
+        # the stale OP payload confirmed the mirrored records, no RPC
+        assert oracle.calls == [('getRecords', 4)]
+
+    def test_apply_receipts(self, oracle):
+        mirror = OracleMirror(oracle, clock=Clock())
+        mirror.bootstrap_gas_prices([ETH])
+        mirror.apply_receipts([((*ETH, 107), (100, 1_000, 30 * 10**9), (102, 1_700, 20 * 10**9)),
+                               ((*ETH, 322), (100, 1_000, 10**9), (0, 0, 0))])
+        assert mirror.get(*ETH, 107) == (20 * 10**9, 102, 1_700)
+        assert mirror.get(*ETH, 322) == (10**9, 100, 1_000)
@@ -0,0 +1,119 @@
+import pytest
+
+import utils
+from scripts import batch_signer
+from scripts import payload_assembler as pa
+from scripts import payload_codec as codec
+
+PRIVATE_KEY = bytes(range(1, 33))
+
+def signed_payload(cid, extra_types=0):
+    typ_values = {107: 10**9 + cid, 322: 10**8}
+    typ_values.update({1000 + i: i for i in range(extra_types)})
+    raw = codec.encode_payload(ts=1_700_000_000_000, sid=2, cid=cid, height=cid, typ_values=typ_values)
+    return batch_signer.sign_payload(raw, PRIVATE_KEY)
+
+def signed_envelope(cids):
+    records = [dict(plen=2, ts=1_700_000_000_000, sid=2, cid=cid, height=1, typ_values={107: 1, 322: 2})
+               for cid in cids]
+    return batch_signer.sign_payload(utils.create_raw_envelope(records), PRIVATE_KEY)
+
+# one receipt per chain, a controller with gas_price_receipts enabled
+COMBINED = pa.Limits(gas_price_receipts=True)
+
+def check_call(call, limits=COMBINED):
+    assert len(call.dat) <= limits.max_size
+    assert sum(limits.receipts(c) for c in call.candidates) <= limits.max_records
+    assert call.gas <= limits.gas_limit
+    # the Oracle's stride lands on every payload
+    decoded = codec.decode_payloads(call.dat)
+    assert sum(c.records for c in call.candidates) == len(decoded) == call.records
+
+class TestPayloadAssembler:
+    def test_candidate_validation(self):
+        payload = signed_payload(1)
+        assert pa.candidate(payload, 5) == pa.Candidate(payload, 1, 5, values=2)
+        assert pa.candidate(signed_envelope([1, 10, 130])).records == 3
+        assert pa.candidate(signed_envelope([1, 10, 130])).values == 6
+
+        with pytest.raises(pa.InvalidPayload, match="header announces"):
+            pa.candidate(payload + b'\x00')
+        with pytest.raises(pa.InvalidPayload, match="basefee and tip"):
+            raw = codec.encode_payload(ts=1, sid=2, cid=1, height=1, typ_values={107: 1})
+            pa.candidate(batch_signer.sign_payload(raw, PRIVATE_KEY))
+        with pytest.raises(pa.InvalidPayload, match="v param"):
+            pa.candidate(payload[:-1] + b'\x00')
+
+    def test_fewest_calls(self):
+        # 100 chains, 32 receipts a call at most
+        calls = pa.assemble([signed_payload(cid) for cid in range(100)], COMBINED)
+        assert len(calls) == 4
+        for call in calls:
+            check_call(call)
+
+        # large payloads are limited by size: 1000 + 31 bytes each, 15 a call
+        limits = COMBINED._replace(gas_limit=30_000_000)
+        calls = pa.assemble([signed_payload(cid, extra_types=28) for cid in range(40)], limits)
+        assert [len(call.candidates) for call in calls] == [15, 15, 10]
+        for call in calls:
+            check_call(call, limits)
+
+    def test_gas_limit(self):
+        # 5 words per payload, room for 5 of them
+        limits = COMBINED._replace(gas_limit=pa.GasModel().estimate(5, 25))
+        calls = pa.assemble([signed_payload(cid) for cid in range(12)], limits)
+        assert [call.records for call in calls] == [5, 5, 2]
+        for call in calls:
+            check_call(call, limits)
+
+    def test_default_gas_limit(self):
+        # 33 words each: 15 would fit the size limit, the gas of 14 fits the 3M default
+        assert pa.GasModel().estimate(14, 14 * 33) <= pa.Limits().gas_limit < pa.GasModel().estimate(15, 15 * 33)
+        calls = pa.assemble([signed_payload(cid, extra_types=28) for cid in range(40)], COMBINED)
+        assert [len(call.candidates) for call in calls] == [14, 14, 12]
+        for call in calls:
+            check_call(call)
+
+        # small payloads are limited by the receipt count
+        calls = pa.assemble([signed_payload(cid) for cid in range(64)], COMBINED)
+        assert [call.records for call in calls] == [32, 32]
+
+    def test_value_receipts(self):
+        # by default the oracle returns a receipt per value, basefee and tip are 2 per chain
+        calls = pa.assemble([signed_payload(cid) for cid in range(40)])
+        assert [call.records for call in calls] == [16, 16, 8]
+        for call in calls:
+            check_call(call, pa.Limits())
+
+        # 2 + 6 values each, 4 chains a call, the envelope of 3 chains takes 6 receipts
+        calls = pa.assemble([signed_payload(cid, extra_types=6) for cid in range(10)] +
+                            [pa.candidate(signed_envelope(range(3)))])
+        assert sorted(call.records for call in calls) == [4, 4, 2 + 3]
+        for call in calls:
+            check_call(call, pa.Limits())
+
+        with pytest.raises(pa.InvalidPayload, match="on its own"):
+            pa.assemble([signed_payload(1, extra_types=31)])
+
+    def test_gas_model_fit(self):
+        model = pa.GasModel(100_000, 25_000, 600)
+        samples = [(r, w, model.estimate(r, w) + (r * w) % 997) for r in (1, 2, 4, 8, 16, 32) for w in (6 * r, 20 * r)]
+        fitted = pa.GasModel.fit(samples)
+        assert abs(fitted.per_record - 25_000) < 500
+        assert abs(fitted.per_word - 600) < 50
+        assert all(fitted.estimate(r, w) >= gas for r, w, gas in samples)
+
+    def test_reward_priority(self):
+        candidates = [pa.candidate(signed_payload(cid), expected_reward=cid) for cid in range(70)]
+        calls = pa.assemble(candidates, COMBINED, max_calls=2)
+        assert [call.records for call in calls] == [32, 32]
+        assert [c.expected_reward for c in calls[0].candidates] == list(range(69, 37, -1))
+        assert min(c.expected_reward for call in calls for c in call.candidates) == 6
+
+        # envelopes count one receipt per record, the best rewarded chains share a call
+        calls = pa.assemble([pa.candidate(signed_envelope(range(30)), 1), pa.candidate(signed_payload(1), 10),
+                             pa.candidate(signed_payload(2), 9), pa.candidate(signed_payload(3), 8)], COMBINED)
+        assert [call.records for call in calls] == [3, 30]
+        assert calls[0].expected_reward == 27
+        for call in calls:
+            check_call(call)
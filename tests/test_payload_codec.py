@@ -0,0 +1,60 @@
+import random
+
+import utils
+from scripts import payload_codec as codec
+
+def random_payload(rng, plen=None):
+    plen = rng.randint(1, 8) if plen is None else plen
+    return dict(ts=rng.randrange(2**48), sid=rng.randrange(2**8), cid=rng.randrange(2**64),
+                height=rng.randrange(2**64),
+                typ_values={typ: rng.randrange(2**240) for typ in rng.sample(range(2**16), plen)},
+                signature=rng.randbytes(codec.SIGNATURE_SIZE))
+
+def legacy_payload(p):
+    # header + values + signature, as the tests build them by concatenation
+    return utils.create_raw_payload(len(p['typ_values']), p['ts'], p['sid'], p['cid'], p['height'],
+                                    p['typ_values']) + p['signature']
+
+class TestPayloadCodec:
+    def test_encode_matches_concatenation(self):
+        rng = random.Random(0)
+        payloads = [random_payload(rng) for _ in range(50)]
+        assert codec.encode_payload(**payloads[0]) == legacy_payload(payloads[0])
+        assert codec.encode_payloads(payloads) == codec.DELIMITER.join(legacy_payload(p) for p in payloads)
+
+    def test_decode_round_trip(self):
+        rng = random.Random(1)
+        payloads = [random_payload(rng) for _ in range(1000)]
+        buf = codec.encode_payloads(payloads)
+
+        decoded = codec.decode_payloads(buf)
+        assert len(decoded) == len(payloads)
+        for p, d in zip(payloads, decoded):
+            assert (d.version, d.height, d.cid, d.sid, d.ts) == (1, p['height'], p['cid'], p['sid'], p['ts'])
+            assert d.values == p['typ_values']
+            assert d.signature == p['signature']
+            # signatures are views into the input, not copies
+            assert d.signature.obj is buf
+
+        first, offset = codec.decode_payload(buf)
+        assert first == decoded[0]
+        assert codec.decode_payload(buf, offset)[0] == decoded[1]
+        assert codec.signed_data(buf, offset) == buf[offset:offset + 32 * (len(payloads[1]['typ_values']) + 1)]
+
+    def test_header_fields(self):
+        header = utils.create_raw_payload(plen=512, ts=9876543210, sid=2, cid=56, height=12345678)
+        assert codec.decode_header(header) == (1, 12345678, 56, 2, 9876543210, 512)
+
+    def test_envelope(self):
+        rng = random.Random(2)
+        records = [dict(plen=2, ts=rng.randrange(2**48), sid=2, cid=cid, height=rng.randrange(2**64),
+                        typ_values={107: rng.randrange(2**240), 322: rng.randrange(2**240)}) for cid in (1, 10, 8453)]
+        signature = rng.randbytes(codec.SIGNATURE_SIZE)
+        single = random_payload(rng)
+        buf = codec.encode_payloads([single]) + codec.DELIMITER + utils.create_raw_envelope(records) + signature
+
+        decoded = codec.decode_payloads(buf)
+        assert [d.cid for d in decoded] == [single['cid'], 1, 10, 8453]
+        for record, d in zip(records, decoded[1:]):
+            assert (d.height, d.ts, d.values) == (record['height'], record['ts'], record['typ_values'])
+            assert d.signature == signature
@@ -0,0 +1,105 @@
+import csv
+import gzip
+import random
+import pytest
+
+import params
+from scripts import controller_model as cm
+from scripts import replay
+from scripts.batch_reads import Feed, Snapshot
+from scripts.oracle_mirror import Record
+
+CFG = cm.ControllerConfig.from_params(params)
+ARB = (2, 42161)
+ETH = (2, 1)
+
+def random_history(rng, n, keys):
+    heights = {k: 0 for k in keys}
+    timestamps = {k: 1_700_000_000_000 for k in keys}
+    for i in range(n):
+        k = keys[i % len(keys)]
+        heights[k] += rng.randint(1, 3)
+        timestamps[k] += rng.randint(1000, 3_600_000)
+        yield (*k, heights[k], timestamps[k], rng.randint(10**6, 10**10), rng.randint(0, 10**8))
+
+class TestReplay:
+    def test_matches_model(self):
+        rng = random.Random(0)
+        history = list(random_history(rng, 500, list(params.scales)))
+        r = replay.Replay(CFG, params.scales)
+        updates = list(r.run(history))
+        assert len(updates) == r.updates == len(history)
+
+        feeds = {k: [0, 0, 0, 0, s] for k, s in params.scales.items()}
+        last = {}
+        total = 0
+        for rec, update in zip(history, updates):
+            sid, cid, height, ts, basefee, tip = rec
+            old_ts, old_gp = last.get((sid, cid), (0, 0))
+            expected = cm.update_feed(feeds[(sid, cid)], old_gp, basefee + tip, old_ts, ts, CFG)
+            last[(sid, cid)] = (ts, basefee + tip)
+            total += expected.time_reward + expected.deviation_reward
+
+            assert update.gas_price == basefee + tip
+            assert (update.raw_deviation, update.time_since, update.time_reward,
+                    update.deviation_reward, update.reward_mult) == tuple(expected)
+            assert update.total_rewards == total
+
+        assert r.total_rewards == total == sum(r.rewards.values())
+
+    def test_stale_records(self):
+        r = replay.Replay(CFG, params.scales)
+        assert r.step(*ARB, 10, 60_000, 10**9, 10**7) is not None
+        # same or older height and timestamp, like the oracle these don't update the chain
+        assert r.step(*ARB, 10, 60_000, 2*10**9, 10**7) is None
+        assert r.step(*ARB, 9, 120_000, 2*10**9, 10**7) is None
+        assert r.stale == 2
+
+        update = r.step(*ARB, 10, 120_000, 2*10**9, 10**7)
+        assert update.raw_deviation == 10**9
+        assert update.time_since == 60
+
+    def test_reverts(self):
+        r = replay.Replay(CFG, params.scales)
+        # no scale for this chain
+        assert r.step(2, 999, 1, 1000, 10**9, 0) is None
+        r.step(*ETH, 10, 60_000, 10**9, 0)
+        # newer height but older timestamp
+        assert r.step(*ETH, 11, 30_000, 10**9, 0) is None
+        assert r.reverts == 2
+        assert r.records[ETH][1] == 60_000
+        assert r.updates == 1
+
+    def test_initial_snapshot(self):
+        # state live at the start of the window: ARB updated before, ETH never
+        feed = Feed(error_integral=-3 * 10**18, last_output=2 * 10**17, interval_ema=900 * 10**18, count=12,
+                    scale=params.scales[ARB])
+        records = {(*ARB, 107): Record(100, 1_700_000_000_000, 10**9), (*ARB, 322): Record(100, 1_700_000_000_000, 10**8),
+                   (*ETH, 107): Record(0, 0, 0), (*ETH, 322): Record(0, 0, 0)}
+        snapshot = Snapshot(block=1, cfg=CFG, rewards_enabled=True, records=records,
+                            feeds={ARB: feed, ETH: Feed(0, 0, 0, 0, params.scales[ETH])}, rewards={})
+        r = replay.Replay(CFG, params.scales, snapshot)
+
+        # stale against the live record
+        assert r.step(*ARB, 100, 1_700_000_000_000, 2 * 10**9, 0) is None
+        update = r.step(*ARB, 101, 1_700_000_060_000, 2 * 10**9, 0)
+        expected = cm.update_feed(list(feed), 11 * 10**8, 2 * 10**9, 1_700_000_000_000, 1_700_000_060_000, CFG)
+        assert tuple(update)[5:10] == tuple(expected)
+        assert update.time_since == 60
+        assert r.feeds[ARB][3] == 13
+
+        # a chain without a record starts from zero
+        assert r.step(*ETH, 1, 60_000, 10**9, 0).time_since == 60
+
+    @pytest.mark.parametrize("suffix", [".csv", ".csv.gz"])
+    def test_read_history(self, tmp_path, suffix):
+        rng = random.Random(1)
+        history = list(random_history(rng, 50, [ARB, ETH]))
+        path = str(tmp_path / f"history{suffix}")
+        opener = gzip.open if suffix.endswith('.gz') else open
+        with opener(path, 'wt', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(replay.FIELDS)
+            writer.writerows(history)
+
+        assert list(replay.read_history(path)) == history
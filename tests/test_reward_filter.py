@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import params
+from scripts import batch_signer
+from scripts import controller_model as cm
+from scripts import payload_assembler as pa
+from scripts import payload_codec as codec
+from scripts import reward_filter
+
+CFG = cm.ControllerConfig.from_params(params)
+PRIVATE_KEY = bytes(range(1, 33))
+ARB = (2, 42161)
+ETH = (2, 1)
+
+def payload(sid, cid, height, ts, basefee, tip, tip_type=322):
+    raw = codec.encode_payload(ts=ts, sid=sid, cid=cid, height=height, typ_values={107: basefee, tip_type: tip})
+    return batch_signer.sign_payload(raw, PRIVATE_KEY)
+
+def new_filter(min_reward=0):
+    f = reward_filter.RewardFilter(CFG, min_reward=min_reward)
+    for (sid, cid), scale in params.scales.items():
+        f.set_feed(sid, cid, 0, 0, 0, 0, scale)
+    return f
+
+class TestRewardFilter:
+    def test_prediction_matches_model(self):
+        f = new_filter()
+        f.set_record(*ETH, 100, 1_000_000, 30 * 10**9)
+
+        [p] = f.predict(payload(*ETH, 101, 1_600_000, 31 * 10**9, 10**9))
+        feed = [0, 0, 0, 0, params.scales[ETH]]
+        expected = cm.update_feed(feed, 30 * 10**9, 32 * 10**9, 1_000_000, 1_600_000, CFG)
+        assert (p.time_reward, p.deviation_reward) == (expected.time_reward, expected.deviation_reward)
+        assert p.reward > 0 and not p.stale
+
+        # predict doesn't touch the cache, apply does
+        assert f.feeds[ETH][3] == 0
+        f.apply(payload(*ETH, 101, 1_600_000, 31 * 10**9, 10**9))
+        assert f.feeds[ETH] == feed
+        assert f.records[ETH] == (101 << 48 | 1_600_000, 1_600_000, 32 * 10**9)
+
+    def test_select_drops_stale_reverts_and_cheap(self):
+        f = new_filter(min_reward=CFG.min_time_reward + CFG.min_deviation_reward + 1)
+        f.set_record(*ETH, 100, 1_000_000, 30 * 10**9)
+        f.set_record(*ARB, 100, 1_000_000, 10**7)
+
+        good = payload(*ETH, 101, 3_600_000, 40 * 10**9, 0)
+        stale = payload(*ARB, 100, 1_000_000, 2 * 10**7, 0)
+        unknown = payload(2, 999, 1, 1_000, 10**9, 0)
+        backwards = payload(*ARB, 101, 999_000, 2 * 10**7, 0)
+        # a second of time and no deviation only pays the min rewards
+        cheap = payload(*ARB, 101, 1_001_000, 10**7, 0)
+        # the same height as the good payload before it, stale by then
+        repeat = payload(*ETH, 101, 3_600_000, 40 * 10**9, 0)
+
+        candidates = f.select([good, stale, unknown, backwards, cheap, repeat])
+        assert [c.payload for c in candidates] == [good]
+        assert candidates[0].expected_reward == f.predict(good)[0].reward
+
+        calls = pa.assemble(candidates)
+        assert calls[0].dat == good
+
+    def test_rewards_disabled(self):
+        f = new_filter()
+        f.rewards_enabled = False
+        [p] = f.predict(payload(*ETH, 1, 1_000, 10**9, 0))
+        assert p.reward == 0 and p.revert is None
+        [p] = f.predict(payload(2, 999, 1, 1_000, 10**9, 0))
+        assert p.revert == "unknown scid"
+
+    def test_gas_cost(self):
+        f = new_filter()
+        f.set_record(*ETH, 100, 1_000_000, 30 * 10**9)
+        p = payload(*ETH, 101, 1_001_000, 30 * 10**9, 0)
+        reward = f.predict(p)[0].reward
+
+        # 5 words: header, basefee, tip and the 65 byte signature
+        f.reward_per_gas = reward_filter.gas_reward(10**9, reward_per_eth=10**20)
+        gas = f.gas_model.per_record + 5 * f.gas_model.per_word
+        assert f.gas_cost(pa.candidate(p)) == gas * 10**11
+
+        f.reward_per_gas = reward // gas
+        assert f.select([p])[0].expected_reward == reward
+        f.release(p)
+        f.reward_per_gas = reward // gas + 1
+        assert f.select([p]) == []
+
+    def test_pending_payloads(self):
+        f = new_filter()
+        f.set_record(*ETH, 100, 1_000_000, 30 * 10**9)
+        first = payload(*ETH, 101, 1_600_000, 31 * 10**9, 0)
+        second = payload(*ETH, 102, 2_200_000, 32 * 10**9, 0)
+
+        # a selected payload is pending, selecting it again finds it stale
+        [c] = f.select([first])
+        assert f.select([first]) == []
+        # the next one is predicted on top of it
+        [d] = f.select([second])
+        assert d.expected_reward == f.predict(first + codec.DELIMITER + second)[1].reward
+
+        # released, both can be selected again
+        f.release(second)
+        f.release(first)
+        assert f.select([first])[0].expected_reward == c.expected_reward
+        f.apply(first)
+        f.apply(second)
+        assert f.pending == {}
+        assert f.select([first, second]) == []
+
+    def test_load_reads_each_type(self):
+        # an oracle with only the per type getter, and a controller rewarding another tip type
+        records = {(*ETH, 107): (30 * 10**9, 100, 1_000_000), (*ETH, 1000): (10**9, 100, 1_000_000),
+                   (*ETH, 322): (5 * 10**9, 100, 1_000_000)}
+        oracle = SimpleNamespace(get=lambda sid, cid, typ: records[(sid, cid, typ)])
+        getters = {f: (lambda v=v: v) for f, v in CFG._asdict().items() if f not in ("kp", "ki", "co_bias", "coeff")}
+        getters.update(
+            control_output=lambda: SimpleNamespace(kp=CFG.kp, ki=CFG.ki, co_bias=CFG.co_bias),
+            coeff=lambda: SimpleNamespace(zero=CFG.coeff[0], one=CFG.coeff[1], two=CFG.coeff[2], three=CFG.coeff[3]),
+            rewards_enabled=lambda: True, tip_reward_type=lambda: 1000,
+            error_integral=lambda scid: 0, last_output=lambda scid: 0, interval_ema=lambda scid: 0,
+            count=lambda scid: 0, scales=lambda scid: params.scales[ETH])
+        f = reward_filter.RewardFilter(None)
+        f.load(SimpleNamespace(**getters), oracle, [ETH])
+
+        assert f.cfg == CFG and f.tip_type == 1000
+        assert f.records[ETH] == (100 << 48 | 1_000_000, 1_000_000, 31 * 10**9)
+        # predicted with the controller's tip, a payload without it doesn't update the feed
+        [p] = f.predict(payload(*ETH, 101, 1_600_000, 31 * 10**9, 10**9, tip_type=1000))
+        feed = [0, 0, 0, 0, params.scales[ETH]]
+        expected = cm.update_feed(feed, 31 * 10**9, 32 * 10**9, 1_000_000, 1_600_000, CFG)
+        assert (p.gas_price, p.reward) == (32 * 10**9, expected.time_reward + expected.deviation_reward)
+        assert f.predict(payload(*ETH, 101, 1_600_000, 31 * 10**9, 10**9))[0].stale
@@ -18,6 +18,7 @@ from addresses import oracle_addresses, gasnet_contract
 from fixture import owner, oracle, controller
 from fixture import oracle
 import utils
+from scripts.compact_logs import decode_oracles_updated
 
 TWENTY_SEVEN_DECIMAL_NUMBER = int(10 ** 27)
 EIGHTEEN_DECIMAL_NUMBER     = int(10 ** 18)
@@ -85,6 +86,18 @@ class TestRewardController:
         with ape.reverts():
             controller.modify_parameters_int("output_lower_bound", controller.output_upper_bound() + 1, sender=owner);
 
+    def test_fail_modify_parameters_bounds_outside_int96(self, owner, controller):
+        # last_output is stored as int96
+        with ape.reverts("RewardController/invalid-output_upper_bound"):
+            controller.modify_parameters_int("output_upper_bound", 2**95, sender=owner);
+        with ape.reverts("RewardController/invalid-output_lower_bound"):
+            controller.modify_parameters_int("output_lower_bound", -2**95 - 1, sender=owner);
+
+        controller.modify_parameters_int("output_upper_bound", 2**95 - 1, sender=owner);
+        controller.modify_parameters_int("output_lower_bound", -2**95, sender=owner);
+        assert controller.output_upper_bound() == 2**95 - 1
+        assert controller.output_lower_bound() == -2**95
+
     def test_get_next_output_zero_error(self, owner, controller):
         pi_output = controller.get_new_pi_output(1,0);
         assert pi_output == params.co_bias + 0
@@ -542,6 +555,29 @@ class TestRewardController:
         assert controller.get_scale(1, 4) == 40*10**15
         assert controller.get_scale(4, 11) == 11000
 
+    def test_set_scale_keeps_feed_state(self, owner, controller, chain):
+        # scale shares a packed slot with interval_ema and count
+        scid = (1 << 8) | 2
+        error = controller.error(1800*10**18, 1850*10**18)
+        assert error < 0
+
+        controller.test_update_feedback(scid, error, sender=owner)
+        controller.test_update_interval_ema(scid, 600*10**18, sender=owner)
+        error_integral = controller.error_integral(scid)
+        last_output = controller.last_output(scid)
+        interval_ema = controller.interval_ema(scid)
+        assert error_integral == error
+        assert interval_ema != 0
+
+        controller.set_scale(2, 1, 3*10**15, sender=owner)
+        assert controller.scales(scid) == 3*10**15
+        assert controller.error_integral(scid) == error_integral
+        assert controller.last_output(scid) == last_output
+        assert controller.interval_ema(scid) == interval_ema
+
+        with ape.reverts():
+            controller.set_scale(2, 1, 2**96, sender=owner)
+
     def test_time_reward(self, owner, controller, chain):
         assert controller.calc_time_reward(0) == controller.min_time_reward()
         assert controller.calc_time_reward(35*10**18) == controller.min_time_reward()
@@ -1027,6 +1063,104 @@ class TestRewardController:
         # only 1 update
         assert len(tx.events) == 1
 
+    def test_update_many_compact_logs(self, owner, controller, oracle, chain):
+        controller.enable_rewards(sender=owner)
+
+        n = 3
+        scales = [(2, i+1, (i+1)*10**18) for i in range(n)]
+        controller.set_scales(scales, sender=owner)
+
+        ts = int(time.time() * 1000)
+
+        # build multi-chain payload
+        payload = b''
+        for i in range(n):
+            typ_values = {107: random.randint(10**15, 10**18),
+                          199: random.randint(10**15, 10**18),
+                          322: random.randint(10**15, 10**18)}
+            payload_params = {
+                "plen": len(typ_values),
+                "ts": ts + i*2000,
+                "sid": 2,
+                "cid": i+1,
+                "height": (i+1)*100,
+                "typ_values": typ_values
+                }
+
+            if i != 0:
+                payload += DELIMITER
+
+            payload += utils.create_signed_payload(web3=web3, signer=owner, **payload_params)
+
+        # same update w/ one event per feed and w/ compact logs
+        snap = chain.snapshot()
+        tx = controller.update_many(payload, sender=owner)
+        assert len(tx.events) == n
+        expected = [(e.updater, e.system_id, e.chain_id, e.new_value, e.raw_deviation, e.time_since,
+                     e.time_reward, e.deviation_reward, e.reward_mult) for e in tx.events]
+        rewards = controller.rewards(owner)
+        chain.restore(snap)
+
+        controller.enable_compact_logs(sender=owner)
+        assert controller.compact_logs()
+
+        tx = controller.update_many(payload, sender=owner)
+        assert len(tx.events) == 1
+        e = tx.events[0]
+        assert e.event_name == "OraclesUpdated"
+        assert len(e.updates) == n
+
+        records = decode_oracles_updated(e.updater, e.updates)
+        assert [tuple(r) for r in records] == expected
+        assert controller.rewards(owner) == rewards
+
+        # no update, no event
+        tx = controller.update_many(payload, sender=owner)
+        assert len(tx.events) == 0
+
+    def test_update_many_gas_price_receipts(self, owner, controller, oracle, chain):
+        controller.enable_rewards(sender=owner)
+
+        n = 3
+        scales = [(2, i+1, (i+1)*10**18) for i in range(n)]
+        controller.set_scales(scales, sender=owner)
+
+        ts = int(time.time() * 1000)
+
+        payload = b''
+        for i in range(n):
+            typ_values = {107: random.randint(10**15, 10**18),
+                          199: random.randint(10**15, 10**18),
+                          322: random.randint(10**15, 10**18)}
+            if i != 0:
+                payload += DELIMITER
+            payload += utils.create_signed_payload(web3=web3, signer=owner, plen=len(typ_values), ts=ts + i*2000,
+                                                   sid=2, cid=i+1, height=(i+1)*100, typ_values=typ_values)
+
+        # per element receipts paired by the controller, the default for oracles without
+        # the combined gas price record, and the oracle's combined receipts give the same update
+        assert not controller.gas_price_receipts()
+        snap = chain.snapshot()
+        tx = controller.update_many(payload, sender=owner)
+        expected = [(e.system_id, e.chain_id, e.new_value, e.raw_deviation, e.time_since,
+                     e.time_reward, e.deviation_reward, e.reward_mult) for e in tx.events]
+        assert len(expected) == n
+        rewards = controller.rewards(owner)
+        chain.restore(snap)
+
+        with ape.reverts():
+            controller.enable_gas_price_receipts(sender=accounts[1])
+        controller.enable_gas_price_receipts(sender=owner)
+        assert controller.gas_price_receipts()
+
+        tx = controller.update_many(payload, sender=owner)
+        assert [(e.system_id, e.chain_id, e.new_value, e.raw_deviation, e.time_since,
+                 e.time_reward, e.deviation_reward, e.reward_mult) for e in tx.events] == expected
+        assert controller.rewards(owner) == rewards
+
+        controller.disable_gas_price_receipts(sender=owner)
+        assert not controller.gas_price_receipts()
+
     def test_update_many_w_dupes(self, owner, controller, oracle, chain):
         n = 5
         scales = [(2, i+1, (i+1)*10**18) for i in range(n)]
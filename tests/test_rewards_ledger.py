@@ -0,0 +1,159 @@
+import asyncio
+
+import aiohttp
+import pytest
+import vyper
+from eth_hash.auto import keccak
+from web3 import AsyncHTTPProvider, AsyncWeb3, EthereumTesterProvider, Web3
+
+import params
+from rpc import RPCServer
+from scripts.rewards_ledger import LEDGER_ABI, Ledger, LedgerMismatch, check, read_ledger, snapshot, write_ledger
+from utils import deploy_vyper
+
+# returns the receipts it's given, for update_many to reward
+ORACLE = """
+struct RecordReceipt:
+    systemid: uint8
+    cid: uint64
+    typ: uint16
+    old_height: uint64
+    old_timestamp: uint48
+    old_value: uint240
+    new_height: uint64
+    new_timestamp: uint48
+    new_value: uint240
+
+receipts: DynArray[RecordReceipt, 32]
+
+@external
+def set_receipts(receipts: DynArray[RecordReceipt, 32]):
+    self.receipts = receipts
+
+@external
+@payable
+def storeValuesWithReceipt(dat: Bytes[16384]) -> DynArray[RecordReceipt, 32]:
+    return self.receipts
+"""
+
+CHAIN = (2, 1)
+N_UPDATERS = 12
+CHUNK_SIZE = 5
+
+class Chain:
+    """ the RewardController on a tester chain, rewarding an update_many of a new height per call """
+    def __init__(self):
+        self.w3 = Web3(EthereumTesterProvider())
+        self.w3.eth.default_account = self.w3.eth.accounts[0]
+        self.oracle = deploy_vyper(self.w3, ORACLE)
+        with open('contracts/RewardController.vy') as f:
+            self.controller = deploy_vyper(self.w3, f.read(), params.kp, params.ki, params.co_bias,
+                                           params.output_upper_bound, params.output_lower_bound,
+                                           params.target_time_since, params.tip_reward_type, params.min_reward,
+                                           params.max_reward, params.default_window_size, self.oracle.address,
+                                           params.coeff, params.min_fee)
+        self.controller.functions.set_scales([(*CHAIN, params.scales[CHAIN])]).transact()
+        self.controller.functions.enable_rewards().transact()
+        self.height = 0
+
+    def new_updater(self):
+        tester = self.w3.provider.ethereum_tester
+        address = tester.add_account('0x' + keccak(len(tester.get_accounts()).to_bytes(32, 'big')).hex())
+        self.w3.eth.send_transaction({'to': address, 'value': 10**18})
+        return Web3.to_checksum_address(address)
+
+    def update(self, updater):
+        h, ts = self.height, self.height * 600_000
+        self.height += 1
+        self.oracle.functions.set_receipts([
+            (*CHAIN, 107, h, ts, 10**9 * (h % 7 + 1), h + 1, ts + 600_000, 10**9 * ((h + 1) % 7 + 1)),
+            (*CHAIN, 322, h, ts, 10**8, h + 1, ts + 600_000, 10**8)]).transact()
+        self.controller.functions.update_many(b'').transact({'from': updater})
+
+@pytest.fixture(scope='module')
+def deployed():
+    c = Chain()
+    c.updaters = [c.new_updater() for _ in range(N_UPDATERS)]
+    # a second round from the first updaters, they're listed once
+    for updater in c.updaters + c.updaters[:4]:
+        c.update(updater)
+    server = RPCServer(c.w3).start()
+    yield c, server
+    server.stop()
+
+@pytest.fixture
+def chain(deployed):
+    c, server = deployed
+    tester = c.w3.provider.ethereum_tester
+    snapshot_id, height = tester.take_snapshot(), c.height
+    server.requests.clear()
+    yield c, server
+    tester.revert_to_snapshot(snapshot_id)
+    c.height = height
+
+def take_snapshot(server, address, **kw):
+    async def run():
+        provider = AsyncHTTPProvider(server.url)
+        async with aiohttp.ClientSession() as session:
+            await provider.cache_async_session(session)
+            w3 = AsyncWeb3(provider)
+            return await snapshot(w3.eth.contract(address=address, abi=LEDGER_ABI), **kw)
+    return asyncio.run(run())
+
+class TestRewardsLedger:
+    def test_abi_matches_the_controller(self):
+        with open('contracts/RewardController.vy') as f:
+            abi = vyper.compile_code(f.read(), output_formats=['abi'])['abi']
+        functions = {a['name']: a for a in abi if a['type'] == 'function'}
+        for fn in LEDGER_ABI:
+            assert [i['type'] for i in functions[fn['name']]['inputs']] == [i['type'] for i in fn['inputs']]
+            assert functions[fn['name']]['outputs'] == fn['outputs']
+
+    def test_snapshot(self, chain, tmp_path):
+        c, server = chain
+        ledger = take_snapshot(server, c.controller.address, chunk_size=CHUNK_SIZE, max_connections=2)
+
+        f = c.controller.functions
+        assert ledger.block == c.w3.eth.block_number
+        assert ledger.n_updaters == N_UPDATERS
+        assert ledger.rewards == {u: f.rewards(u).call() for u in c.updaters}
+        assert all(r > 0 for r in ledger.rewards.values())
+        assert ledger.total_rewards == f.total_rewards().call() == sum(ledger.rewards.values())
+        # n_updaters, total_rewards and 3 chunks, all at the pinned block
+        assert server.requests.count('eth_call') == 5
+
+        path = str(tmp_path / 'ledger.csv')
+        write_ledger(path, ledger)
+        with open(path) as fp:
+            lines = fp.read().splitlines()
+        assert lines[0] == f"# block={ledger.block} n_updaters={N_UPDATERS} total_rewards={ledger.total_rewards}"
+        first = min(c.updaters, key=lambda a: int(a, 16))
+        assert lines[2] == f"{first},{ledger.rewards[first]}"
+        assert len(lines) == N_UPDATERS + 2
+        assert read_ledger(path) == ledger
+
+    def test_pinned_block(self, chain):
+        c, server = chain
+        block = c.w3.eth.block_number
+        updater = c.new_updater()
+        c.update(updater)
+
+        ledger = take_snapshot(server, c.controller.address, block=block, chunk_size=CHUNK_SIZE)
+        assert ledger.n_updaters == N_UPDATERS
+        assert updater not in ledger.rewards
+        latest = take_snapshot(server, c.controller.address, chunk_size=CHUNK_SIZE)
+        assert latest.n_updaters == N_UPDATERS + 1
+        assert latest.rewards[updater] == c.controller.functions.rewards(updater).call() > 0
+
+    def test_mismatch(self, chain, tmp_path):
+        c, server = chain
+        ledger = take_snapshot(server, c.controller.address)
+        with pytest.raises(LedgerMismatch):
+            check(ledger._replace(total_rewards=ledger.total_rewards + 1))
+        with pytest.raises(LedgerMismatch):
+            check(ledger._replace(n_updaters=ledger.n_updaters + 1))
+
+        path = str(tmp_path / 'ledger.csv')
+        write_ledger(path, Ledger(1, 2, 3, {Web3.to_checksum_address(f'0x{i + 1:040x}'): 1 for i in range(2)}))
+        with pytest.raises(LedgerMismatch):
+            read_ledger(path)
@@ -5,6 +5,7 @@ from web3 import Web3
 from ape import accounts
 
 from fixture import controller, owner, oracle
+import utils
 
 FORTY_FIVE_DECIMAL_NUMBER   = int(10 ** 45)
 TWENTY_SEVEN_DECIMAL_NUMBER = int(10 ** 27)
@@ -42,16 +43,7 @@ def assertGt(x, y):
 def assertLt(x, y):
     assert x < y
 
-def create_payload(plen, ts, sid, cid, height, typ_values={}, version=1):
-    empty = 0
-    header = empty.to_bytes(6, 'big') + plen.to_bytes(2, 'big') + ts.to_bytes(6, 'big') + sid.to_bytes(1, 'big') + \
-            cid.to_bytes(8, 'big') + height.to_bytes(8, 'big') + version.to_bytes(1, 'big')
-
-    values = b''
-    for typ, val in typ_values.items():
-        values += typ.to_bytes(2, 'big') + val.to_bytes(30, 'big')
-
-    return header + values
+create_payload = utils.create_raw_payload
 
 class TestStore:
     def test_prepare_header(self, store):
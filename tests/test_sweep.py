@@ -0,0 +1,98 @@
+import csv
+import json
+import random
+
+import pytest
+
+import params
+from scripts import controller_model as cm
+from scripts import replay
+from scripts import sweep
+
+SCALES = {(2, 42161): params.scales[(2, 42161)], (2, 1): params.scales[(2, 1)]}
+
+def write_history(path, n, seed=0):
+    rng = random.Random(seed)
+    ts = {k: 0 for k in SCALES}
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(replay.FIELDS)
+        for i in range(n):
+            k = list(SCALES)[i % len(SCALES)]
+            ts[k] += rng.randint(10_000, 4_000_000)
+            writer.writerow((*k, i + 1, ts[k], rng.randint(10**6, 10**10), rng.randint(0, 10**8)))
+
+class TestSweep:
+    def test_grid_and_samples(self):
+        points = list(sweep.grid({'kp': [1, 2], 'ki': [3, 4, 5]}))
+        assert len(points) == 6
+        assert {'ki': 5, 'kp': 2} in points
+
+        points = list(sweep.samples({'kp': (-10, -1)}, 20, seed=1))
+        assert points == list(sweep.samples({'kp': (-10, -1)}, 20, seed=1))
+        assert all(-10 <= p['kp'] <= -1 for p in points)
+
+    def test_invalid_points(self):
+        # bounds the controller's constructor rejects are left out of grids and redrawn in samples
+        points = list(sweep.grid({'output_upper_bound': [10**18, 3 * 10**18], 'output_lower_bound': [0, 2 * 10**18]}))
+        assert len(points) == 3
+        assert {'output_upper_bound': 10**18, 'output_lower_bound': 2 * 10**18} not in points
+        assert list(sweep.grid({'target_time_since': [0, 60 * 10**18]})) == [{'target_time_since': 60 * 10**18}]
+
+        ranges = {'output_upper_bound': (0, 10**18), 'output_lower_bound': (0, 10**18)}
+        points = list(sweep.samples(ranges, 50, seed=1))
+        assert len(points) == 50
+        assert all(p['output_lower_bound'] <= p['output_upper_bound'] for p in points)
+
+        with pytest.raises(ValueError):
+            list(sweep.samples({'output_upper_bound': (0, 1), 'output_lower_bound': (2, 3)}, 1, seed=1))
+
+    def test_evaluate(self, tmp_path):
+        path = str(tmp_path / "history.csv")
+        write_history(path, 200)
+        cfg = cm.ControllerConfig.from_params(params, output_upper_bound=2 * 10**18)
+        result = sweep.evaluate(cfg, SCALES, replay.read_history(path))
+
+        r = replay.Replay(cfg, SCALES)
+        updates = list(r.run(replay.read_history(path)))
+        assert result['emission'] == r.total_rewards
+        assert result['updates'] == len(updates) == 200
+        assert result['upper_saturated'] == sum(u.reward_mult == 2 * 10**18 for u in updates) / 200
+        assert result['target_time_since'] == 1800
+
+        # each feed's first update is timed from 0 and left out of the interval
+        later = [u for u in updates if u.timestamp != min(v.timestamp for v in updates if v.cid == u.cid)]
+        assert len(later) == 200 - len(SCALES)
+        assert result['interval'] == sum(u.time_since for u in later) / len(later)
+
+    def test_worker_reads_history_once(self, tmp_path):
+        path = tmp_path / "history.csv"
+        write_history(str(path), 50)
+        sweep._init_worker(str(path), SCALES)
+        path.unlink()
+
+        point = {'kp': -2 * 10**18}
+        results = [sweep._run_point(point) for _ in range(2)]
+        assert results[0] == results[1] and results[0]['updates'] == 50
+
+    def test_sweep_resumes(self, tmp_path):
+        history = str(tmp_path / "history.csv")
+        results_path = str(tmp_path / "results.jsonl")
+        write_history(history, 100)
+        points = list(sweep.grid({'kp': [-3 * 10**18, -2 * 10**18], 'min_window_size': [2, 10]}))
+
+        # an interrupted run, with its last line cut off
+        first = sweep.sweep(history, results_path, points[:2], scales=SCALES, processes=2)
+        with open(results_path, 'a') as f:
+            f.write('{"point": {"kp"')
+
+        results = sweep.sweep(history, results_path, points, scales=SCALES, processes=2)
+        assert len(results) == 4
+        assert len(sweep.load_results(results_path)) == 4
+
+        by_point = {sweep.point_key(r['point']): r for r in results}
+        for r in first:
+            assert by_point[sweep.point_key(r['point'])] == r
+        expected = sweep.evaluate(cm.ControllerConfig.from_params(params, **points[3]), SCALES,
+                                  replay.read_history(history))
+        assert by_point[sweep.point_key(points[3])] == {'point': points[3], **expected}
@@ -1,21 +1,36 @@
 import os
 from web3 import Web3
 
-web3 = Web3()
-
-def create_raw_payload(plen, ts, sid, cid, height, typ_values={}, version=1):
-    empty = 0
-    header = empty.to_bytes(6, 'big') + plen.to_bytes(2, 'big') + ts.to_bytes(6, 'big') + sid.to_bytes(1, 'big') + \
-            cid.to_bytes(8, 'big') + height.to_bytes(8, 'big') + version.to_bytes(1, 'big')
+from scripts import batch_signer
+from scripts import payload_codec
+from scripts.oracle_mirror import OracleMirror
 
-    values = b''
-    for typ, val in typ_values.items():
-        values += typ.to_bytes(2, 'big') + val.to_bytes(30, 'big')
+web3 = Web3()
 
-    return header + values
+# payload version for several chain records under one signature
+ENVELOPE_VERSION = payload_codec.ENVELOPE_VERSION
 
-def create_signed_payload(web3, signer, plen, ts, sid, cid, height, typ_values={}, version=1):
-    data = create_raw_payload(plen, ts, sid, cid, height, typ_values, version=1)
+def create_raw_payload(plen, ts, sid, cid, height, typ_values={}, version=1):
+    buf = bytearray(payload_codec.WORD_SIZE * (len(typ_values) + 1))
+    offset = payload_codec.encode_header_into(buf, 0, plen, ts, sid, cid, height, version)
+    payload_codec.encode_values_into(buf, offset, typ_values)
+
+    return bytes(buf)
+
+def create_raw_envelope(records):
+    # records are create_raw_payload arguments, one per chain. the envelope header
+    # only carries the version and the number of words of all the records
+    body_len = sum(1 + len(record['typ_values']) for record in records)
+    buf = bytearray(payload_codec.WORD_SIZE * (body_len + 1))
+    offset = payload_codec.encode_header_into(buf, 0, body_len, 0, 0, 0, 0, version=ENVELOPE_VERSION)
+    for record in records:
+        offset = payload_codec.encode_payload_into(buf, offset, record['ts'], record['sid'], record['cid'],
+                                                   record['height'], record['typ_values'],
+                                                   version=record.get('version', 1))
+
+    return bytes(buf)
+
+def sign_payload(web3, signer, data):
     data_h = web3.keccak(data)
     signed = signer.sign_raw_msghash(data_h)
     sig2 = signed.encode_rsv()
@@ -23,6 +38,21 @@ def create_signed_payload(web3, signer, plen, ts, sid, cid, height, typ_values={
 
     return payload
 
+def create_signed_payload(web3, signer, plen, ts, sid, cid, height, typ_values={}, version=1):
+    data = create_raw_payload(plen, ts, sid, cid, height, typ_values, version=1)
+    return sign_payload(web3, signer, data)
+
+def create_signed_payloads(signer, payloads, processes=None):
+    # payloads are create_raw_payload arguments. signed on a process pool with the
+    # signer's key, same bytes as create_signed_payload
+    raw = [create_raw_payload(**payload) for payload in payloads]
+    return batch_signer.sign_payloads(raw, signer.private_key, processes=processes)
+
+def create_signed_envelope(web3, signer, records):
+    # one signature for the records of every chain
+    data = create_raw_envelope(records)
+    return sign_payload(web3, signer, data)
+
 def create_typ_values(gas_price, tip_pct=0.10):
     assert tip_pct > 0 and tip_pct <= 1
     bf_pct = 1. - tip_pct
@@ -54,14 +84,17 @@ def create_final_payload(sid, cid, ts, height, gas_price, signer):
 
     return create_signed_payload(web3=web3, signer=signer, **payload_params)
 
-def get_current_gasprice(oracle, sid, cid):
-    current_bf, current_bf_height, current_bf_ts = oracle.get(sid, cid, 107)
-    current_tip, current_tip_height, current_tip_ts = oracle.get(sid, cid, 322)
+def get_current_gasprice(oracle, sid, cid, mirror=None):
+    # basefee + tip, from the oracle's combined gas price record, or from a mirror of it
+    # that only calls the oracle on a miss
+    return tuple((oracle if mirror is None else mirror).getGasPrice(sid, cid))
 
-    assert current_bf_height == current_tip_height
-    assert current_bf_ts == current_tip_ts
-
-    return current_bf + current_tip, current_bf_height, current_bf_ts
+def gas_price_mirror(oracle, chains):
+    # an OracleMirror of the basefee and tip of chains, (sid, cid) pairs, read with one getRecords.
+    # refresh(stale_only=False) re-reads them after the oracle was updated
+    mirror = OracleMirror(oracle)
+    mirror.bootstrap_gas_prices(chains)
+    return mirror
 
 def get_current_bf(oracle, sid, cid):
     current_bf, current_bf_height, current_bf_ts = oracle.get(sid, cid, 107)
@@ -71,3 +104,11 @@ def get_current_bf(oracle, sid, cid):
     assert current_bf_ts == current_tip_ts
 
     return current_bf + current_tip, current_bf_height, current_bf_ts
+
+def deploy_vyper(w3, source, *args):
+    """ compiles and deploys a vyper contract on a web3 (tester) chain, from its default account """
+    import vyper
+    out = vyper.compile_code(source, output_formats=['abi', 'bytecode'])
+    factory = w3.eth.contract(abi=out['abi'], bytecode=out['bytecode'])
+    receipt = w3.eth.wait_for_transaction_receipt(factory.constructor(*args).transact())
+    return w3.eth.contract(address=receipt.contractAddress, abi=out['abi'])